@@ -0,0 +1,1521 @@
+"""
+MAIN FILE FOR BENCHMARKING THE PERFORMANCE CRITICAL PARTS OF THE SIMULATION
+
+Run from terminal: python analysis/benchmarks.py
+make sure it is ran from repository root
+"""
+
+import bisect
+import copy
+import math
+import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from tensorflow import keras
+
+import classes
+import clustering.scripts
+import decision
+import decision.value_functions
+from decision.value_functions.abstract import ValueFunction
+from decision.value_functions.ANN import ANN
+import globals
+import system_simulation.scripts
+from globals import BATTERY_LIMIT, ITERATION_LENGTH_MINUTES
+
+
+class ListEventStack:
+    """
+    The sorted list event stack used by the world object before the event queue. Kept as a benchmark reference
+    """
+
+    def __init__(self):
+        self.stack = []
+
+    def push(self, event):
+        insert_index = bisect.bisect([event.time for event in self.stack], event.time)
+        self.stack.insert(insert_index, event)
+
+    def pop(self):
+        return self.stack.pop(0)
+
+
+def benchmark_event_queue(
+    stack_sizes=(100, 1000, 10000, 30000), number_of_operations=2000
+) -> pd.DataFrame:
+    """
+    Measure events per second for the event queue and the sorted list stack.
+    Every operation pops the earliest event and pushes a new event a random number of minutes later,
+    keeping the size of the stack constant.
+    :param stack_sizes: number of pending events in the stack
+    :param number_of_operations: number of pop and push operations to time for each stack size
+    :return: dataframe with events per second for every stack size
+    """
+    results = []
+    for stack_size in stack_sizes:
+        row = {}
+        for label, stack in [
+            ("EventQueue", classes.EventQueue()),
+            ("Sorted list", ListEventStack()),
+        ]:
+            for event_time in np.random.randint(0, 960, stack_size):
+                stack.push(classes.Event(int(event_time)))
+            delays = np.random.randint(
+                1, ITERATION_LENGTH_MINUTES, number_of_operations
+            )
+            start = time.perf_counter()
+            for delay in delays:
+                event = stack.pop()
+                stack.push(classes.Event(event.time + int(delay)))
+            row[label] = number_of_operations / (time.perf_counter() - start)
+        results.append(row)
+    return pd.DataFrame(results, index=pd.Index(stack_sizes, name="Stack size")).rename(
+        columns=lambda column: f"{column} (events/s)"
+    )
+
+
+def legacy_generate_scooter_trips(event, world):
+    """
+    The departure generation of GenerateScooterTrips drawing and adding the trips of one cluster at a time.
+    Kept as a benchmark reference
+    """
+    for departure_cluster in world.state.clusters:
+        number_of_trips = round(
+            np.random.poisson(departure_cluster.trip_intensity_per_iteration)
+        )
+        trips_departure_time = sorted(
+            np.random.randint(
+                event.time, event.time + ITERATION_LENGTH_MINUTES, number_of_trips
+            )
+        )
+        for departure_time in trips_departure_time:
+            world.add_event(
+                classes.ScooterDeparture(departure_time, departure_cluster.id)
+            )
+    world.add_event(classes.GenerateScooterTrips(event.time + ITERATION_LENGTH_MINUTES))
+
+
+def benchmark_generate_scooter_trips(
+    numbers_of_clusters=(50, 100, 300), number_of_iterations=50
+) -> pd.DataFrame:
+    """
+    Measure iterations per second for generating the scooter trips of an iteration one cluster at a time into the
+    sorted list stack and the event queue, and in one batch into the event queue
+    :param numbers_of_clusters: number of clusters in the state
+    :param number_of_iterations: number of iterations of trips to generate for every number of clusters
+    :return: dataframe with iterations per second for every number of clusters
+    """
+    results = []
+    for number_of_clusters in numbers_of_clusters:
+        world = classes.World(
+            960,
+            decision.DoNothing(),
+            clustering.scripts.get_initial_state(2500, number_of_clusters),
+            verbose=False,
+            visualize=False,
+            seed=42,
+        )
+        row = {}
+        for label, generate, get_stack in [
+            ("Per cluster, sorted list", legacy_generate_scooter_trips, ListEventStack),
+            (
+                "Per cluster, event queue",
+                legacy_generate_scooter_trips,
+                classes.EventQueue,
+            ),
+            ("Batch", classes.GenerateScooterTrips.perform, classes.EventQueue),
+        ]:
+            np.random.seed(42)
+            world.stack = get_stack()
+            start = time.perf_counter()
+            for iteration in range(number_of_iterations):
+                world.time = iteration * ITERATION_LENGTH_MINUTES
+                generate(
+                    classes.GenerateScooterTrips(world.time),
+                    world,
+                )
+            row[label] = number_of_iterations / (time.perf_counter() - start)
+        results.append(row)
+    return pd.DataFrame(
+        results, index=pd.Index(numbers_of_clusters, name="Number of clusters")
+    ).rename(columns=lambda column: f"{column} (iterations/s)")
+
+
+def benchmark_leave_destinations(
+    instances=((2000, 20), (2500, 50)), number_of_trips=10000
+) -> pd.DataFrame:
+    """
+    Measure trips per second for drawing trip destinations with np.random.choice on the leave distribution of the
+    start cluster, and with the alias tables of the state one trip at a time and in bulk
+    :param instances: tuples of sample size and number of clusters
+    :param number_of_trips: number of trip destinations to draw for each instance
+    :return: dataframe with trips per second for every instance
+    """
+    results = []
+    for sample_size, number_of_clusters in instances:
+        state = clustering.scripts.get_initial_state(sample_size, number_of_clusters)
+        start_clusters = [
+            state.clusters[index]
+            for index in np.random.randint(len(state.clusters), size=number_of_trips)
+        ]
+        start_cluster_indices = np.array([cluster.id for cluster in start_clusters])
+        row = {}
+        start = time.perf_counter()
+        for cluster in start_clusters:
+            np.random.choice(state.clusters, p=cluster.get_leave_distribution())
+        row["np.random.choice"] = number_of_trips / (time.perf_counter() - start)
+        # Build the tables outside the timing
+        state.get_leave_alias_table()
+        start = time.perf_counter()
+        for cluster in start_clusters:
+            state.clusters[state.sample_leave_destinations(cluster.id)]
+        row["Alias table"] = number_of_trips / (time.perf_counter() - start)
+        start = time.perf_counter()
+        state.sample_leave_destinations(start_cluster_indices)
+        row["Alias table bulk"] = number_of_trips / (time.perf_counter() - start)
+        results.append(row)
+    return pd.DataFrame(
+        results,
+        index=pd.MultiIndex.from_tuples(
+            instances, names=["Sample size", "Number of clusters"]
+        ),
+    ).rename(columns=lambda column: f"{column} (trips/s)")
+
+
+def list_distance_matrix(locations):
+    """
+    The nested list distance matrix computed by the state object before the vectorized haversine.
+    Kept as a benchmark reference
+    """
+    return [
+        [
+            (
+                0.0
+                if location == neighbour
+                else location.distance_to(*neighbour.get_location())
+            )
+            for neighbour in locations
+        ]
+        for location in locations
+    ]
+
+
+def benchmark_distance_matrix(number_of_locations=(50, 100, 300, 1000)) -> pd.DataFrame:
+    """
+    Measure the time used to compute the distance matrix with the vectorized and the nested loop haversine
+    :param number_of_locations: number of locations in the distance matrix
+    :return: dataframe with seconds used for every number of locations
+    """
+    results = []
+    for size in number_of_locations:
+        locations = [
+            classes.Location(lat, lon, location_id)
+            for location_id, (lat, lon) in enumerate(
+                zip(
+                    np.random.uniform(59.9, 60.0, size),
+                    np.random.uniform(10.6, 10.8, size),
+                )
+            )
+        ]
+        row = {}
+        start = time.perf_counter()
+        classes.Location.haversine_matrix(
+            [location.get_lat() for location in locations],
+            [location.get_lon() for location in locations],
+        )
+        row["Vectorized"] = time.perf_counter() - start
+        start = time.perf_counter()
+        list_distance_matrix(locations)
+        row["Nested loop"] = time.perf_counter() - start
+        results.append(row)
+    return pd.DataFrame(
+        results, index=pd.Index(number_of_locations, name="Locations")
+    ).rename(columns=lambda column: f"{column} (s)")
+
+
+@contextmanager
+def deepcopy_lookahead(state):
+    """
+    The lookahead used by the decision policy before the undo log, copying the whole state for every action.
+    Kept as a benchmark reference
+    """
+    yield copy.deepcopy(state)
+
+
+def benchmark_lookahead(
+    instances=((2000, 20), (2500, 50)), number_of_decisions=10
+) -> pd.DataFrame:
+    """
+    Measure decisions per second for the epsilon greedy policy when looking ahead with the undo log of the state
+    and when copying the state for every action
+    :param instances: tuples of sample size and number of clusters
+    :param number_of_decisions: number of decisions to time for each instance
+    :return: dataframe with decisions per second for every instance
+    """
+    results = []
+    for sample_size, number_of_clusters in instances:
+        world = classes.World(
+            960,
+            None,
+            clustering.scripts.get_initial_state(sample_size, number_of_clusters),
+            visualize=False,
+            EPSILON=0,
+        )
+        world.policy = world.set_policy(
+            policy_class=decision.EpsilonGreedyValueFunctionPolicy,
+            value_function_class=decision.value_functions.LinearValueFunction,
+        )
+        world.disable_training = True
+        vehicle = world.state.vehicles[0]
+        row = {}
+        for label, lookahead in [
+            ("Undo log", classes.State.lookahead),
+            ("Deepcopy", deepcopy_lookahead),
+        ]:
+            original_lookahead = classes.State.lookahead
+            classes.State.lookahead = lookahead
+            try:
+                random.seed(42)
+                np.random.seed(42)
+                start = time.perf_counter()
+                for _ in range(number_of_decisions):
+                    world.policy.get_best_action(world, vehicle)
+                row[label] = number_of_decisions / (time.perf_counter() - start)
+            finally:
+                classes.State.lookahead = original_lookahead
+        results.append(row)
+    return pd.DataFrame(
+        results,
+        index=pd.MultiIndex.from_tuples(
+            instances, names=["Sample size", "Number of clusters"]
+        ),
+    ).rename(columns=lambda column: f"{column} (decisions/s)")
+
+
+def benchmark_value_function_batch(
+    number_of_states=(10, 100, 1000), number_of_clusters=50
+) -> pd.DataFrame:
+    """
+    Measure states per second when estimating the value of states one by one and in one batch
+    :param number_of_states: number of states to estimate the value of
+    :param number_of_clusters: number of clusters in the state representation
+    :return: dataframe with states per second for every value function and number of states
+    """
+    state = clustering.scripts.get_initial_state(2500, number_of_clusters)
+    hyper_parameters = globals.HyperParameters()
+    value_function_args = (
+        hyper_parameters.WEIGHT_INITIALIZATION_VALUE,
+        hyper_parameters.DISCOUNT_RATE,
+        hyper_parameters.VEHICLE_INVENTORY_STEP_SIZE,
+        hyper_parameters.LOCATION_REPETITION,
+        hyper_parameters.TRACE_DECAY,
+    )
+    # The step sizes of the value functions as in World.set_policy
+    value_functions = [
+        decision.value_functions.LinearValueFunction(
+            hyper_parameters.WEIGHT_UPDATE_STEP_SIZE, *value_function_args
+        ),
+        decision.value_functions.ANNValueFunction(
+            hyper_parameters.ANN_LEARNING_RATE,
+            *value_function_args,
+            hyper_parameters.ANN_NETWORK_STRUCTURE,
+        ),
+    ]
+    results = []
+    for size in number_of_states:
+        row = {}
+        for value_function in value_functions:
+            value_function.setup(state)
+            features_matrix = (
+                np.random.randint(
+                    0,
+                    2,
+                    (
+                        size,
+                        value_function.get_number_of_location_indicators_and_state_features(
+                            state
+                        ),
+                    ),
+                )
+                .astype("float64")
+                .tolist()
+            )
+            start = time.perf_counter()
+            for state_features in features_matrix:
+                value_function.estimate_value_from_state_features(state_features)
+            row[f"{value_function.__class__.__name__} one by one"] = size / (
+                time.perf_counter() - start
+            )
+            start = time.perf_counter()
+            value_function.estimate_values_batch(features_matrix)
+            row[f"{value_function.__class__.__name__} batch"] = size / (
+                time.perf_counter() - start
+            )
+        results.append(row)
+    return pd.DataFrame(
+        results, index=pd.Index(number_of_states, name="Number of states")
+    ).rename(columns=lambda column: f"{column} (states/s)")
+
+
+def legacy_replay_train(value_function, replay_buffers, batch_size: int):
+    """
+    The replay training of the ANN value function before the replay buffers were stored in arrays, with a predict call
+    for every sampled transition. Kept as a benchmark reference
+    """
+    for replay_buffer in replay_buffers:
+        random_sample = random.sample(replay_buffer, batch_size)
+        states, rewards, next_states = zip(*random_sample)
+        targets = [
+            reward
+            + value_function.discount_factor * value_function.model.predict(next_state)
+            for reward, next_state in zip(rewards, next_states)
+        ]
+        value_function.model.batch_fit(
+            np.array(states), np.array(targets), verbose=0, batch_size=batch_size
+        )
+
+
+def benchmark_replay_training(
+    batch_sizes=(16, 64), number_of_clusters=50, training_steps=10
+) -> pd.DataFrame:
+    """
+    Measure training steps per second of the ANN value function with the legacy replay training and the replay buffers
+    :param batch_sizes: number of transitions sampled from each replay buffer in a training step
+    :param number_of_clusters: number of clusters in the state representation
+    :param training_steps: number of training steps to time
+    :return: dataframe with training steps per second for every batch size
+    """
+    state = clustering.scripts.get_initial_state(2500, number_of_clusters)
+    hyper_parameters = globals.HyperParameters()
+    results = []
+    for batch_size in batch_sizes:
+        value_function = decision.value_functions.ANNValueFunction(
+            hyper_parameters.ANN_LEARNING_RATE,
+            hyper_parameters.WEIGHT_INITIALIZATION_VALUE,
+            hyper_parameters.DISCOUNT_RATE,
+            hyper_parameters.VEHICLE_INVENTORY_STEP_SIZE,
+            hyper_parameters.LOCATION_REPETITION,
+            hyper_parameters.TRACE_DECAY,
+            hyper_parameters.ANN_NETWORK_STRUCTURE,
+            batch_size,
+        )
+        value_function.setup(state)
+        number_of_features = (
+            value_function.get_number_of_location_indicators_and_state_features(state)
+        )
+        legacy_replay_buffers = []
+        for replay_buffer in [
+            value_function.replay_buffer,
+            value_function.replay_buffer_negative,
+        ]:
+            transitions = [
+                (
+                    np.random.randint(0, 2, number_of_features).astype("float64"),
+                    -random.randint(0, 3),
+                    np.random.randint(0, 2, number_of_features).astype("float64"),
+                )
+                for _ in range(batch_size)
+            ]
+            replay_buffer.extend(transitions)
+            legacy_replay_buffers.append(transitions)
+        row = {}
+        start = time.perf_counter()
+        for _ in range(training_steps):
+            legacy_replay_train(value_function, legacy_replay_buffers, batch_size)
+        row["Legacy replay training"] = training_steps / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for _ in range(training_steps):
+            value_function.train(batch_size)
+        row["Replay buffers"] = training_steps / (time.perf_counter() - start)
+        results.append(row)
+    return pd.DataFrame(results, index=pd.Index(batch_sizes, name="Batch size")).rename(
+        columns=lambda column: f"{column} (training steps/s)"
+    )
+
+
+def benchmark_ann_training(
+    batch_sizes=(16, 64), number_of_clusters=50, training_steps=50
+) -> pd.DataFrame:
+    """
+    Measure training steps per second of the ANN with keras fit and with the compiled train step
+    :param batch_sizes: number of states in every training step
+    :param number_of_clusters: number of clusters in the state representation
+    :param training_steps: number of training steps to time
+    :return: dataframe with training steps per second for every batch size
+    """
+    state = clustering.scripts.get_initial_state(2500, number_of_clusters)
+    hyper_parameters = globals.HyperParameters()
+    results = []
+    for batch_size in batch_sizes:
+        value_function = decision.value_functions.ANNValueFunction(
+            hyper_parameters.ANN_LEARNING_RATE,
+            hyper_parameters.WEIGHT_INITIALIZATION_VALUE,
+            hyper_parameters.DISCOUNT_RATE,
+            hyper_parameters.VEHICLE_INVENTORY_STEP_SIZE,
+            hyper_parameters.LOCATION_REPETITION,
+            hyper_parameters.TRACE_DECAY,
+            hyper_parameters.ANN_NETWORK_STRUCTURE,
+        )
+        value_function.setup(state)
+        features = np.random.randint(
+            0,
+            2,
+            (
+                batch_size,
+                value_function.get_number_of_location_indicators_and_state_features(
+                    state
+                ),
+            ),
+        ).astype("float64")
+        targets = np.random.uniform(-1, 0, batch_size)
+        row = {}
+        for name, train in [
+            (
+                "Keras fit",
+                lambda: value_function.model.batch_fit(
+                    features, targets, verbose=0, batch_size=batch_size
+                ),
+            ),
+            (
+                "Compiled train step",
+                lambda: value_function.model.train_step(features, targets),
+            ),
+        ]:
+            # The first step builds the graph and is not timed
+            train()
+            start = time.perf_counter()
+            for _ in range(training_steps):
+                train()
+            row[name] = training_steps / (time.perf_counter() - start)
+        results.append(row)
+    return pd.DataFrame(results, index=pd.Index(batch_sizes, name="Batch size")).rename(
+        columns=lambda column: f"{column} (training steps/s)"
+    )
+
+
+def legacy_ann_getstate(ann) -> dict:
+    """
+    The pickled state of the ANN before the checkpoints, with the models saved to .hdf5 files.
+    Kept as a benchmark reference
+    """
+    state = ann.__dict__.copy()
+    for key in ["model", "predict_model"]:
+        with tempfile.NamedTemporaryFile(suffix=".hdf5", delete=True) as fd:
+            keras.models.save_model(getattr(ann, key), fd.name, overwrite=True)
+            state[key] = fd.read()
+    del state["checkpoint"]
+    state["tensorboard"] = None
+    return state
+
+
+def benchmark_ann_checkpoint(
+    network_structure=(1000, 2000, 1000, 200), number_of_clusters=50, repetitions=5
+) -> pd.DataFrame:
+    """
+    Measure the time to pickle and unpickle the ANN with .hdf5 files and with the checkpoints
+    :param network_structure: nodes in every layer of the network
+    :param number_of_clusters: number of clusters in the state representation
+    :param repetitions: number of times to pickle and unpickle the ANN
+    :return: dataframe with the time and size of the pickles of both formats
+    """
+    state = clustering.scripts.get_initial_state(2500, number_of_clusters)
+    hyper_parameters = globals.HyperParameters()
+    value_function = decision.value_functions.ANNValueFunction(
+        hyper_parameters.ANN_LEARNING_RATE,
+        hyper_parameters.WEIGHT_INITIALIZATION_VALUE,
+        hyper_parameters.DISCOUNT_RATE,
+        hyper_parameters.VEHICLE_INVENTORY_STEP_SIZE,
+        hyper_parameters.LOCATION_REPETITION,
+        hyper_parameters.TRACE_DECAY,
+        list(network_structure),
+    )
+    value_function.setup(state)
+    ann = value_function.model
+    features = np.zeros(
+        (1, value_function.get_number_of_location_indicators_and_state_features(state))
+    )
+
+    def legacy_dumps():
+        return pickle.dumps(legacy_ann_getstate(ann))
+
+    def legacy_loads(data):
+        legacy_ann = ANN.__new__(ANN)
+        legacy_ann.__setstate__(pickle.loads(data))
+        return legacy_ann
+
+    results = {}
+    for name, dumps, loads in [
+        (".hdf5 files", legacy_dumps, legacy_loads),
+        ("Checkpoint", lambda: pickle.dumps(ann), pickle.loads),
+    ]:
+        dump_times, load_times = [], []
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            data = dumps()
+            dump_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            # Predict to include the creation of lazily created models
+            loads(data).predict_batch(features)
+            load_times.append(time.perf_counter() - start)
+        results[name] = {
+            "Pickle (s)": np.mean(dump_times),
+            "Unpickle and predict (s)": np.mean(load_times),
+            "Size (MB)": len(data) / 1e6,
+        }
+    return pd.DataFrame(results).T
+
+
+HEAVY_MODULES = ["tensorflow", "matplotlib", "networkx", "sklearn"]
+
+
+def get_import_time(modules: [str]) -> (float, [str]):
+    """
+    Imports modules in a new interpreter
+    :param modules: names of the modules to import
+    :return: seconds to import the modules and the heavy modules imported with them
+    """
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, time\n"
+            "start = time.perf_counter()\n"
+            f"import {', '.join(modules)}\n"
+            "print(time.perf_counter() - start)\n"
+            f"print(*[module for module in {HEAVY_MODULES} if module in sys.modules])",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    ).stdout.splitlines()
+    return float(output[0]), output[1].split()
+
+
+def benchmark_import_time(
+    module_sets=(
+        ["classes"],
+        ["classes", "decision", "clustering.scripts"],
+        ["decision.value_functions.ANN"],
+        ["visualization.visualizer"],
+    )
+) -> pd.DataFrame:
+    """
+    Measure the time to import the modules of the simulation in a new interpreter
+    :param module_sets: lists of modules to import together
+    :return: dataframe with import time and the heavy modules imported for every set of modules
+    """
+    results = []
+    for modules in module_sets:
+        import_time, heavy_modules = get_import_time(modules)
+        results.append(
+            {"Import time (s)": import_time, "Heavy modules": ", ".join(heavy_modules)}
+        )
+    return pd.DataFrame(
+        results,
+        index=pd.Index([", ".join(modules) for modules in module_sets], name="Modules"),
+    )
+
+
+class LegacyWorldMetric:
+    """
+    The list based world metric recording every metric by scanning all clusters after every event.
+    Kept as a benchmark reference
+    """
+
+    def __init__(self, test_parameter_name="", test_parameter_value=0.0):
+        self.lost_demand = []
+        self.average_negative_deviation_ideal_state = []
+        self.deficient_battery = []
+        self.timeline = []
+        self.total_available_scooters = []
+        self.testing_parameter_name = test_parameter_name
+        self.testing_parameter_value = test_parameter_value
+
+    @classmethod
+    def aggregate_metrics(cls, metrics):
+        def lists_average(lists):
+            return np.mean(np.stack(lists, axis=0), axis=1).tolist()
+
+        new_world_metric = cls()
+        if all([len(metric.timeline) == 0 for metric in metrics]):
+            return new_world_metric
+        number_of_metrics = len(metrics)
+
+        # Fields to take the average of
+        average_fields = [
+            "lost_demand",
+            "average_negative_deviation_ideal_state",
+            "deficient_battery",
+            "total_available_scooters",
+        ]
+        # Create dict with list for every field, start all values on zero
+        fields = {field: [[0] * number_of_metrics] for field in average_fields}
+        # Find the time for the latest event
+        max_time = np.max(np.concatenate([metric.timeline for metric in metrics]))
+        new_world_metric.timeline = list(range(int(max_time) + 1))
+        # populate fields with average at every time step
+        for time in new_world_metric.timeline[1:]:
+            # If there is a new value in the timeline, update the timeline
+            if any([time in metric.timeline for metric in metrics]):
+                for field in fields.keys():
+                    # Add new value if there is a new one, otherwise add previous value
+                    fields[field].append(
+                        [
+                            (
+                                getattr(metric, field)[
+                                    metric.timeline.index(time)
+                                ]  # Takes the first recording in current time
+                                if time in metric.timeline
+                                else fields[field][time - 1][i]
+                            )
+                            for i, metric in enumerate(metrics)
+                        ]
+                    )
+            # Otherwise, add previous values
+            else:
+                for field in fields.keys():
+                    fields[field].append(fields[field][-1])
+        # Take the average of all the runs
+        new_world_metric.__dict__.update(
+            {field: lists_average(metric_list) for field, metric_list in fields.items()}
+        )
+
+        new_world_metric.testing_parameter_name = metrics[0].testing_parameter_name
+        new_world_metric.testing_parameter_value = metrics[0].testing_parameter_value
+        return new_world_metric
+
+    def add_lost_trip(self):
+        # The lost demand is counted from the rewards of the world
+        pass
+
+    def add_analysis_metrics(self, world, changed_cluster_ids=None):
+        """
+        Add data to analysis
+        :param world: world object to record state from
+        """
+        self.lost_demand.append(
+            sum(
+                [
+                    1
+                    for reward, location in world.rewards
+                    if reward == world.LOST_TRIP_REWARD
+                ]
+            )
+            if len(world.rewards) > 0
+            else 0
+        )
+        self.average_negative_deviation_ideal_state.append(
+            sum(
+                [
+                    max(
+                        0,
+                        cluster.ideal_state - cluster.number_of_available_scooters(),
+                    )
+                    for cluster in world.state.clusters
+                ]
+            )
+            / len(world.state.clusters)
+        )
+        self.deficient_battery.append(
+            sum(
+                [
+                    cluster.ideal_state * 100
+                    - (
+                        sum(
+                            [
+                                scooter.battery
+                                for scooter in cluster.get_available_scooters()
+                            ]
+                        )
+                    )
+                    for cluster in world.state.clusters
+                    if len(cluster.scooters) < cluster.ideal_state
+                ]
+            )
+            / len(world.state.get_scooters())
+        )
+        self.total_available_scooters.append(
+            sum(
+                [
+                    cluster.number_of_available_scooters()
+                    for cluster in world.state.clusters
+                ]
+            )
+        )
+        self.timeline.append(world.time)
+
+    def get_all_metrics(self):
+        """
+        Returns all metrics recorded for analysis
+        """
+        return (
+            self.lost_demand,
+            self.average_negative_deviation_ideal_state,
+            self.deficient_battery,
+            self.total_available_scooters,
+        )
+
+
+def benchmark_world_metrics(
+    instances=((2000, 20), (2500, 50)), shift_duration=480
+) -> pd.DataFrame:
+    """
+    Measure the time to run a shift of the do nothing policy when the metrics are recorded by scanning all clusters
+    after every event and when they are recorded incrementally, after every event or once every iteration
+    :param instances: tuples of sample size and number of clusters
+    :param shift_duration: minutes in the shift
+    :return: dataframe with the run time for every instance
+    """
+    results = []
+    for sample_size, number_of_clusters in instances:
+        initial_state = clustering.scripts.get_initial_state(
+            sample_size, number_of_clusters
+        )
+        row = {}
+        for label, resolution, legacy in [
+            ("Legacy", 0, True),
+            ("Every event", 0, False),
+            ("Every iteration", ITERATION_LENGTH_MINUTES, False),
+        ]:
+            random.seed(42)
+            np.random.seed(42)
+            world = classes.World(
+                shift_duration,
+                decision.DoNothing(),
+                copy.deepcopy(initial_state),
+                verbose=False,
+                visualize=False,
+                metrics_resolution=resolution,
+            )
+            if legacy:
+                world.metrics = LegacyWorldMetric()
+            start = time.perf_counter()
+            world.run()
+            row[label] = time.perf_counter() - start
+        results.append(row)
+    return pd.DataFrame(
+        results,
+        index=pd.MultiIndex.from_tuples(
+            instances, names=["Sample size", "Number of clusters"]
+        ),
+    ).rename(columns=lambda column: f"{column} (s)")
+
+
+def benchmark_aggregate_metrics(
+    numbers_of_runs=(4, 16, 64), shift_duration=480
+) -> pd.DataFrame:
+    """
+    Measure the time to aggregate the metrics of several runs with the minute by minute list lookups and with the
+    resampling to a shared time grid
+    :param numbers_of_runs: numbers of runs to aggregate
+    :param shift_duration: minutes in the shift of every run
+    :return: dataframe with the aggregation time for every number of runs
+    """
+    initial_state = clustering.scripts.get_initial_state(2000, 20)
+    metrics = []
+    for seed in range(max(numbers_of_runs)):
+        random.seed(seed)
+        np.random.seed(seed)
+        world = classes.World(
+            shift_duration,
+            decision.DoNothing(),
+            copy.deepcopy(initial_state),
+            verbose=False,
+            visualize=False,
+        )
+        world.run()
+        metrics.append(world.metrics)
+    legacy_metrics = []
+    for metric in metrics:
+        legacy_metric = LegacyWorldMetric()
+        for name in classes.World.WorldMetric.METRICS:
+            setattr(legacy_metric, name, metric.get_metric(name).tolist())
+        legacy_metrics.append(legacy_metric)
+    results = []
+    for number_of_runs in numbers_of_runs:
+        row = {}
+        for label, aggregate, run_metrics in [
+            ("Legacy", LegacyWorldMetric.aggregate_metrics, legacy_metrics),
+            ("Time grid", classes.World.WorldMetric.aggregate_metrics, metrics),
+        ]:
+            start = time.perf_counter()
+            aggregate(run_metrics[:number_of_runs])
+            row[label] = time.perf_counter() - start
+        results.append(row)
+    return pd.DataFrame(
+        results, index=pd.Index(numbers_of_runs, name="Number of runs")
+    ).rename(columns=lambda column: f"{column} (s)")
+
+
+def benchmark_fast_forward(
+    instances=((2000, 20), (2500, 50)), demand_factors=(1, 4), shift_duration=480
+) -> pd.DataFrame:
+    """
+    Measure the time to run a shift of the do nothing policy with the event engine and with the fast forward simulation
+    :param instances: tuples of sample size and number of clusters
+    :param demand_factors: factors to scale the trip intensities of the clusters with
+    :param shift_duration: minutes in the shift
+    :return: dataframe with the run time and lost demand for every instance and demand factor
+    """
+    results = []
+    for sample_size, number_of_clusters in instances:
+        initial_state = clustering.scripts.get_initial_state(
+            sample_size, number_of_clusters
+        )
+        for demand_factor in demand_factors:
+            state = copy.deepcopy(initial_state)
+            for cluster in state.clusters:
+                cluster.trip_intensity_per_iteration *= demand_factor
+            row = {}
+            for label, fast_forward in [
+                ("Event engine", False),
+                ("Fast forward", True),
+            ]:
+                world = classes.World(
+                    shift_duration,
+                    decision.DoNothing(),
+                    copy.deepcopy(state),
+                    verbose=False,
+                    visualize=False,
+                    seed=42,
+                    fast_forward=fast_forward,
+                )
+                start = time.perf_counter()
+                world.run()
+                row[f"{label} (s)"] = time.perf_counter() - start
+                row[f"{label} lost demand"] = world.metrics.get_metric("lost_demand")[
+                    -1
+                ]
+            results.append(row)
+    return pd.DataFrame(
+        results,
+        index=pd.MultiIndex.from_tuples(
+            [
+                (sample_size, number_of_clusters, demand_factor)
+                for sample_size, number_of_clusters in instances
+                for demand_factor in demand_factors
+            ],
+            names=["Sample size", "Number of clusters", "Demand factor"],
+        ),
+    )
+
+
+def legacy_normalized_lists(
+    state, cache=None, current_location=None, action=None
+) -> ([int], [int]):
+    """
+    The list based state features used by the value functions before the vectorized feature encoder.
+    Kept as a benchmark reference
+    """
+    if current_location is not None and action is not None:
+
+        def filter_scooter_ids(ids, isAvailable=True):
+            if isAvailable:
+                available_filter = (
+                    lambda scooter_id: state.clusters[current_location]
+                    .get_scooter_from_id(scooter_id)
+                    .battery
+                    > BATTERY_LIMIT
+                )
+            else:
+                available_filter = (
+                    lambda scooter_id: state.clusters[current_location]
+                    .get_scooter_from_id(scooter_id)
+                    .battery
+                    < BATTERY_LIMIT
+                )
+            return [scooter_id for scooter_id in ids if available_filter(scooter_id)]
+
+        scooters_added_in_current_cluster = (
+            len(
+                filter_scooter_ids(action.battery_swaps, isAvailable=False)
+            )  # Add swapped scooters that where unavailable
+            + len(action.delivery_scooters)  # Add delivered scooters
+            - len(
+                filter_scooter_ids(action.pick_ups, isAvailable=True)
+            )  # subtract removed available scooters
+        )
+        battery_percentage_added = sum(
+            [
+                (
+                    100
+                    - state.clusters[current_location]
+                    .get_scooter_from_id(scooter_id)
+                    .battery
+                )
+                / 100
+                for scooter_id in action.battery_swaps
+            ]
+        ) + sum(
+            [
+                (
+                    100
+                    - state.clusters[current_location]
+                    .get_scooter_from_id(scooter_id)
+                    .battery
+                )
+                / 100
+                for scooter_id in action.pick_ups
+            ]
+        )
+    else:
+        scooters_added_in_current_cluster = 0
+        battery_percentage_added = 0
+
+    current_states, available_scooters = (
+        cache
+        if cache is not None
+        else (
+            [cluster.get_current_state() for cluster in state.clusters],
+            [cluster.number_of_available_scooters() for cluster in state.clusters],
+        )
+    )  # Use cache if you have it
+    negative_deviations, battery_deficiency = [], []
+    for i, cluster in enumerate(state.clusters):
+        deviation = (
+            available_scooters[i]
+            - cluster.ideal_state
+            + (
+                scooters_added_in_current_cluster
+                if cluster.id == current_location
+                else 0
+            )  # Add available scooters from action
+        )
+        negative_deviations.append(min(deviation, 0) / (cluster.ideal_state + 1))
+        battery_deficiency.append(
+            (
+                len(cluster.scooters)
+                - current_states[i]
+                - (battery_percentage_added if cluster.id == current_location else 0)
+            )
+            / (cluster.average_number_of_scooters + 1)
+        )
+
+    def range_one_hot(cluster_list):
+        output = []
+        for cluster in cluster_list:
+            output += ValueFunction.get_one_hot_range(abs(cluster), 0.1)
+        return output
+
+    return (
+        range_one_hot(negative_deviations),
+        range_one_hot(battery_deficiency),
+    )
+
+
+def legacy_state_features(state, vehicle, action=None, cache=None):
+    """
+    The state features created by the value functions before the vectorized feature encoder
+    """
+    negative_deviations, battery_deficiency = legacy_normalized_lists(
+        state,
+        cache,
+        current_location=vehicle.current_location.id if action is not None else None,
+        action=action,
+    )
+    return negative_deviations + battery_deficiency
+
+
+def benchmark_state_features(
+    number_of_clusters=(50, 100, 300), number_of_actions=100
+) -> pd.DataFrame:
+    """
+    Measure next state features per second for the vectorized feature encoder and the list based features
+    :param number_of_clusters: number of clusters in the state
+    :param number_of_actions: number of next state features to create for each state
+    :return: dataframe with features per second for every number of clusters
+    """
+    hyper_parameters = globals.HyperParameters()
+    results = []
+    for size in number_of_clusters:
+        state = clustering.scripts.get_initial_state(2500, size, save=False)
+        vehicle = state.vehicles[0]
+        vehicle.current_location = state.clusters[0]
+        value_function = decision.value_functions.LinearValueFunction(
+            hyper_parameters.WEIGHT_UPDATE_STEP_SIZE,
+            hyper_parameters.WEIGHT_INITIALIZATION_VALUE,
+            hyper_parameters.DISCOUNT_RATE,
+            hyper_parameters.VEHICLE_INVENTORY_STEP_SIZE,
+            hyper_parameters.LOCATION_REPETITION,
+            hyper_parameters.TRACE_DECAY,
+        )
+        value_function.setup(state)
+        actions = state.get_possible_actions(vehicle, number_of_neighbours=5)
+        actions = (actions * number_of_actions)[:number_of_actions]
+        row = {}
+        for label, get_next_state_features in [
+            ("Vectorized", value_function.get_next_state_features),
+            ("Lists", legacy_state_features),
+        ]:
+            start = time.perf_counter()
+            cache = decision.EpsilonGreedyValueFunctionPolicy.get_cache(state)
+            for action in actions:
+                get_next_state_features(state, vehicle, action, cache)
+            row[label] = number_of_actions / (time.perf_counter() - start)
+        results.append(row)
+    return pd.DataFrame(
+        results, index=pd.Index(number_of_clusters, name="Number of clusters")
+    ).rename(columns=lambda column: f"{column} (features/s)")
+
+
+def benchmark_parallel_action_evaluation(
+    number_of_processes=(0, 2, 4),
+    instances=((2000, 20), (2500, 50)),
+    number_of_decisions=10,
+) -> pd.DataFrame:
+    """
+    Measure decision latency for the epsilon greedy policy when evaluating the actions in worker processes
+    :param number_of_processes: number of worker processes, 0 evaluates the actions in this process
+    :param instances: tuples of sample size and number of clusters
+    :param number_of_decisions: number of decisions to time for each instance
+    :return: dataframe with milliseconds per decision for every instance and number of processes
+    """
+    results = []
+    for sample_size, number_of_clusters in instances:
+        world = classes.World(
+            960,
+            None,
+            clustering.scripts.get_initial_state(sample_size, number_of_clusters),
+            visualize=False,
+            EPSILON=0,
+        )
+        world.disable_training = True
+        vehicle = world.state.vehicles[0]
+        vehicle.current_location = world.state.clusters[0]
+        row = {}
+        for processes in number_of_processes:
+            world.NUMBER_OF_ACTION_EVALUATION_PROCESSES = processes
+            policy = world.set_policy(
+                policy_class=decision.EpsilonGreedyValueFunctionPolicy,
+                value_function_class=decision.value_functions.LinearValueFunction,
+            )
+            try:
+                # The first decision starts the worker processes
+                policy.get_best_action(world, vehicle)
+                start = time.perf_counter()
+                for _ in range(number_of_decisions):
+                    policy.get_best_action(world, vehicle)
+                row[f"{processes} processes"] = (
+                    1000 * (time.perf_counter() - start) / number_of_decisions
+                )
+            finally:
+                policy.close()
+        results.append(row)
+    return pd.DataFrame(
+        results,
+        index=pd.MultiIndex.from_tuples(
+            instances, names=["Sample size", "Number of clusters"]
+        ),
+    ).rename(columns=lambda column: f"{column} (ms/decision)")
+
+
+def benchmark_scenario_store(instances=((2000, 20), (2500, 50))) -> pd.DataFrame:
+    """
+    Compare the pickle size and load time of the scenario store with the nested list scenarios
+    :param instances: tuples of sample size and number of clusters
+    :return: dataframe with pickle size and load time for every instance
+    """
+    results = []
+    for sample_size, number_of_clusters in instances:
+        scenarios = clustering.scripts.get_initial_state(
+            sample_size, number_of_clusters
+        ).simulation_scenarios
+        legacy_scenarios = [
+            scenarios.get_scenario(scenario_index)
+            for scenario_index in range(len(scenarios))
+        ]
+        row = {}
+        for label, stored_scenarios in [
+            ("Scenario store", scenarios),
+            ("Lists", legacy_scenarios),
+        ]:
+            pickled_scenarios = pickle.dumps(stored_scenarios, pickle.HIGHEST_PROTOCOL)
+            start = time.perf_counter()
+            pickle.loads(pickled_scenarios)
+            row[f"{label} load time (ms)"] = 1000 * (time.perf_counter() - start)
+            row[f"{label} pickle size (MB)"] = len(pickled_scenarios) / 1e6
+        results.append(row)
+    return pd.DataFrame(
+        results,
+        index=pd.MultiIndex.from_tuples(
+            instances, names=["Sample size", "Number of clusters"]
+        ),
+    )
+
+
+def benchmark_system_simulate(
+    instances=((2000, 20), (2500, 50)), number_of_simulations=100
+) -> pd.DataFrame:
+    """
+    Measure simulations per second for the trip by trip system simulation and the bulk system simulation
+    :param instances: tuples of sample size and number of clusters
+    :param number_of_simulations: number of system simulations to time for each instance
+    :return: dataframe with simulations per second for every instance
+    """
+    results = []
+    for sample_size, number_of_clusters in instances:
+        state = clustering.scripts.get_initial_state(sample_size, number_of_clusters)
+        row = {}
+        for label, simulate in [
+            ("Bulk", system_simulation.scripts.bulk_system_simulate),
+            ("Trip by trip", system_simulation.scripts.system_simulate),
+        ]:
+            random.seed(42)
+            np.random.seed(42)
+            with state.lookahead():
+                start = time.perf_counter()
+                for _ in range(number_of_simulations):
+                    simulate(state)
+                row[label] = number_of_simulations / (time.perf_counter() - start)
+        results.append(row)
+    return pd.DataFrame(
+        results,
+        index=pd.MultiIndex.from_tuples(
+            instances, names=["Sample size", "Number of clusters"]
+        ),
+    ).rename(columns=lambda column: f"{column} (simulations/s)")
+
+
+def legacy_filtering_neighbours(
+    state,
+    vehicle,
+    pick_up,
+    delivery,
+    number_of_neighbours,
+    exclude=None,
+):
+    """
+    The neighbour filtering before the neighbour index, sorting all clusters for every combination.
+    Kept as a benchmark reference
+    """
+    has_inventory = len(vehicle.scooter_inventory) + pick_up - delivery > 0
+    exclude = exclude if exclude else []
+    clusters_positive_deviation = sorted(
+        [
+            cluster
+            for cluster in state.clusters
+            if cluster.id != vehicle.current_location.id
+            and cluster.id not in exclude
+            and len(cluster.get_available_scooters()) - cluster.ideal_state > 0
+        ],
+        key=lambda cluster: len(cluster.get_available_scooters()) - cluster.ideal_state,
+        reverse=True,
+    )
+
+    clusters_negative_deviation = sorted(
+        [
+            cluster
+            for cluster in state.clusters
+            if cluster.id != vehicle.current_location.id
+            and cluster.id not in exclude
+            and len(cluster.get_available_scooters()) - cluster.ideal_state < 0
+        ],
+        key=lambda cluster: len(cluster.get_available_scooters()) - cluster.ideal_state,
+    )
+
+    has_more_capacity = (
+        len(vehicle.scooter_inventory) + pick_up - delivery
+        < vehicle.scooter_inventory_capacity
+    )
+
+    if has_inventory:
+        if has_more_capacity and len(clusters_positive_deviation) > 0:
+            return clusters_negative_deviation[: number_of_neighbours - 1] + [
+                clusters_positive_deviation[0]
+            ]
+        else:
+            return clusters_negative_deviation[:number_of_neighbours]
+    else:
+        return clusters_positive_deviation[:number_of_neighbours]
+
+
+def legacy_possible_actions(
+    state,
+    vehicle,
+    number_of_neighbours,
+    divide=None,
+    exclude=None,
+    time=None,
+):
+    """
+    Enumerate all possible actions the way get_possible_actions did before the neighbour index and the compact action
+    encodings. Kept as a benchmark reference
+    :param time: time of the world when the actions is to be performed
+    :param exclude: clusters to exclude from next cluster
+    :param vehicle: vehicle to perform this action
+    :param number_of_neighbours: number of neighbours to evaluate, if None: all neighbors are returned
+    :param divide: number to divide by to create range increment
+    :return: List of Action objects
+    """
+    actions = []
+    neighbours = legacy_filtering_neighbours(
+        state,
+        vehicle,
+        0,
+        0,
+        number_of_neighbours,
+        exclude=exclude,
+    )
+    # Return empty action if
+    if not vehicle.is_at_depot():
+
+        def get_range(max_int):
+            if divide and divide > 0 and max_int > 0:
+                return list(
+                    {
+                        *(
+                            [
+                                i
+                                for i in range(
+                                    0, max_int + 1, math.ceil(max_int / divide)
+                                )
+                            ]
+                            + [max_int]
+                        )
+                    }
+                )
+            else:
+                return [i for i in range(max_int + 1)]
+
+        # Initiate constraints for battery swap, pick-up and drop-off
+        pick_ups = min(
+            max(
+                len(vehicle.current_location.scooters)
+                - vehicle.current_location.ideal_state,
+                0,
+            ),
+            vehicle.scooter_inventory_capacity - len(vehicle.scooter_inventory),
+            vehicle.battery_inventory,
+        )
+        swaps = vehicle.get_max_number_of_swaps()
+        drop_offs = max(
+            min(
+                vehicle.current_location.ideal_state
+                - len(vehicle.current_location.scooters),
+                len(vehicle.scooter_inventory),
+            ),
+            0,
+        )
+        combinations = []
+        # Different combinations of battery swaps, pick-ups, drop-offs and clusters
+        for pick_up in get_range(pick_ups):
+            for swap in get_range(swaps):
+                for drop_off in get_range(drop_offs):
+                    if (
+                        (pick_up + swap) <= len(vehicle.current_location.scooters)
+                        and (pick_up + swap) <= vehicle.battery_inventory
+                        and (pick_up + swap + drop_off > 0)
+                    ):
+                        for location in legacy_filtering_neighbours(
+                            state,
+                            vehicle,
+                            pick_up,
+                            drop_off,
+                            number_of_neighbours,
+                            exclude=exclude,
+                        ):
+                            combinations.append(
+                                [
+                                    max(
+                                        min(
+                                            vehicle.battery_inventory - pick_up,
+                                            swap,
+                                        ),
+                                        0,
+                                    ),
+                                    pick_up,
+                                    drop_off,
+                                    location.id,
+                                ]
+                            )
+
+        # Assume that no battery swap or pick-up of scooters with 100% battery and
+        # that the scooters with the lowest battery are prioritized
+        swappable_scooters_id = [
+            scooter.id for scooter in vehicle.current_location.get_swappable_scooters()
+        ]
+
+        none_swappable_scooters_id = [
+            scooter.id
+            for scooter in vehicle.current_location.scooters
+            if scooter.battery >= 70
+        ]
+
+        def choose_pick_up(swaps, pickups):
+            number_of_none_swappable_scooters = max(
+                swaps + pickups - len(swappable_scooters_id), 0
+            )
+
+            return (
+                swappable_scooters_id[swaps : swaps + pick_up]
+                + none_swappable_scooters_id[:number_of_none_swappable_scooters]
+            )
+
+        # Adding every action. Actions are the IDs of the scooters to be handled.
+        for battery_swap, pick_up, drop_off, cluster_id in combinations:
+            if not vehicle.is_at_depot() and (
+                vehicle.battery_inventory - battery_swap - pick_up
+                < vehicle.battery_inventory_capacity * 0.1
+            ):
+                # If battery inventory is low, go to depot
+                cluster_id = [
+                    depot.id
+                    for depot in sorted(
+                        state.depots,
+                        key=lambda depot: state.get_distance(
+                            vehicle.current_location.id, depot.id
+                        ),
+                    )
+                    if depot.get_available_battery_swaps(time)
+                    > vehicle.battery_inventory_capacity * 0.9
+                ][0]
+            actions.append(
+                classes.Action(
+                    swappable_scooters_id[:battery_swap],
+                    choose_pick_up(battery_swap, pick_up),
+                    [scooter.id for scooter in vehicle.scooter_inventory][:drop_off],
+                    cluster_id,
+                )
+            )
+    return (
+        actions
+        if len(actions) > 0
+        else [classes.Action([], [], [], neighbour.id) for neighbour in neighbours]
+    )
+
+
+def benchmark_possible_actions(
+    divides=(1, 2, 4, None), number_of_clusters=50, number_of_enumerations=10
+) -> pd.DataFrame:
+    """
+    Measure enumerations per second of the possible actions with the action encodings, the decoded actions and the
+    original enumeration filtering the neighbours for every combination
+    :param divides: divide parameters of get possible actions
+    :param number_of_clusters: number of clusters in the state
+    :param number_of_enumerations: number of enumerations to time for each divide
+    :return: dataframe with number of actions and enumerations per second for every divide
+    """
+    state = clustering.scripts.get_initial_state(2500, number_of_clusters)
+    vehicle = state.vehicles[0]
+    vehicle.current_location = max(
+        state.clusters, key=lambda cluster: len(cluster.get_swappable_scooters())
+    )
+    results = []
+    for divide in divides:
+        row = {}
+        for label, enumerate_actions in [
+            (
+                "Encodings",
+                lambda: list(state.iterate_possible_actions(vehicle, 5, divide=divide)),
+            ),
+            (
+                "Actions",
+                lambda: state.get_possible_actions(vehicle, 5, divide=divide),
+            ),
+            (
+                "Lists",
+                lambda: legacy_possible_actions(state, vehicle, 5, divide=divide),
+            ),
+        ]:
+            start = time.perf_counter()
+            for _ in range(number_of_enumerations):
+                actions = enumerate_actions()
+            row[f"{label} (enumerations/s)"] = number_of_enumerations / (
+                time.perf_counter() - start
+            )
+            row[f"{label} (actions)"] = len(actions)
+        results.append(row)
+    return pd.DataFrame(
+        results, index=pd.Index([str(divide) for divide in divides], name="Divide")
+    )
+
+
+def benchmark_lookahead_scenarios(
+    lookahead_scenarios=(1, 10, 100), number_of_evaluations=100
+) -> pd.DataFrame:
+    """
+    Measure the time and the standard deviation of the lost trips when evaluating an action over several scenarios
+    :param lookahead_scenarios: number of scenarios to average the lost trips over
+    :param number_of_evaluations: number of evaluations of the action
+    :return: dataframe with milliseconds per evaluation and standard deviation of the lost trips
+    """
+    hyper_parameters = globals.HyperParameters()
+    state = clustering.scripts.get_initial_state(2000, 20)
+    # Leave few available scooters to get lost trips
+    for cluster in state.clusters:
+        for scooter in cluster.scooters[1:]:
+            scooter.battery = BATTERY_LIMIT / 2
+    vehicle = state.vehicles[0]
+    vehicle.current_location = state.clusters[0]
+    value_function = decision.value_functions.LinearValueFunction(
+        hyper_parameters.WEIGHT_UPDATE_STEP_SIZE,
+        hyper_parameters.WEIGHT_INITIALIZATION_VALUE,
+        hyper_parameters.DISCOUNT_RATE,
+        hyper_parameters.VEHICLE_INVENTORY_STEP_SIZE,
+        hyper_parameters.LOCATION_REPETITION,
+        hyper_parameters.TRACE_DECAY,
+    )
+    value_function.setup(state)
+    action = state.get_possible_actions(vehicle, number_of_neighbours=3)[0]
+    results = []
+    for scenarios in lookahead_scenarios:
+        rewards = []
+        start = time.perf_counter()
+        for _ in range(number_of_evaluations):
+            reward, _ = decision.EpsilonGreedyValueFunctionPolicy.evaluate_action(
+                state,
+                vehicle,
+                action,
+                0,
+                [],
+                hyper_parameters.DIVIDE_GET_POSSIBLE_ACTIONS,
+                hyper_parameters.NUMBER_OF_NEIGHBOURS,
+                value_function,
+                scenarios,
+            )
+            rewards.append(reward)
+        results.append(
+            {
+                "Time (ms/evaluation)": 1000
+                * (time.perf_counter() - start)
+                / number_of_evaluations,
+                "Lost trips mean": np.mean(rewards),
+                "Lost trips standard deviation": np.std(rewards),
+            }
+        )
+    return pd.DataFrame(
+        results, index=pd.Index(lookahead_scenarios, name="Lookahead scenarios")
+    )
+
+
+if __name__ == "__main__":
+    os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+
+    print(benchmark_event_queue())
+    print(benchmark_generate_scooter_trips())
+    print(benchmark_leave_destinations())
+    print(benchmark_distance_matrix())
+    print(benchmark_lookahead())
+    print(benchmark_value_function_batch())
+    print(benchmark_state_features())
+    print(benchmark_parallel_action_evaluation())
+    print(benchmark_scenario_store())
+    print(benchmark_system_simulate())
+    print(benchmark_possible_actions())
+    print(benchmark_lookahead_scenarios())
+    print(benchmark_replay_training())
+    print(benchmark_ann_training())
+    print(benchmark_ann_checkpoint())
+    print(benchmark_import_time())
+    print(benchmark_world_metrics())
+    print(benchmark_aggregate_metrics())
+    print(benchmark_fast_forward())
@@ -13,7 +13,6 @@ import classes
 import decision.value_functions
 import decision
 import analysis.export_metrics_to_xlsx
-from visualization.visualizer import visualize_analysis
 
 
 def run_analysis_from_path(
@@ -92,8 +91,11 @@ def evaluate_world(world, world_attribute, verbose, runs_per_policy):
         print(f"\n---------- {world.label} ----------")
     metrics = []
     # Run world run_per_policy times
-    for _ in range(runs_per_policy):
+    for run in range(runs_per_policy):
         run_world = copy.deepcopy(world)
+        if world.seed is not None:
+            # Every run draws different trips, reproducible from the seed of the world
+            run_world.set_seed(world.seed + run)
         # run the world and add the world object to a list containing all world instances
         run_world.run()
         metrics.append(run_world.metrics)
@@ -149,6 +151,8 @@ def run_analysis(
         baseline_policy_world.policy = baseline_policy_world.set_policy(
             policy_class=baseline_policy_class
         )
+        # Shifts of baseline policies without decisions are simulated without the event engine
+        baseline_policy_world.fast_forward = True
 
     worlds.append(baseline_policy_world)
 
@@ -173,6 +177,8 @@ def run_analysis(
             td_errors_and_label.append(td_error_tuple_result)
             instances.append(world_result)
 
+    from visualization.visualizer import visualize_analysis
+
     visualize_analysis(instances, title=title)
     if save:
         for world_result in instances:
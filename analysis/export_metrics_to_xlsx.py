@@ -4,6 +4,7 @@ General methods for exporting results for evaluation to excel
 import analysis.evaluate_policies
 import classes
 from globals import HyperParameters, EXCEL_EXPORT_DIR
+import numpy as np
 import pandas as pd
 import os
 from openpyxl import load_workbook
@@ -106,7 +107,7 @@ def metrics_to_xlsx(instances: [classes.World]):
 
 def add_metric_column(instance, metrics_data, column_tuples):
     # making a dict of all metric variables and their values
-    metric_variables = instance.metrics.__dict__
+    metric_variables = instance.metrics.to_dict()
     # removing testing parameter name and value -> easier to have control over all metrics and add new one
     parameter_name = metric_variables["testing_parameter_name"]
     del metric_variables["testing_parameter_name"]
@@ -133,6 +134,83 @@ def add_metric_column(instance, metrics_data, column_tuples):
     return metrics_data, column_tuples
 
 
+# Metrics summed from the event log, and the column and event type counted for every metric
+EVENT_LOG_METRICS = {
+    "Lost demand": ("lost_trips", None),
+    "Trips": (None, "ScooterDeparture"),
+    "Battery swaps": ("battery_swaps", None),
+    "Pick ups": ("pick_ups", None),
+    "Deliveries": ("deliveries", None),
+    "Reward": ("reward", None),
+}
+
+
+def event_log_metrics(directory: str, run_id: str) -> pd.DataFrame:
+    """
+    Streams the chunks of a run in an event log and sums the events of every minute
+    :param directory: directory of the event log
+    :param run_id: id of the run
+    :return: dataframe with the cumulative value of every metric in EVENT_LOG_METRICS at every minute
+    """
+    totals = np.zeros((0, len(EVENT_LOG_METRICS)))
+    for chunk in classes.EventLog.iterate_chunks(directory, run_id):
+        minutes = chunk["time"].astype(int)
+        number_of_minutes = max(len(totals), minutes.max() + 1)
+        if number_of_minutes > len(totals):
+            totals = np.concatenate(
+                [totals, np.zeros((number_of_minutes - len(totals), totals.shape[1]))]
+            )
+        for i, (column, event_type) in enumerate(EVENT_LOG_METRICS.values()):
+            weights = (
+                chunk[column]
+                if column is not None
+                else chunk["event_type"]
+                == classes.EventLog.EVENT_TYPES.index(event_type)
+            )
+            totals[:, i] += np.bincount(
+                minutes, weights=weights, minlength=number_of_minutes
+            )
+    return pd.DataFrame(
+        totals.cumsum(axis=0),
+        columns=list(EVENT_LOG_METRICS.keys()),
+        index=pd.RangeIndex(len(totals), name="Time"),
+    )
+
+
+def event_log_to_xlsx(directory: str, file_name=None) -> str:
+    """
+    Method to export the metrics of all runs in an event log to Excel, without loading the worlds of the runs
+    :param directory: directory of the event log
+    :param file_name: excel file to add the sheet to, Event log.xlsx in the export directory if None
+    :return: name of the added sheet
+    """
+    run_metrics = [
+        event_log_metrics(directory, run_id)
+        for run_id in classes.EventLog.get_run_ids(directory)
+    ]
+    # Runs keep their final values after the end of their shift
+    df = pd.concat(
+        run_metrics,
+        axis=1,
+        keys=[f"Run {i + 1}" for i in range(len(run_metrics))],
+        names=["Run", "Metrics"],
+    ).ffill()
+
+    if file_name is None:
+        if not os.path.exists(EXCEL_EXPORT_DIR):
+            os.makedirs(EXCEL_EXPORT_DIR)
+        file_name = f"{EXCEL_EXPORT_DIR}/Event log.xlsx"
+    sheet_name = os.path.basename(os.path.normpath(directory))
+    with (
+        pd.ExcelWriter(file_name, engine="openpyxl", mode="a", if_sheet_exists="new")
+        if os.path.isfile(file_name)
+        else pd.ExcelWriter(file_name, engine="openpyxl")
+    ) as writer:
+        df.to_excel(writer, sheet_name=sheet_name, startcol=1, startrow=1)
+        # A suffix is added to the sheet name if the file already has a sheet with the name
+        return writer.book.sheetnames[-1]
+
+
 if __name__ == "__main__":
     import sys
 
@@ -1,5 +1,15 @@
+import copy
 import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
 import unittest
+
+import numpy as np
+import pandas as pd
+
 import analysis.evaluate_policies
 import analysis.train_value_function
 import analysis.multiprocessing_training
@@ -58,6 +68,112 @@ class AnalysisTests(unittest.TestCase):
         )
         self.delete_dir(training_directory)
 
+    def test_train_value_function_with_actors(self):
+        self.world.policy = self.world.set_policy(
+            policy_class=decision.EpsilonGreedyValueFunctionPolicy,
+            value_function_class=decision.value_functions.LinearValueFunction,
+        )
+        initial_weights = self.world.policy.value_function.get_weights()
+        # More shifts than actors, the third shift is started when the first is received
+        self.world.MODELS_TO_BE_SAVED = 3
+        analysis.train_value_function.train_value_function(
+            self.world, save_suffix="actors", number_of_actors=2
+        )
+        self.assertAlmostEqual(self.world.policy.epsilon, self.world.FINAL_EPSILON)
+        self.assertEqual(self.world.policy.value_function.shifts_trained, 3)
+        self.assertFalse(
+            (self.world.policy.value_function.get_weights() == initial_weights).all()
+        )
+
+        # Remove created files
+        training_directory = os.path.join(
+            globals.WORLD_CACHE_DIR, self.world.get_train_directory("actors")
+        )
+        self.assertEqual(len(os.listdir(training_directory)), 4)
+        self.delete_dir(training_directory)
+
+    def test_learn_from_shift_in_shift_order(self):
+        self.world.policy = self.world.set_policy(
+            policy_class=decision.EpsilonGreedyValueFunctionPolicy,
+            value_function_class=decision.value_functions.LinearValueFunction,
+        )
+        # The actor shift seeds the global random generators, restore them for the other tests
+        self.addCleanup(random.setstate, random.getstate())
+        self.addCleanup(np.random.set_state, np.random.get_state())
+        analysis.train_value_function.initialize_actor(pickle.dumps(self.world))
+        log = analysis.train_value_function.run_actor_shift(
+            self.world.policy.value_function.get_weights(), 0.5, 0, 1
+        )
+        names = [name for name, _ in log]
+        self.assertIn("train", names)
+        self.assertIn("replay_buffer", names)
+        for name, item in log:
+            if name == "train":
+                # The policy trains the linear value function on the lookahead transition of a decision
+                self.assertEqual(len(item), 3)
+            else:
+                # Transitions with lost trips are added to the negative replay buffer
+                _, reward, _ = item
+                self.assertEqual(name == "replay_buffer_negative", reward != 0)
+
+        # The log is replayed in the order of the shift. Copies of the world share the policy, a pickled world does not
+        world = pickle.loads(pickle.dumps(self.world))
+        for name, item in log:
+            if name == "train":
+                world.policy.value_function.train(item)
+            else:
+                getattr(world.policy.value_function, name).append(item)
+        analysis.train_value_function.learn_from_shift(self.world, log)
+        self.assertTrue(
+            (
+                self.world.policy.value_function.get_weights()
+                == world.policy.value_function.get_weights()
+            ).all()
+        )
+        self.assertEqual(
+            len(self.world.policy.value_function.replay_buffer),
+            names.count("replay_buffer"),
+        )
+
+    def test_learn_from_recorded_training_inputs(self):
+        self.world.policy = self.world.set_policy(
+            policy_class=decision.EpsilonGreedyValueFunctionPolicy,
+            value_function_class=decision.value_functions.LinearValueFunction,
+        )
+        self.world.policy.epsilon = 0
+        self.addCleanup(np.random.set_state, np.random.get_state())
+        # A policy training in this process, and an actor policy recording its training inputs
+        world = pickle.loads(pickle.dumps(self.world))
+        actor_world = pickle.loads(pickle.dumps(self.world))
+        actor_world.disable_training = True
+        actor_world.policy.training_inputs = []
+        for policy_world in [world, actor_world]:
+            np.random.seed(1)
+            policy_world.policy.get_best_action(
+                policy_world, policy_world.state.vehicles[0]
+            )
+        self.assertEqual(len(actor_world.policy.training_inputs), 1)
+        # The learner takes the same training step as the policy
+        analysis.train_value_function.learn_from_shift(
+            self.world,
+            [
+                ("train", training_input)
+                for training_input in actor_world.policy.training_inputs
+            ],
+        )
+        self.assertTrue(
+            (
+                self.world.policy.value_function.get_weights()
+                == world.policy.value_function.get_weights()
+            ).all()
+        )
+        self.assertFalse(
+            (
+                self.world.policy.value_function.get_weights()
+                == actor_world.policy.value_function.get_weights()
+            ).all()
+        )
+
     @staticmethod
     @unittest.skip
     def test_export_to_excel():
@@ -72,6 +188,56 @@ class AnalysisTests(unittest.TestCase):
         # removing the test file that was created during the test
         os.remove(file_name)
 
+    def test_event_log_to_excel(self):
+        with tempfile.TemporaryDirectory() as directory:
+            event_log_directory = os.path.join(directory, "event_log")
+            world = classes.World(
+                40,
+                decision.SwapAllPolicy(),
+                clustering.scripts.get_initial_state(100, 10),
+                visualize=False,
+                event_log_directory=event_log_directory,
+            )
+            run_worlds = [copy.deepcopy(world) for _ in range(2)]
+            for run_world in run_worlds:
+                run_world.run()
+            file_name = os.path.join(directory, "Event log.xlsx")
+            sheet_name = analysis.export_metrics_to_xlsx.event_log_to_xlsx(
+                event_log_directory, file_name
+            )
+            df = pd.read_excel(
+                file_name, sheet_name=sheet_name, header=[1, 2], index_col=1
+            )
+            self.assertEqual(
+                df[("Run 1", "Lost demand")].iloc[-1],
+                run_worlds[0].metrics.number_of_lost_trips,
+            )
+            # A second export of the same log is added as a new sheet
+            self.assertNotEqual(
+                analysis.export_metrics_to_xlsx.event_log_to_xlsx(
+                    event_log_directory, file_name
+                ),
+                sheet_name,
+            )
+
+    def test_import_time(self):
+        # Tensorflow, the plotting libraries and scikit-learn are imported when they are used
+        imported_modules = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys\n"
+                "import classes, decision, clustering.scripts\n"
+                "print(*sys.modules)",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.split()
+        for module in ["tensorflow", "sklearn", "matplotlib"]:
+            self.assertNotIn(module, imported_modules)
+
 
 if __name__ == "__main__":
     unittest.main()
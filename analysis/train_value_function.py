@@ -3,7 +3,13 @@ MAIN SCRIPT FOR TRAINING THE MODEL
 """
 
 import copy
+import pickle
+import random
 import time
+from collections import deque
+from multiprocessing import get_context
+
+import numpy as np
 
 import classes
 import clustering.scripts
@@ -15,7 +21,11 @@ import globals
 
 
 def train_value_function(
-    world, save_suffix="", scenario_training=True, epsilon_decay=True
+    world,
+    save_suffix="",
+    scenario_training=True,
+    epsilon_decay=True,
+    number_of_actors=0,
 ):
     """
     Main method for training any value function attached to world object
@@ -23,8 +33,14 @@ def train_value_function(
     :param save_suffix:
     :param scenario_training:
     :param epsilon_decay:
+    :param number_of_actors: number of processes simulating shifts in parallel, see train_value_function_with_actors.
+    Zero runs the shifts one after another in this process
     :return:
     """
+    if number_of_actors > 0:
+        return train_value_function_with_actors(
+            world, number_of_actors, save_suffix, epsilon_decay
+        )
     # Add progress bar
     progress_bar = IncrementalBar(
         "Training value function",
@@ -74,6 +90,162 @@ def train_value_function(
     return sum(training_times) / number_of_shifts
 
 
+# World of the actor process, received when the process is started
+actor_world = None
+
+
+def initialize_actor(world: bytes):
+    global actor_world
+    actor_world = pickle.loads(world)
+    # The learner trains the value function, the actor only collects transitions
+    actor_world.disable_training = True
+
+
+class ShiftLog:
+    """
+    Stand-in for a replay buffer or the training input list of the policy in the actor. Keeps everything added to
+    them during a shift in one list, in the order it was added
+    """
+
+    def __init__(self, log: list, name: str):
+        """
+        :param log: list of the shift shared by all stand-ins
+        :param name: name of the replay buffer attribute of the value function, or "train" for the training inputs
+        """
+        self.log = log
+        self.name = name
+
+    def append(self, item) -> None:
+        self.log.append((self.name, item))
+
+
+def run_actor_shift(weights, epsilon: float, shift: int, seed: int):
+    """
+    Simulates a shift with the training simulation in the actor process
+    :param weights: weights of the value function of the learner
+    :param epsilon: epsilon of the policy in the shift
+    :param shift: number of the shift
+    :param seed: seed of the random generators in the shift
+    :return: log of the shift in the order it happened, (replay buffer name, transition) for every transition added
+    to a replay buffer and ("train", training input) for every training step of the policy
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    policy_world = copy.deepcopy(actor_world)
+    value_function = policy_world.policy.value_function
+    value_function.set_weights(weights)
+    value_function.update_shifts_trained(shift)
+    policy_world.policy.epsilon = epsilon
+    # Keep the transitions and training steps of the shift to send to the learner
+    log = []
+    for name in ["replay_buffer", "replay_buffer_negative"]:
+        setattr(value_function, name, ShiftLog(log, name))
+    policy_world.policy.training_inputs = ShiftLog(log, "train")
+    training_simulation.scripts.training_simulation(policy_world)
+    return log
+
+
+def learn_from_shift(world, log):
+    """
+    Trains the value function of the world on the log of a shift from an actor. The transitions are added to the
+    replay buffers and the training steps of the policy are taken in the order of the shift, as when the shift is
+    simulated in this process
+    :param world: world object with the value function to train
+    :param log: log returned by run_actor_shift
+    """
+    value_function = world.policy.value_function
+    for name, item in log:
+        if name == "train":
+            value_function.train(item)
+        else:
+            getattr(value_function, name).append(item)
+
+
+def train_value_function_with_actors(
+    world, number_of_actors, save_suffix="", epsilon_decay=True
+):
+    """
+    Trains the value function of the world with actor processes simulating shifts in parallel with the training
+    simulation. The actors send the transitions and training steps of their shift to this process, the learner,
+    training the value function on them in shift order. Every actor starts a new shift, with the current weights of
+    the value function, as soon as the learner has received its last shift, so the shifts are simulated while the
+    learner trains.
+    :param world: world object with the policy and value function to train
+    :param number_of_actors: number of actor processes
+    :param save_suffix: suffix of the training directory
+    :param epsilon_decay: decay epsilon from initial to final epsilon over the shifts
+    :return: average time per shift
+    """
+    progress_bar = IncrementalBar(
+        "Training value function",
+        check_tty=False,
+        max=(world.TRAINING_SHIFTS_BEFORE_SAVE * world.MODELS_TO_BE_SAVED),
+        suffix="%(percent)d%% - ETA %(eta)ds",
+    )
+    print(
+        f"-------------------- {world.policy.value_function.__str__()} training with {number_of_actors} actors "
+        f"--------------------"
+    )
+    number_of_shifts = world.TRAINING_SHIFTS_BEFORE_SAVE * world.MODELS_TO_BE_SAVED
+    value_function = world.policy.value_function
+
+    def get_epsilon(shift):
+        return (
+            world.INITIAL_EPSILON
+            - shift * (world.INITIAL_EPSILON - world.FINAL_EPSILON) / number_of_shifts
+            if epsilon_decay
+            else world.EPSILON
+        )
+
+    def save_world(shift):
+        value_function.update_shifts_trained(shift)
+        world.policy.epsilon = get_epsilon(shift)
+        world.save_world(
+            cache_directory=world.get_train_directory(save_suffix), suffix=shift
+        )
+
+    # Seed every shift to make the shifts independent of the actor simulating them
+    seeds = np.random.randint(2 ** 31 - 1, size=number_of_shifts).tolist()
+    start = time.time()
+    save_world(0)
+    # Spawn the actors, as forking a process after tensorflow is initialized is not supported
+    with get_context("spawn").Pool(
+        number_of_actors,
+        initializer=initialize_actor,
+        initargs=(pickle.dumps(world),),
+    ) as pool:
+        # Shifts submitted to the actors, in the order they are learned from
+        submitted_shifts = deque()
+
+        def submit_shift(shift):
+            # The current weights are broadcast with every new shift
+            submitted_shifts.append(
+                pool.apply_async(
+                    run_actor_shift,
+                    (
+                        value_function.get_weights(),
+                        get_epsilon(shift),
+                        shift,
+                        seeds[shift],
+                    ),
+                )
+            )
+
+        for shift in range(min(number_of_actors, number_of_shifts)):
+            submit_shift(shift)
+        for shift in range(number_of_shifts):
+            log = submitted_shifts.popleft().get()
+            # Keep every actor busy, the next shift is simulated while the learner trains on this one
+            if shift + number_of_actors < number_of_shifts:
+                submit_shift(shift + number_of_actors)
+            learn_from_shift(world, log)
+            progress_bar.next()
+            if (shift + 1) % world.TRAINING_SHIFTS_BEFORE_SAVE == 0:
+                save_world(shift + 1)
+
+    return (time.time() - start) / number_of_shifts
+
+
 if __name__ == "__main__":
     import pandas as pd
     import os
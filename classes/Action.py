@@ -60,7 +60,7 @@ class Action:
         available_scooters = 0
         vehicle_location = vehicle.current_location
         if not vehicle.is_at_depot():
-            available_scooters = len(vehicle_location.get_available_scooters())
+            available_scooters = vehicle_location.number_of_available_scooters()
             for scooter_id in self.battery_swaps:
                 battery_swap_scooter = vehicle.current_location.get_scooter_from_id(
                     scooter_id
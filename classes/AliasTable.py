@@ -0,0 +1,74 @@
+import numpy as np
+
+
+class AliasTable:
+    """
+    Alias method tables for sampling from several discrete distributions over the same outcomes.
+    Row i of the tables samples from distribution i in O(1): a uniform draw picks an outcome and the position of the
+    draw inside the outcome decides between the outcome and its alias
+    """
+
+    def __init__(self, distributions: np.ndarray):
+        """
+        :param distributions: (number of distributions, number of outcomes) matrix with a distribution in every row
+        """
+        distributions = np.asarray(distributions, dtype=float)
+        self.probabilities = np.ones(distributions.shape)
+        self.aliases = np.tile(
+            np.arange(distributions.shape[1]), (len(distributions), 1)
+        )
+        for row, distribution in enumerate(distributions):
+            self.probabilities[row], self.aliases[row] = AliasTable.build_row(
+                distribution
+            )
+
+    @staticmethod
+    def build_row(distribution: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Builds the tables of one distribution with Vose's method
+        :param distribution: probabilities of the outcomes, normalized if they do not sum to one
+        :return: probability of keeping every outcome and the alias of every outcome
+        """
+        number_of_outcomes = len(distribution)
+        scaled = distribution * number_of_outcomes / np.sum(distribution)
+        probabilities = np.ones(number_of_outcomes)
+        aliases = np.arange(number_of_outcomes)
+        small = [outcome for outcome, value in enumerate(scaled) if value < 1]
+        large = [outcome for outcome, value in enumerate(scaled) if value >= 1]
+        while small and large:
+            small_outcome = small.pop()
+            large_outcome = large.pop()
+            probabilities[small_outcome] = scaled[small_outcome]
+            aliases[small_outcome] = large_outcome
+            # The large outcome gives the rest of the small outcome's column
+            scaled[large_outcome] += scaled[small_outcome] - 1
+            (small if scaled[large_outcome] < 1 else large).append(large_outcome)
+        # The outcomes left only differ from one by rounding errors and keep a probability of one
+        return probabilities, aliases
+
+    def sample(self, rows, random_state=np.random):
+        """
+        Draws one outcome from the distribution of every row
+        :param rows: index of a distribution, or an array of indices to draw one outcome for each
+        :param random_state: numpy random state to draw from
+        :return: the index of the drawn outcome, or an array of outcome indices for an array of rows
+        """
+        if isinstance(rows, (int, np.integer)):
+            # Single draws are made without building arrays, they are made for every trip in the event simulation
+            draw = random_state.random_sample() * self.probabilities.shape[1]
+            outcome = int(draw)
+            if draw - outcome < self.probabilities[rows, outcome]:
+                return outcome
+            return int(self.aliases[rows, outcome])
+        rows = np.asarray(rows)
+        draws = random_state.random_sample(rows.shape) * self.probabilities.shape[1]
+        outcomes = draws.astype(np.int64)
+        outcomes = np.where(
+            draws - outcomes < self.probabilities[rows, outcomes],
+            outcomes,
+            self.aliases[rows, outcomes],
+        )
+        return int(outcomes) if outcomes.ndim == 0 else outcomes
+
+    def __repr__(self):
+        return f"<AliasTable: {len(self.probabilities)} distributions of {self.probabilities.shape[1]} outcomes>"
@@ -1,3 +1,5 @@
+from bisect import bisect_left, insort
+import math
 from shapely.geometry import MultiPoint
 import numpy as np
 from classes.Scooter import Scooter
@@ -6,11 +8,32 @@ from globals import CLUSTER_CENTER_DELTA, BATTERY_LIMIT
 import copy
 
 
+def add_to_partials(partials: [float], value: float):
+    """
+    Adds a value to a list of non-overlapping partial sums without rounding errors (Shewchuk's algorithm).
+    math.fsum(partials) is the correctly rounded sum of all values added, independent of the order they were added
+    """
+    i = 0
+    for partial in partials:
+        if abs(value) < abs(partial):
+            value, partial = partial, value
+        high = value + partial
+        low = partial - (high - value)
+        if low:
+            partials[i] = low
+            i += 1
+        value = high
+    partials[i:] = [value]
+
+
 class Cluster(Location):
     """
     Cluster class representing a collection of e-scooters. Contains all customer behaviour data.
     """
 
+    # Recompute the incrementally maintained aggregates on every query and raise if they differ. Used in tests
+    CHECK_AGGREGATES = False
+
     def __init__(
         self,
         cluster_id: int,
@@ -31,6 +54,124 @@ class Cluster(Location):
         )
         self.move_probabilities = move_probabilities
 
+    @property
+    def scooters(self) -> [Scooter]:
+        return self._scooters
+
+    @scooters.setter
+    def scooters(self, scooters: [Scooter]):
+        for scooter in getattr(self, "_scooters", []):
+            if scooter.cluster is self:
+                scooter.cluster = None
+        self._scooters = scooters
+        # Index of the scooters in the cluster by id, kept consistent by add_scooter and remove_scooter
+        self._scooter_index = {}
+        # Aggregates kept consistent by add_scooter, remove_scooter and update_scooter_battery
+        self._sequence_numbers = {}
+        self._next_sequence_number = 0
+        self._number_of_available_scooters = 0
+        self._total_battery_partials = []
+        self._available_battery_partials = []
+        # Sorted list of (battery, sequence number, scooter). The sequence number is increasing in the order
+        # the scooters are added, so scooters with equal battery are ordered as in the scooter list
+        self._battery_order = []
+        for scooter in scooters:
+            if scooter.id in self._scooter_index:
+                raise ValueError(
+                    f"There are more than one scooter matching on id {scooter.id}"
+                )
+            self.__index_scooter(scooter)
+
+    def __index_scooter(self, scooter: Scooter):
+        self._scooter_index[scooter.id] = scooter
+        sequence_number = self._next_sequence_number
+        self._next_sequence_number += 1
+        self._sequence_numbers[scooter.id] = sequence_number
+        self.__add_battery(scooter, scooter.battery, sequence_number)
+        scooter.cluster = self
+
+    def __unindex_scooter(self, scooter: Scooter):
+        del self._scooter_index[scooter.id]
+        sequence_number = self._sequence_numbers.pop(scooter.id)
+        self.__remove_battery(scooter.battery, sequence_number)
+        if scooter.cluster is self:
+            scooter.cluster = None
+
+    def __add_battery(self, scooter: Scooter, battery: float, sequence_number: int):
+        if battery >= BATTERY_LIMIT:
+            self._number_of_available_scooters += 1
+            add_to_partials(self._available_battery_partials, battery)
+        add_to_partials(self._total_battery_partials, battery)
+        insort(self._battery_order, (battery, sequence_number, scooter))
+
+    def __remove_battery(self, battery: float, sequence_number: int):
+        if battery >= BATTERY_LIMIT:
+            self._number_of_available_scooters -= 1
+            add_to_partials(self._available_battery_partials, -battery)
+        add_to_partials(self._total_battery_partials, -battery)
+        del self._battery_order[
+            bisect_left(self._battery_order, (battery, sequence_number))
+        ]
+
+    def update_scooter_battery(self, scooter: Scooter, old_battery: float):
+        """
+        Updates the aggregates of the cluster after the battery of a scooter in the cluster has changed
+        :param scooter: scooter with changed battery
+        :param old_battery: battery of the scooter before the change
+        """
+        if self._scooter_index.get(scooter.id) is not scooter:
+            # The scooter has been removed from the cluster by replacing the scooter list
+            return
+        sequence_number = self._sequence_numbers[scooter.id]
+        self.__remove_battery(old_battery, sequence_number)
+        self.__add_battery(scooter, scooter.battery, sequence_number)
+
+    def check_aggregates(self):
+        """
+        Raises a ValueError if the incrementally maintained aggregates differ from the aggregates of the scooter list
+        """
+        if len(self._scooter_index) != len(self.scooters) or any(
+            self._scooter_index.get(scooter.id) is not scooter
+            for scooter in self.scooters
+        ):
+            raise ValueError(f"The scooter index of cluster {self.id} is inconsistent")
+        if self._number_of_available_scooters != len(
+            [scooter for scooter in self.scooters if scooter.battery >= BATTERY_LIMIT]
+        ):
+            raise ValueError(
+                f"The number of available scooters of cluster {self.id} is inconsistent"
+            )
+        if math.fsum(self._total_battery_partials) != math.fsum(
+            scooter.battery for scooter in self.scooters
+        ):
+            raise ValueError(f"The battery sum of cluster {self.id} is inconsistent")
+        if math.fsum(self._available_battery_partials) != math.fsum(
+            scooter.battery
+            for scooter in self.scooters
+            if scooter.battery >= BATTERY_LIMIT
+        ):
+            raise ValueError(
+                f"The available battery sum of cluster {self.id} is inconsistent"
+            )
+        if [scooter for _, _, scooter in self._battery_order] != sorted(
+            self.scooters, key=lambda scooter: scooter.battery
+        ):
+            raise ValueError(f"The battery order of cluster {self.id} is inconsistent")
+        sequence_numbers = [
+            self._sequence_numbers[scooter.id] for scooter in self.scooters
+        ]
+        if sequence_numbers != sorted(sequence_numbers):
+            raise ValueError(
+                f"The sequence numbers of cluster {self.id} are not in the order of the scooter list"
+            )
+
+    def __setstate__(self, state):
+        # Clusters pickled before the scooter index was introduced stores the scooter list as "scooters"
+        scooters = state.pop("scooters", None)
+        self.__dict__.update(state)
+        if scooters is not None:
+            self.scooters = scooters
+
     def __deepcopy__(self, *args):
         return Cluster(
             self.id,
@@ -56,7 +197,9 @@ class Cluster(Location):
             return return_function
 
     def get_current_state(self) -> float:
-        return sum(map(lambda scooter: scooter.battery / 100, self.scooters))
+        if Cluster.CHECK_AGGREGATES:
+            self.check_aggregates()
+        return math.fsum(self._total_battery_partials) / 100
 
     @Decorators.check_move_probabilities
     def get_leave_distribution(self):
@@ -71,6 +214,11 @@ class Cluster(Location):
         return distribution / np.sum(distribution)
 
     def set_move_probabilities(self, move_probabilities: np.ndarray):
+        """
+        Replaces the move probabilities of the cluster. The alias tables of the state are rebuilt from the new
+        probabilities, so they must be a new array and not the current one changed in place
+        :param move_probabilities: probability of a trip from this cluster ending in every cluster
+        """
         self.move_probabilities = move_probabilities
 
     def number_of_possible_pickups(self):
@@ -89,30 +237,106 @@ class Cluster(Location):
         return cluster_centroid.x, cluster_centroid.y
 
     def add_scooter(self, scooter: Scooter):
-        matches = [
-            cluster_scooter
-            for cluster_scooter in self.scooters
-            if scooter.id == cluster_scooter.id
-        ]
-        if len(matches) > 0:
-            raise ValueError(
-                f"The scooter you are trying to add is already in the cluster: {matches}"
-            )
-        # Adding scooter to scooter list
-        self.scooters.append(scooter)
         # Changing coordinates of scooter to this location + some delta
-        delta_lat = np.random.uniform(-CLUSTER_CENTER_DELTA, CLUSTER_CENTER_DELTA)
-        delta_lon = np.random.uniform(-CLUSTER_CENTER_DELTA, CLUSTER_CENTER_DELTA)
-        scooter.set_coordinates(self.get_lat() + delta_lat, self.get_lon() + delta_lon)
+        self.add_scooters(
+            [scooter],
+            np.random.uniform(-CLUSTER_CENTER_DELTA, CLUSTER_CENTER_DELTA, (1, 2)),
+        )
 
     def remove_scooter(self, scooter: Scooter):
         self.scooters.remove(scooter)
+        self.__unindex_scooter(scooter)
+
+    def add_scooters(self, scooters: [Scooter], coordinate_deltas: np.ndarray):
+        """
+        Adds scooters in bulk and moves them to the given offsets from the cluster center
+        :param scooters: scooters to add
+        :param coordinate_deltas: (number of scooters, 2) array of the lat and lon deltas from the cluster center
+        """
+        for scooter, (delta_lat, delta_lon) in zip(
+            scooters, coordinate_deltas.tolist()
+        ):
+            if scooter.id in self._scooter_index:
+                raise ValueError(
+                    f"The scooter you are trying to add is already in the cluster: {[self._scooter_index[scooter.id]]}"
+                )
+            # Adding scooter to scooter list
+            self.scooters.append(scooter)
+            self.__index_scooter(scooter)
+            scooter.set_coordinates(
+                self.get_lat() + delta_lat, self.get_lon() + delta_lon
+            )
+
+    def remove_scooters(self, scooters: [Scooter]):
+        """
+        Removes scooters in bulk, equal to calling remove_scooter for each scooter in turn
+        :param scooters: scooters to remove
+        """
+        removed_scooter_ids = set()
+        for scooter in scooters:
+            if self._scooter_index.get(scooter.id) is not scooter:
+                raise ValueError(f"The scooter {scooter} is not in the cluster")
+            removed_scooter_ids.add(scooter.id)
+        self._scooters = [
+            scooter
+            for scooter in self.scooters
+            if scooter.id not in removed_scooter_ids
+        ]
+        for scooter in scooters:
+            self.__unindex_scooter(scooter)
+
+    def get_scooter_position(self, scooter: Scooter) -> (int, int):
+        """
+        :return: index of the scooter in the scooter list and the order it was added, used by insert_scooter
+        """
+        return self.scooters.index(scooter), self._sequence_numbers[scooter.id]
+
+    def insert_scooter(self, scooter: Scooter, position: (int, int)):
+        """
+        Inserts a removed scooter back into its position in the cluster without changing its coordinates
+        :param scooter: scooter to insert
+        :param position: position of the scooter before it was removed, from get_scooter_position
+        """
+        if scooter.id in self._scooter_index:
+            raise ValueError(
+                f"The scooter you are trying to insert is already in the cluster: {scooter}"
+            )
+        index, sequence_number = position
+        self.scooters.insert(index, scooter)
+        self._scooter_index[scooter.id] = scooter
+        self._sequence_numbers[scooter.id] = sequence_number
+        self.__add_battery(scooter, scooter.battery, sequence_number)
+        scooter.cluster = self
 
     def get_available_scooters(self):
+        if Cluster.CHECK_AGGREGATES:
+            self.check_aggregates()
+        if self._number_of_available_scooters == len(self.scooters):
+            return self.scooters.copy()
+        # The available scooters are at the top of the battery order, returned in the order of the scooter list
         return [
-            scooter for scooter in self.scooters if scooter.battery >= BATTERY_LIMIT
+            scooter
+            for _, _, scooter in sorted(
+                self._battery_order[
+                    bisect_left(self._battery_order, (BATTERY_LIMIT,)) :
+                ],
+                key=lambda item: item[1],
+            )
         ]
 
+    def number_of_available_scooters(self) -> int:
+        if Cluster.CHECK_AGGREGATES:
+            self.check_aggregates()
+        return self._number_of_available_scooters
+
+    def get_available_battery(self) -> float:
+        """
+        :return: the sum of the battery of the available scooters, in percent
+        """
+        if Cluster.CHECK_AGGREGATES:
+            self.check_aggregates()
+        return math.fsum(self._available_battery_partials)
+
     def print_all_scooters(self, with_coordinates=False):
         string = ""
         for scooter in self.scooters:
@@ -126,25 +350,19 @@ class Cluster(Location):
         """
         Filter out scooters with 100% battery and sort them by battery percentage
         """
-        scooters = [
-            scooter for scooter in self.scooters if scooter.battery < battery_limit
+        if Cluster.CHECK_AGGREGATES:
+            self.check_aggregates()
+        return [
+            scooter
+            for _, _, scooter in self._battery_order[
+                : bisect_left(self._battery_order, (battery_limit,))
+            ]
         ]
-        return sorted(scooters, key=lambda scooter: scooter.battery, reverse=False)
 
     def get_scooter_from_id(self, scooter_id):
-        matches = [
-            cluster_scooter
-            for cluster_scooter in self.scooters
-            if scooter_id == cluster_scooter.id
-        ]
-        if len(matches) == 1:
-            return matches[0]
-        elif len(matches) > 1:
-            raise ValueError(
-                f"There are more than one scooter ({len(matches)} scooters) "
-                f"matching on id {scooter_id} in Cluster {self.id}"
-            )
-        else:
+        try:
+            return self._scooter_index[scooter_id]
+        except KeyError:
             raise ValueError(f"No scooters with id={scooter_id} where found")
 
     def __repr__(self):
@@ -0,0 +1,181 @@
+import os
+import uuid
+
+import numpy as np
+
+
+class EventLog:
+    """
+    Append-only columnar log of the events of world runs.
+    The rows are buffered in preallocated arrays and written to the log directory in chunks of a fixed number of rows,
+    one npz file with an array for every column per chunk, so the memory use does not grow with the length of the
+    shift. Every log writes its chunks under its own run id, and copies of a log write a new run to the same directory
+    """
+
+    # Name and type of every column, -1 marks a missing cluster, vehicle or scooter
+    COLUMNS = {
+        "time": np.float64,
+        "event_type": np.int8,
+        "cluster": np.int32,
+        "vehicle": np.int32,
+        "scooter": np.int32,
+        "reward": np.float64,
+        "lost_trips": np.int32,
+        "battery_swaps": np.int16,
+        "pick_ups": np.int16,
+        "deliveries": np.int16,
+    }
+
+    # Event types are stored as the index in this tuple
+    EVENT_TYPES = (
+        "ScooterDeparture",
+        "ScooterArrival",
+        "LostTrip",
+        "VehicleArrival",
+        "SystemSimulation",
+    )
+
+    def __init__(self, directory: str, chunk_size=4096):
+        """
+        :param directory: directory to write the chunks to, created if it does not exist
+        :param chunk_size: number of rows in every chunk
+        """
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.run_id = uuid.uuid4().hex[:12]
+        self.number_of_chunks = 0
+        self.number_of_written_rows = 0
+        self.buffer = {
+            column: np.zeros(chunk_size, dtype=dtype)
+            for column, dtype in EventLog.COLUMNS.items()
+        }
+        self.buffer_size = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def __getstate__(self):
+        # A copy of the log starts a new run, the buffered rows are left to be written by this log
+        return {"directory": self.directory, "chunk_size": self.chunk_size}
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"], state["chunk_size"])
+
+    def __len__(self):
+        return self.number_of_written_rows + self.buffer_size
+
+    def record(
+        self,
+        time: float,
+        event_type: str,
+        cluster=-1,
+        vehicle=-1,
+        scooter=-1,
+        reward=0.0,
+        lost_trips=0,
+        battery_swaps=0,
+        pick_ups=0,
+        deliveries=0,
+    ) -> None:
+        """
+        Appends a row to the log, and writes a chunk when the buffer is full
+        :param time: time of the event
+        :param event_type: one of the EVENT_TYPES
+        :param cluster: id of the cluster of the event
+        :param vehicle: id of the vehicle of the event
+        :param scooter: id of the scooter of the event
+        :param reward: reward given for the event
+        :param lost_trips: number of trips lost in the event
+        :param battery_swaps: number of battery swaps in the action of the event
+        :param pick_ups: number of pick ups in the action of the event
+        :param deliveries: number of deliveries in the action of the event
+        """
+        row = self.buffer_size
+        self.buffer["time"][row] = time
+        self.buffer["event_type"][row] = EventLog.EVENT_TYPES.index(event_type)
+        self.buffer["cluster"][row] = cluster
+        self.buffer["vehicle"][row] = vehicle
+        self.buffer["scooter"][row] = scooter
+        self.buffer["reward"][row] = reward
+        self.buffer["lost_trips"][row] = lost_trips
+        self.buffer["battery_swaps"][row] = battery_swaps
+        self.buffer["pick_ups"][row] = pick_ups
+        self.buffer["deliveries"][row] = deliveries
+        self.buffer_size += 1
+        if self.buffer_size == self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows as a new chunk
+        """
+        if self.buffer_size == 0:
+            return
+        file_name = f"{self.run_id}-{self.number_of_chunks:06d}.npz"
+        temporary_path = os.path.join(self.directory, f".{file_name}")
+        with open(temporary_path, "wb") as file:
+            np.savez(
+                file,
+                **{
+                    column: values[: self.buffer_size]
+                    for column, values in self.buffer.items()
+                },
+            )
+        # Readers never see a partially written chunk
+        os.replace(temporary_path, os.path.join(self.directory, file_name))
+        self.number_of_chunks += 1
+        self.number_of_written_rows += self.buffer_size
+        self.buffer_size = 0
+
+    @staticmethod
+    def get_run_ids(directory: str) -> [str]:
+        """
+        :param directory: directory of the log
+        :return: the ids of the runs in the log, in the order the runs were started
+        """
+        first_chunks = sorted(
+            (
+                os.path.getmtime(os.path.join(directory, file_name)),
+                file_name.split("-")[0],
+            )
+            for file_name in os.listdir(directory)
+            if file_name.endswith("-000000.npz") and not file_name.startswith(".")
+        )
+        return [run_id for _, run_id in first_chunks]
+
+    @staticmethod
+    def iterate_chunks(directory: str, run_id: str):
+        """
+        Reads the chunks of a run one at a time
+        :param directory: directory of the log
+        :param run_id: id of the run to read
+        :return: generator of dicts with an array for every column
+        """
+        file_names = sorted(
+            file_name
+            for file_name in os.listdir(directory)
+            if file_name.startswith(f"{run_id}-") and file_name.endswith(".npz")
+        )
+        for file_name in file_names:
+            with np.load(os.path.join(directory, file_name)) as chunk:
+                yield {column: chunk[column] for column in EventLog.COLUMNS}
+
+    @staticmethod
+    def read(directory: str, run_id: str) -> dict:
+        """
+        :param directory: directory of the log
+        :param run_id: id of the run to read
+        :return: dict with an array for every column, containing all rows of the run
+        """
+        chunks = list(EventLog.iterate_chunks(directory, run_id))
+        return {
+            column: (
+                np.concatenate([chunk[column] for chunk in chunks])
+                if len(chunks) > 0
+                else np.zeros(0, dtype=dtype)
+            )
+            for column, dtype in EventLog.COLUMNS.items()
+        }
+
+    def __repr__(self):
+        return (
+            f"<EventLog: run {self.run_id} with {len(self)} rows in {self.directory}>"
+        )
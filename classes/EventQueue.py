@@ -0,0 +1,82 @@
+import heapq
+import math
+
+
+class EventQueue:
+    """
+    Priority queue of events ordered by time. Used by the world object as its event stack.
+    Events with the same time are returned in the order they were added to the queue.
+    """
+
+    def __init__(self, events=None):
+        # Heap of (time, sequence number, event). The sequence number breaks ties between events with the same time
+        self.heap = []
+        self.sequence_number = 0
+        for event in events if events else []:
+            self.push(event)
+
+    def push(self, event) -> None:
+        """
+        Adds an event to the queue in O(log n)
+        :param event: event to insert
+        """
+        heapq.heappush(self.heap, (event.time, self.sequence_number, event))
+        self.sequence_number += 1
+
+    def extend(self, events) -> None:
+        """
+        Adds several events to the queue. Large batches are added to the heap in one O(n) pass instead of one push per
+        event. Events with the same time are returned in the order they are given
+        :param events: events to insert
+        """
+        items = [
+            (event.time, sequence_number, event)
+            for sequence_number, event in enumerate(events, self.sequence_number)
+        ]
+        self.sequence_number += len(items)
+        if len(items) * math.log2(len(self.heap) + 2) < len(self.heap) + len(items):
+            for item in items:
+                heapq.heappush(self.heap, item)
+        else:
+            self.heap.extend(items)
+            heapq.heapify(self.heap)
+
+    def pop(self):
+        """
+        Removes and returns the earliest event in the queue in O(log n)
+        :return: event with the lowest time
+        """
+        try:
+            _, _, event = heapq.heappop(self.heap)
+        except IndexError:
+            raise IndexError("pop from empty event queue")
+        return event
+
+    def peek(self):
+        """
+        :return: the earliest event in the queue without removing it
+        """
+        try:
+            return self.heap[0][2]
+        except IndexError:
+            raise IndexError("peek at empty event queue")
+
+    def remove_events(self, condition) -> None:
+        """
+        Removes all events satisfying the condition. The order of the remaining events is kept
+        :param condition: function taking an event and returning True if the event is to be removed
+        """
+        self.heap = [item for item in self.heap if not condition(item[2])]
+        heapq.heapify(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __iter__(self):
+        """
+        Iterates over the events in the order they will be popped from the queue
+        """
+        return (event for _, _, event in sorted(self.heap))
+
+    def __repr__(self):
+        return f"<EventQueue with {len(self.heap)} events>"
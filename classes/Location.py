@@ -1,4 +1,7 @@
 from math import sqrt, pi, sin, cos, atan2
+
+import numpy as np
+
 from globals import GEOSPATIAL_BOUND_NEW
 
 
@@ -67,3 +70,22 @@ class Location:
         c = 2 * atan2(sqrt(a), sqrt(1 - a))
         distance = radius * c
         return distance
+
+    @staticmethod
+    def haversine_matrix(lats, lons):
+        """
+        Vectorized version of the haversine formula computing the distance between all pairs of coordinates
+        :param lats: array of lat coordinates
+        :param lons: array of lon coordinates
+        :return: matrix where element [i][j] is the kilometers between coordinate i and j
+        """
+        radius = 6378.137
+        lats = np.asarray(lats, dtype="float64") * pi / 180
+        lons = np.asarray(lons, dtype="float64") * pi / 180
+        d_lat = lats[np.newaxis, :] - lats[:, np.newaxis]
+        d_lon = lons[np.newaxis, :] - lons[:, np.newaxis]
+        a = np.sin(d_lat / 2) * np.sin(d_lat / 2) + np.outer(
+            np.cos(lats), np.cos(lats)
+        ) * np.sin(d_lon / 2) * np.sin(d_lon / 2)
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        return radius * c
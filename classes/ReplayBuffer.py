@@ -0,0 +1,71 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of (state features, reward, next state features) transitions stored in preallocated arrays.
+    The arrays are allocated when the first transition is added, as the number of features is known then.
+    When the buffer is full the oldest transition is overwritten, as in a deque with a max length
+    """
+
+    def __init__(self, capacity=64):
+        """
+        :param capacity: maximum number of transitions in the buffer
+        """
+        self.capacity = capacity
+        self.states = None
+        self.rewards = np.zeros(capacity)
+        self.next_states = None
+        # Index of the next transition to overwrite and the number of transitions in the buffer
+        self.position = 0
+        self.size = 0
+
+    def append(self, transition):
+        """
+        Adds a transition to the buffer
+        :param transition: tuple of state features, reward and next state features
+        """
+        state_features, reward, next_state_features = transition
+        if self.states is None:
+            self.states = np.zeros((self.capacity, len(state_features)))
+            self.next_states = np.zeros((self.capacity, len(next_state_features)))
+        self.states[self.position] = state_features
+        self.rewards[self.position] = reward
+        self.next_states[self.position] = next_state_features
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def extend(self, transitions):
+        for transition in transitions:
+            self.append(transition)
+
+    def get_indices(self) -> np.ndarray:
+        """
+        :return: the indices of the transitions in the arrays, from the oldest to the newest
+        """
+        return (np.arange(self.size) + self.position - self.size) % self.capacity
+
+    def sample(self, batch_size: int):
+        """
+        Draws transitions uniformly without replacement
+        :param batch_size: number of transitions to draw
+        :return: state features matrix, rewards and next state features matrix of the transitions
+        """
+        indices = np.random.choice(self.size, batch_size, replace=False)
+        return self.states[indices], self.rewards[indices], self.next_states[indices]
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        if self.size == 0:
+            return iter(())
+        indices = self.get_indices()
+        return zip(
+            self.states[indices],
+            self.rewards[indices].tolist(),
+            self.next_states[indices],
+        )
+
+    def __repr__(self):
+        return f"<ReplayBuffer: {self.size}/{self.capacity} transitions>"
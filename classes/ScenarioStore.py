@@ -0,0 +1,165 @@
+import os
+
+import numpy as np
+
+
+class ScenarioStore:
+    """
+    Columnar storage of the system simulation scenarios.
+    The number of trips out of every cluster in every scenario is stored in a (scenario, cluster) matrix, and the end
+    cluster ids of the trips in one flat array where the destinations of scenario s and cluster c are
+    destinations[offsets[s * number_of_clusters + c] : offsets[s * number_of_clusters + c + 1]]
+    """
+
+    FILE_NAMES = ("cluster_ids", "trips", "offsets", "destinations")
+
+    def __init__(
+        self,
+        cluster_ids: np.ndarray,
+        trips: np.ndarray,
+        destinations: np.ndarray,
+        offsets: np.ndarray = None,
+    ):
+        """
+        :param cluster_ids: ids of the start clusters, in the order of the columns of the trips matrix
+        :param trips: (number of scenarios, number of clusters) matrix with the number of trips out of every cluster
+        :param destinations: end cluster ids of all trips, ordered by scenario and start cluster
+        :param offsets: start of the destinations of every scenario and cluster, computed from the trips if not given
+        """
+        self.cluster_ids = ScenarioStore.compact_array(cluster_ids)
+        self.trips = ScenarioStore.compact_array(trips)
+        self.destinations = ScenarioStore.compact_array(destinations)
+        if offsets is None:
+            offsets = ScenarioStore.get_offsets(self.trips)
+        self.offsets = ScenarioStore.compact_array(offsets)
+        if self.trips.shape[1:] != self.cluster_ids.shape:
+            raise ValueError(
+                f"The trips matrix has {self.trips.shape[1:]} columns, expected one for each of the "
+                f"{len(self.cluster_ids)} clusters"
+            )
+        if self.offsets[-1] != len(self.destinations):
+            raise ValueError(
+                f"The scenarios have {self.offsets[-1]} trips, but there are {len(self.destinations)} destinations"
+            )
+
+    @staticmethod
+    def compact_array(values) -> np.ndarray:
+        """
+        Converts non-negative integers to an array of the smallest unsigned integer type that can hold them.
+        Arrays that already have that type, including memory-mapped arrays, are returned as they are
+        """
+        values = np.asanyarray(values)
+        dtype = np.min_scalar_type(values.max()) if values.size > 0 else np.uint8
+        return values if values.dtype == dtype else values.astype(dtype)
+
+    @staticmethod
+    def get_offsets(trips: np.ndarray) -> np.ndarray:
+        """
+        :return: the start of the destinations of every scenario and cluster, and the total number of trips last
+        """
+        offsets = np.zeros(trips.size + 1, dtype=np.int64)
+        np.cumsum(trips, out=offsets[1:], dtype=np.int64)
+        return offsets
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The offsets are as large as the trips matrix and are recomputed when unpickled
+        del state["offsets"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.offsets = ScenarioStore.compact_array(
+            ScenarioStore.get_offsets(self.trips)
+        )
+
+    @classmethod
+    def from_scenarios(cls, scenarios):
+        """
+        Creates a scenario store from scenarios stored as lists of (cluster id, number of trips, end cluster ids)
+        :param scenarios: list of scenarios
+        :return: scenario store with the same scenarios
+        """
+        cluster_ids = [cluster_id for cluster_id, _, _ in scenarios[0]]
+        trips = [
+            [number_of_trips for _, number_of_trips, _ in scenario]
+            for scenario in scenarios
+        ]
+        destinations = [
+            end_cluster_id
+            for scenario in scenarios
+            for _, _, end_cluster_ids in scenario
+            for end_cluster_id in end_cluster_ids
+        ]
+        return cls(cluster_ids, trips, destinations)
+
+    def __len__(self):
+        return len(self.trips)
+
+    def get_number_of_clusters(self):
+        return len(self.cluster_ids)
+
+    def get_trips(self, scenario_index: int) -> np.ndarray:
+        """
+        :return: the number of trips out of every cluster in the scenario
+        """
+        return self.trips[scenario_index]
+
+    def get_destinations(self, scenario_index: int, cluster_index: int) -> np.ndarray:
+        """
+        :param scenario_index: index of the scenario
+        :param cluster_index: index of the start cluster in cluster_ids
+        :return: end cluster ids of the trips out of the cluster in the scenario
+        """
+        position = scenario_index * len(self.cluster_ids) + cluster_index
+        return self.destinations[
+            int(self.offsets[position]) : int(self.offsets[position + 1])
+        ]
+
+    def get_scenario(self, scenario_index: int):
+        """
+        :return: the scenario as a list of (cluster id, number of trips, list of end cluster ids)
+        """
+        return [
+            (
+                int(cluster_id),
+                int(number_of_trips),
+                self.get_destinations(scenario_index, cluster_index).tolist(),
+            )
+            for cluster_index, (cluster_id, number_of_trips) in enumerate(
+                zip(self.cluster_ids, self.get_trips(scenario_index))
+            )
+        ]
+
+    def save(self, directory: str):
+        """
+        Saves the arrays of the store as .npy files in the directory
+        :param directory: path to the directory, created if it doesn't exist
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in ScenarioStore.FILE_NAMES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode="r"):
+        """
+        Loads a store saved with save
+        :param directory: path to the directory with the .npy files
+        :param mmap_mode: memory-map mode of the arrays, see numpy.load. None reads the arrays into memory
+        :return: the loaded scenario store
+        """
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ScenarioStore.FILE_NAMES
+        }
+        return cls(**arrays)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ScenarioStore.FILE_NAMES)
+
+    def __repr__(self):
+        return (
+            f"<ScenarioStore: {len(self)} scenarios, {self.get_number_of_clusters()} clusters, "
+            f"{len(self.destinations)} trips>"
+        )
@@ -8,9 +8,28 @@ class Scooter(Location):
 
     def __init__(self, lat: float, lon: float, battery: float, scooter_id: int):
         super().__init__(lat, lon, scooter_id)
-        self.battery = battery
+        # The cluster the scooter is in. Notified on battery changes to keep the cluster aggregates updated
+        self.cluster = None
+        self._battery = battery
         self.battery_change_per_kilometer = 5.0
 
+    @property
+    def battery(self) -> float:
+        return self._battery
+
+    @battery.setter
+    def battery(self, battery: float):
+        old_battery, self._battery = self._battery, battery
+        if self.cluster is not None:
+            self.cluster.update_scooter_battery(self, old_battery)
+
+    def __setstate__(self, state):
+        # Scooters pickled before the battery became a property stores the battery as "battery"
+        if "battery" in state:
+            state["_battery"] = state.pop("battery")
+        state.setdefault("cluster", None)
+        self.__dict__.update(state)
+
     def __deepcopy__(self, *args):
         return Scooter(self.lat, self.lon, self.battery, self.id)
 
@@ -4,12 +4,17 @@ from classes.Cluster import Cluster
 from classes.Depot import Depot
 import clustering.methods
 from classes.SaveMixin import SaveMixin
-from visualization.visualizer import *
+from classes.UndoLog import UndoLog
+from classes.ScenarioStore import ScenarioStore
+from classes.AliasTable import AliasTable
+from classes.Vehicle import Vehicle
+from classes.Action import Action
 import decision.neighbour_filtering
 import numpy as np
 import math
 from globals import STATE_CACHE_DIR
 import copy
+from contextlib import contextmanager
 
 
 class State(SaveMixin):
@@ -28,11 +33,17 @@ class State(SaveMixin):
         self.vehicles = vehicles
         self.depots = depots
         self.locations = self.clusters + self.depots
-        if distance_matrix:
-            self.distance_matrix = distance_matrix
+        self._location_index = State.id_index(self.locations)
+        if distance_matrix is not None:
+            self.distance_matrix = State.read_only_matrix(distance_matrix)
         else:
             self.distance_matrix = self.calculate_distance_matrix()
         self.simulation_scenarios = None
+        # Alias tables of the leave distributions of the clusters, built when first used after the move probabilities
+        # are set
+        self.leave_alias_table = None
+        # Log of changes to revert when looking ahead, set inside the lookahead context
+        self.undo_log = None
         self.TRIP_INTENSITY_RATE = 0.1
 
     def __deepcopy__(self, *args):
@@ -43,12 +54,68 @@ class State(SaveMixin):
             distance_matrix=self.distance_matrix,
         )
         new_state.simulation_scenarios = self.simulation_scenarios
+        new_state.leave_alias_table = self.leave_alias_table
         for vehicle in new_state.vehicles:
             vehicle.current_location = new_state.get_location_by_id(
                 vehicle.current_location.id
             )
         return new_state
 
+    @property
+    def vehicles(self):
+        return self._vehicles
+
+    @vehicles.setter
+    def vehicles(self, vehicles):
+        self._vehicles = vehicles
+        self._vehicle_index = State.id_index(vehicles if vehicles else [])
+
+    @staticmethod
+    def id_index(objects) -> dict:
+        """
+        Creates a dictionary from id to the objects matching on the id, used for constant time lookups
+        :param objects: list of objects with an id attribute
+        :return: dict - id: [objects]
+        """
+        index = {}
+        for indexed_object in objects:
+            index.setdefault(indexed_object.id, []).append(indexed_object)
+        return index
+
+    def __setstate__(self, state):
+        # Cached states from before the vehicle index was introduced stores the vehicles as "vehicles"
+        vehicles = state.pop("vehicles", None)
+        self.__dict__.update(state)
+        if vehicles is not None:
+            self.vehicles = vehicles
+        if "_location_index" not in state:
+            self._location_index = State.id_index(self.locations)
+        # Cached states from before the distance matrix was an array stores it as nested lists
+        self.distance_matrix = State.read_only_matrix(self.distance_matrix)
+        # Cached states from before the scenario store was introduced stores the scenarios as nested lists
+        if isinstance(self.__dict__.get("simulation_scenarios"), list):
+            self.simulation_scenarios = ScenarioStore.from_scenarios(
+                self.simulation_scenarios
+            )
+        self.__dict__.setdefault("undo_log", None)
+        # Cached alias tables from before they recorded the move probabilities they are built from are rebuilt
+        if not hasattr(self.__dict__.get("leave_alias_table"), "move_probabilities"):
+            self.leave_alias_table = None
+
+    @contextmanager
+    def lookahead(self):
+        """
+        Context where the changes done to the state by do_action and system_simulate are reverted on exit.
+        Used to look ahead without copying the whole state
+        :return: the state itself
+        """
+        previous_undo_log, self.undo_log = self.undo_log, UndoLog()
+        try:
+            yield self
+        finally:
+            undo_log, self.undo_log = self.undo_log, previous_undo_log
+            undo_log.undo()
+
     def get_all_locations(self):
         return self.locations
 
@@ -74,28 +141,33 @@ class State(SaveMixin):
         :param end_location_id: Location id
         :return: float - distance in kilometers
         """
-        return self.distance_matrix[start_location_id][end_location_id]
+        return self.distance_matrix[start_location_id, end_location_id]
 
     def get_distance_to_all_clusters(self, location_id):
-        return self.distance_matrix[location_id][: len(self.clusters)]
+        return self.distance_matrix[location_id, : len(self.clusters)]
 
     def calculate_distance_matrix(self):
         """
-        Computes distance matrix for all clusters
-        :return: Distance matrix
+        Computes distance matrix for all locations
+        :return: Distance matrix as a read only array. It is shared between all copies of the state
         """
-        distance_matrix = []
-        for location in self.locations:
-            neighbour_distance = []
-            for neighbour in self.locations:
-                if location == neighbour:
-                    neighbour_distance.append(0.0)
-                else:
-                    neighbour_distance.append(
-                        location.distance_to(*neighbour.get_location())
-                    )
-            distance_matrix.append(neighbour_distance)
-        return distance_matrix
+        distance_matrix = Location.haversine_matrix(
+            [location.get_lat() for location in self.locations],
+            [location.get_lon() for location in self.locations],
+        )
+        np.fill_diagonal(distance_matrix, 0.0)
+        return State.read_only_matrix(distance_matrix)
+
+    @staticmethod
+    def read_only_matrix(matrix) -> np.ndarray:
+        """
+        Converts the matrix to a read only array. Read only arrays are returned as is, so they can be shared
+        """
+        if isinstance(matrix, np.ndarray) and not matrix.flags.writeable:
+            return matrix
+        matrix = np.array(matrix, dtype="float64")
+        matrix.flags.writeable = False
+        return matrix
 
     def get_possible_actions(
         self,
@@ -114,15 +186,44 @@ class State(SaveMixin):
         :param divide: number to divide by to create range increment
         :return: List of Action objects
         """
-        actions = []
-        neighbours = decision.neighbour_filtering.filtering_neighbours(
-            self,
-            vehicle,
-            0,
-            0,
-            number_of_neighbours,
-            exclude=exclude,
+        return list(
+            self.decode_actions(
+                vehicle,
+                self.iterate_possible_actions(
+                    vehicle,
+                    number_of_neighbours,
+                    divide=divide,
+                    exclude=exclude,
+                    time=time,
+                ),
+            )
         )
+
+    def iterate_possible_actions(
+        self,
+        vehicle: Vehicle,
+        number_of_neighbours,
+        divide=None,
+        exclude=None,
+        time=None,
+    ):
+        """
+        Generator of all possible actions from the current state in a compact encoding,
+        (number of battery swaps, number of pick-ups, number of drop-offs, next location id).
+        Use decode_actions to get the actions with the ids of the scooters to handle.
+        Combinations leading to the same action, e.g. when going to the depot, are only generated once
+        :param time: time of the world when the actions is to be performed
+        :param exclude: clusters to exclude from next cluster
+        :param vehicle: vehicle to perform this action
+        :param number_of_neighbours: number of neighbours to evaluate, if None: all neighbors are returned
+        :param divide: number to divide by to create range increment
+        :return: generator of action encodings
+        """
+        # The neighbours only depend on the inventory after the action, index them once for all combinations
+        neighbour_index = decision.neighbour_filtering.NeighbourIndex(
+            self, vehicle, number_of_neighbours, exclude=exclude
+        )
+        generated_actions = set()
         # Return empty action if
         if not vehicle.is_at_depot():
 
@@ -145,10 +246,10 @@ class State(SaveMixin):
                     return [i for i in range(max_int + 1)]
 
             # Initiate constraints for battery swap, pick-up and drop-off
+            number_of_scooters = len(vehicle.current_location.scooters)
             pick_ups = min(
                 max(
-                    len(vehicle.current_location.scooters)
-                    - vehicle.current_location.ideal_state,
+                    number_of_scooters - vehicle.current_location.ideal_state,
                     0,
                 ),
                 vehicle.scooter_inventory_capacity - len(vehicle.scooter_inventory),
@@ -157,102 +258,125 @@ class State(SaveMixin):
             swaps = vehicle.get_max_number_of_swaps()
             drop_offs = max(
                 min(
-                    vehicle.current_location.ideal_state
-                    - len(vehicle.current_location.scooters),
+                    vehicle.current_location.ideal_state - number_of_scooters,
                     len(vehicle.scooter_inventory),
                 ),
                 0,
             )
-            combinations = []
+            # Closest depot with enough battery swaps, found when the first action has to go to the depot
+            depot_id = None
             # Different combinations of battery swaps, pick-ups, drop-offs and clusters
             for pick_up in get_range(pick_ups):
                 for swap in get_range(swaps):
+                    battery_swap = max(
+                        min(vehicle.battery_inventory - pick_up, swap), 0
+                    )
+                    # If battery inventory is low, go to depot
+                    go_to_depot = (
+                        vehicle.battery_inventory - battery_swap - pick_up
+                        < vehicle.battery_inventory_capacity * 0.1
+                    )
                     for drop_off in get_range(drop_offs):
                         if (
-                            (pick_up + swap) <= len(vehicle.current_location.scooters)
+                            (pick_up + swap) <= number_of_scooters
                             and (pick_up + swap) <= vehicle.battery_inventory
                             and (pick_up + swap + drop_off > 0)
                         ):
-                            for (
-                                location
-                            ) in decision.neighbour_filtering.filtering_neighbours(
-                                self,
-                                vehicle,
-                                pick_up,
-                                drop_off,
-                                number_of_neighbours,
-                                exclude=exclude,
+                            for location in neighbour_index.get_neighbours(
+                                pick_up, drop_off
                             ):
-                                combinations.append(
-                                    [
-                                        max(
-                                            min(
-                                                vehicle.battery_inventory - pick_up,
-                                                swap,
-                                            ),
-                                            0,
-                                        ),
-                                        pick_up,
-                                        drop_off,
-                                        location.id,
-                                    ]
+                                if go_to_depot:
+                                    if depot_id is None:
+                                        depot_id = self.get_closest_available_depot(
+                                            vehicle, time
+                                        ).id
+                                    next_location_id = depot_id
+                                else:
+                                    next_location_id = location.id
+                                action = (
+                                    battery_swap,
+                                    pick_up,
+                                    drop_off,
+                                    next_location_id,
                                 )
+                                if action not in generated_actions:
+                                    generated_actions.add(action)
+                                    yield action
+        if len(generated_actions) == 0:
+            for neighbour in neighbour_index.get_neighbours(0, 0):
+                yield 0, 0, 0, neighbour.id
+
+    def get_closest_available_depot(self, vehicle: Vehicle, time):
+        """
+        :return: the closest depot to the vehicle that can swap 90% of the battery inventory of the vehicle
+        """
+        return [
+            depot
+            for depot in sorted(
+                self.depots,
+                key=lambda depot: self.get_distance(
+                    vehicle.current_location.id, depot.id
+                ),
+            )
+            if depot.get_available_battery_swaps(time)
+            > vehicle.battery_inventory_capacity * 0.9
+        ][0]
+
+    def decode_actions(self, vehicle: Vehicle, action_encodings):
+        """
+        Generator of the actions of action encodings from iterate_possible_actions, choosing the scooters to handle
+        :param vehicle: vehicle to perform the actions
+        :param action_encodings: iterable of action encodings for the current state of the vehicle
+        :return: generator of Action objects
+        """
+        scooter_ids = None
+        for battery_swap, pick_up, drop_off, next_location_id in action_encodings:
+            if scooter_ids is None:
+                scooter_ids = self.get_action_scooter_ids(vehicle)
+            (
+                swappable_scooters_id,
+                none_swappable_scooters_id,
+                inventory_scooters_id,
+            ) = scooter_ids
+            # Pick up the scooters with the lowest battery that are not swapped, then the fully charged ones
+            number_of_none_swappable_scooters = max(
+                battery_swap + pick_up - len(swappable_scooters_id), 0
+            )
+            yield Action(
+                swappable_scooters_id[:battery_swap],
+                swappable_scooters_id[battery_swap : battery_swap + pick_up]
+                + none_swappable_scooters_id[:number_of_none_swappable_scooters],
+                inventory_scooters_id[:drop_off],
+                next_location_id,
+            )
 
-            # Assume that no battery swap or pick-up of scooters with 100% battery and
-            # that the scooters with the lowest battery are prioritized
-            swappable_scooters_id = [
+    def decode_action(self, vehicle: Vehicle, action_encoding) -> Action:
+        """
+        :return: the action of an action encoding from iterate_possible_actions
+        """
+        return next(self.decode_actions(vehicle, [action_encoding]))
+
+    @staticmethod
+    def get_action_scooter_ids(vehicle: Vehicle) -> ([int], [int], [int]):
+        """
+        :return: ids of the swappable scooters with the lowest battery first, ids of the scooters with at least 70%
+        battery and ids of the scooters in the vehicle inventory
+        """
+        if vehicle.is_at_depot():
+            return [], [], [scooter.id for scooter in vehicle.scooter_inventory]
+        # Assume that no battery swap or pick-up of scooters with 100% battery and
+        # that the scooters with the lowest battery are prioritized
+        return (
+            [
                 scooter.id
                 for scooter in vehicle.current_location.get_swappable_scooters()
-            ]
-
-            none_swappable_scooters_id = [
+            ],
+            [
                 scooter.id
                 for scooter in vehicle.current_location.scooters
                 if scooter.battery >= 70
-            ]
-
-            def choose_pick_up(swaps, pickups):
-                number_of_none_swappable_scooters = max(
-                    swaps + pickups - len(swappable_scooters_id), 0
-                )
-
-                return (
-                    swappable_scooters_id[swaps : swaps + pick_up]
-                    + none_swappable_scooters_id[:number_of_none_swappable_scooters]
-                )
-
-            # Adding every action. Actions are the IDs of the scooters to be handled.
-            for battery_swap, pick_up, drop_off, cluster_id in combinations:
-                if not vehicle.is_at_depot() and (
-                    vehicle.battery_inventory - battery_swap - pick_up
-                    < vehicle.battery_inventory_capacity * 0.1
-                ):
-                    # If battery inventory is low, go to depot
-                    cluster_id = [
-                        depot.id
-                        for depot in sorted(
-                            self.depots,
-                            key=lambda depot: self.get_distance(
-                                vehicle.current_location.id, depot.id
-                            ),
-                        )
-                        if depot.get_available_battery_swaps(time)
-                        > vehicle.battery_inventory_capacity * 0.9
-                    ][0]
-                actions.append(
-                    Action(
-                        swappable_scooters_id[:battery_swap],
-                        choose_pick_up(battery_swap, pick_up),
-                        [scooter.id for scooter in vehicle.scooter_inventory][
-                            :drop_off
-                        ],
-                        cluster_id,
-                    )
-                )
-        return (
-            actions
-            if len(actions) > 0
-            else [Action([], [], [], neighbour.id) for neighbour in neighbours]
+            ],
+            [scooter.id for scooter in vehicle.scooter_inventory],
         )
 
     def do_action(self, action: Action, vehicle: Vehicle, time: int):
@@ -264,6 +388,9 @@ class State(SaveMixin):
         :return: float - reward for doing the action on the state
         """
         refill_time = 0
+        if self.undo_log is not None:
+            self.undo_log.save_vehicle(vehicle)
+            self.undo_log.save_location(vehicle.current_location)
         if vehicle.is_at_depot():
             batteries_to_swap = min(
                 vehicle.flat_batteries(),
@@ -343,16 +470,14 @@ class State(SaveMixin):
                     for state_location in self.locations
                     if state_location.id != location.id
                 ],
-                key=lambda state_location: self.distance_matrix[location.id][
-                    state_location.id
+                key=lambda state_location: self.distance_matrix[
+                    location.id, state_location.id
                 ],
             )
         return neighbours[:number_of_neighbours] if number_of_neighbours else neighbours
 
     def get_location_by_id(self, location_id: int):
-        matches = [
-            location for location in self.locations if location_id == location.id
-        ]
+        matches = self._location_index.get(location_id, [])
         if len(matches) == 1:
             return matches[0]
         elif len(matches) > 1:
@@ -363,21 +488,27 @@ class State(SaveMixin):
             raise ValueError(f"No locations with id={location_id} where found")
 
     def visualize(self):
+        from visualization.visualizer import visualize_state
+
         visualize_state(self)
 
     def visualize_clustering(self):
+        from visualization.visualizer import visualize_clustering
+
         visualize_clustering(self.clusters)
 
     def visualize_flow(
         self,
         flows: [(int, int, int)],
     ):
+        from visualization.visualizer import visualize_cluster_flow
+
         visualize_cluster_flow(self, flows)
 
     def visualize_action(
         self,
         vehicle_before_action: Vehicle,
-        current_state: State,
+        current_state: "State",
         vehicle: Vehicle,
         action: Action,
         world_time,
@@ -385,6 +516,8 @@ class State(SaveMixin):
         scooter_battery: bool,
         policy: str,
     ):
+        from visualization.visualizer import visualize_action
+
         visualize_action(
             self,
             vehicle_before_action,
@@ -405,6 +538,8 @@ class State(SaveMixin):
         tabu_list: [int],
         policy: str,
     ):
+        from visualization.visualizer import visualize_vehicle_routes
+
         visualize_vehicle_routes(
             self,
             current_vehicle_id,
@@ -415,9 +550,13 @@ class State(SaveMixin):
         )
 
     def visualize_current_trips(self, trips: [(int, int, int)]):
+        from visualization.visualizer import visualize_scooters_on_trip
+
         visualize_scooters_on_trip(self, trips)
 
     def visualize_system_simulation(self, trips):
+        from visualization.visualizer import visualize_scooter_simulation
+
         visualize_scooter_simulation(self, trips)
 
     def set_probability_matrix(self, probability_matrix: np.ndarray):
@@ -429,6 +568,36 @@ class State(SaveMixin):
         for cluster in self.clusters:
             cluster.set_move_probabilities(probability_matrix[cluster.id])
 
+    def get_leave_alias_table(self) -> AliasTable:
+        """
+        The tables are rebuilt when the move probabilities of a cluster have been replaced since they were built,
+        through set_probability_matrix or Cluster.set_move_probabilities
+        :return: alias tables with the leave distribution of every cluster, in the order of the clusters
+        """
+        if self.leave_alias_table is None or any(
+            move_probabilities is not cluster.move_probabilities
+            for move_probabilities, cluster in zip(
+                self.leave_alias_table.move_probabilities, self.clusters
+            )
+        ):
+            self.leave_alias_table = AliasTable(
+                [cluster.get_leave_distribution() for cluster in self.clusters]
+            )
+            # The move probabilities the tables are built from, compared by identity to detect replaced ones
+            self.leave_alias_table.move_probabilities = [
+                cluster.move_probabilities for cluster in self.clusters
+            ]
+        return self.leave_alias_table
+
+    def sample_leave_destinations(self, cluster_indices, random_state=np.random):
+        """
+        Draws the destination of trips from the leave distributions of their start clusters in O(1) per trip
+        :param cluster_indices: index of the start cluster, or an array of start cluster indices
+        :param random_state: numpy random state to draw from
+        :return: the index of the destination cluster, or an array of destination cluster indices
+        """
+        return self.get_leave_alias_table().sample(cluster_indices, random_state)
+
     def save_state(self):
         super().save(STATE_CACHE_DIR)
 
@@ -491,8 +660,8 @@ class State(SaveMixin):
         :return: vehicle object
         """
         try:
-            return [vehicle for vehicle in self.vehicles if vehicle_id == vehicle.id][0]
-        except IndexError:
+            return self._vehicle_index[vehicle_id][0]
+        except KeyError:
             raise ValueError(
                 f"There are no vehicle in the state with an id of {vehicle_id}"
             )
@@ -505,7 +674,7 @@ class State(SaveMixin):
                     max(
                         (
                             cluster.trip_intensity_per_iteration
-                            - len(cluster.get_available_scooters())
+                            - cluster.number_of_available_scooters()
                         ),
                         0,
                     )
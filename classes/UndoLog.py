@@ -0,0 +1,136 @@
+from classes.Cluster import Cluster
+from classes.Depot import Depot
+from classes.Scooter import Scooter
+from classes.Vehicle import Vehicle
+
+
+class UndoLog:
+    """
+    Log of the changes done to a state. Undoing the log reverts the changes in the opposite order of when they were
+    logged. Used by the state to look ahead without copying the whole state
+    """
+
+    def __init__(self):
+        self.undo_functions = []
+
+    def save_scooter(self, scooter: Scooter):
+        """
+        Logs the battery and coordinates of a scooter
+        """
+        battery, lat, lon = scooter.battery, scooter.lat, scooter.lon
+
+        def undo():
+            scooter.battery = battery
+            scooter.lat, scooter.lon = lat, lon
+
+        self.undo_functions.append(undo)
+
+    def save_location(self, location):
+        """
+        Logs the scooters of a cluster or the battery inventory of a depot
+        """
+        if isinstance(location, Cluster):
+            scooters = location.scooters.copy()
+            scooter_states = [
+                (scooter, scooter.battery, scooter.lat, scooter.lon)
+                for scooter in scooters
+            ]
+
+            def undo():
+                location.scooters = scooters
+                for scooter, battery, lat, lon in scooter_states:
+                    scooter.battery = battery
+                    scooter.lat, scooter.lon = lat, lon
+
+        elif isinstance(location, Depot):
+            capacity, time, charging = (
+                location.capacity,
+                location.time,
+                location.charging.copy(),
+            )
+
+            def undo():
+                location.capacity, location.time, location.charging = (
+                    capacity,
+                    time,
+                    charging,
+                )
+
+        else:
+            raise ValueError(f"Can't log changes of location {location}")
+
+        self.undo_functions.append(undo)
+
+    def save_vehicle(self, vehicle: Vehicle):
+        """
+        Logs the inventory, location and service route of a vehicle
+        """
+        battery_inventory = vehicle.battery_inventory
+        scooter_inventory = vehicle.scooter_inventory.copy()
+        service_route_length = len(vehicle.service_route)
+        current_location = vehicle.current_location
+
+        def undo():
+            vehicle.battery_inventory = battery_inventory
+            vehicle.scooter_inventory = scooter_inventory
+            del vehicle.service_route[service_route_length:]
+            vehicle.current_location = current_location
+
+        self.undo_functions.append(undo)
+        for scooter in scooter_inventory:
+            self.save_scooter(scooter)
+
+    def save_trip(self, start_cluster: Cluster, end_cluster: Cluster, scooter: Scooter):
+        """
+        Logs a scooter trip from the start cluster to the end cluster. Must be logged before the trip is performed
+        """
+        self.__save_trip(
+            start_cluster,
+            end_cluster,
+            scooter,
+            start_cluster.get_scooter_position(scooter),
+        )
+
+    def __save_trip(
+        self,
+        start_cluster: Cluster,
+        end_cluster: Cluster,
+        scooter: Scooter,
+        position: (int, int),
+    ):
+        battery, lat, lon = scooter.battery, scooter.lat, scooter.lon
+
+        def undo():
+            end_cluster.remove_scooter(scooter)
+            scooter.battery = battery
+            scooter.lat, scooter.lon = lat, lon
+            start_cluster.insert_scooter(scooter, position)
+
+        self.undo_functions.append(undo)
+
+    def save_trips(self, start_cluster: Cluster, trips: [(Cluster, Scooter)]):
+        """
+        Logs scooter trips from the start cluster, in the order the scooters are removed from the cluster.
+        Equal to calling save_trip for each trip before it is performed
+        :param start_cluster: cluster the trips start in
+        :param trips: end cluster and scooter of every trip
+        """
+        for number_of_removed_scooters, (end_cluster, scooter) in enumerate(trips):
+            index, sequence_number = start_cluster.get_scooter_position(scooter)
+            # The scooters removed before this one are in front of it in the scooter list
+            self.__save_trip(
+                start_cluster,
+                end_cluster,
+                scooter,
+                (index - number_of_removed_scooters, sequence_number),
+            )
+
+    def undo(self):
+        """
+        Reverts all logged changes and clears the log
+        """
+        while self.undo_functions:
+            self.undo_functions.pop()()
+
+    def __len__(self):
+        return len(self.undo_functions)
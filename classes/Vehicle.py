@@ -24,6 +24,25 @@ class Vehicle:
         self.service_route = []
         self.current_location = start_location
 
+    @property
+    def scooter_inventory(self) -> [Scooter]:
+        return self._scooter_inventory
+
+    @scooter_inventory.setter
+    def scooter_inventory(self, scooter_inventory: [Scooter]):
+        self._scooter_inventory = scooter_inventory
+        # Index of the scooters in the inventory by id, kept consistent by pick_up and drop_off
+        self._scooter_inventory_index = {
+            scooter.id: scooter for scooter in scooter_inventory
+        }
+
+    def __setstate__(self, state):
+        # Vehicles pickled before the inventory index was introduced stores the inventory as "scooter_inventory"
+        scooter_inventory = state.pop("scooter_inventory", None)
+        self.__dict__.update(state)
+        if scooter_inventory is not None:
+            self.scooter_inventory = scooter_inventory
+
     def change_battery(self, scooter: Scooter):
         if self.battery_inventory <= 0:
             raise ValueError(
@@ -39,22 +58,18 @@ class Vehicle:
             raise ValueError("Can't pick up an scooter when the vehicle is full")
         else:
             self.scooter_inventory.append(scooter)
+            self._scooter_inventory_index[scooter.id] = scooter
             if scooter.battery < 70:
                 self.change_battery(scooter)
             scooter.remove_location()
 
     def drop_off(self, scooter_id: int):
-        if scooter_id not in map(
-            lambda inventory_scooter: inventory_scooter.id, self.scooter_inventory
-        ):
+        if scooter_id not in self._scooter_inventory_index:
             raise ValueError(
                 "Can't deliver a scooter that isn't in the vehicle inventory"
             )
 
-        scooter = next(
-            (scooter for scooter in self.scooter_inventory if scooter.id == scooter_id),
-            None,
-        )
+        scooter = self._scooter_inventory_index.pop(scooter_id)
         self.scooter_inventory.remove(scooter)
         return scooter
 
@@ -1,9 +1,7 @@
 import copy
 import datetime
-from typing import List
 
 import numpy as np
-import bisect
 import classes
 import globals
 from classes.SaveMixin import SaveMixin
@@ -18,7 +16,7 @@ from globals import (
 from progress.bar import IncrementalBar
 import decision
 import decision.value_functions
-from system_simulation.scripts import system_simulate
+from system_simulation.scripts import system_simulate, fast_forward_simulate
 
 
 class World(SaveMixin, HyperParameters):
@@ -30,66 +28,166 @@ class World(SaveMixin, HyperParameters):
 
     class WorldMetric:
         """
-        Class for storing and aggregate the metric data of the instance
+        Class for storing and aggregate the metric data of the instance.
+        The metrics are recorded in a growable array with a row for every recording. The contributions of every cluster
+        to the metrics are cached and only recomputed for the clusters changed by the events since the last recording
         """
 
-        def __init__(self, test_parameter_name="", test_parameter_value=0.0):
-            self.lost_demand = []
-            self.average_negative_deviation_ideal_state = []
-            self.deficient_battery = []
-            self.timeline = []
-            self.total_available_scooters = []
+        # Names of the recorded metrics, in the order of the columns of the recordings
+        METRICS = (
+            "lost_demand",
+            "average_negative_deviation_ideal_state",
+            "deficient_battery",
+            "timeline",
+            "total_available_scooters",
+        )
+
+        def __init__(
+            self, test_parameter_name="", test_parameter_value=0.0, resolution=0
+        ):
+            """
+            :param resolution: minutes between every recording, e.g. ITERATION_LENGTH_MINUTES for one recording every
+            iteration. Zero records the metrics after every event
+            """
+            self.recordings = np.zeros((64, len(World.WorldMetric.METRICS)))
+            self.number_of_recordings = 0
             self.testing_parameter_name = test_parameter_name
             self.testing_parameter_value = test_parameter_value
+            self.resolution = resolution
+            self.next_recording_time = 0
+            self.number_of_lost_trips = 0
+            # Spread of the runs, only set on aggregated metrics
+            self.percentiles = ()
+            self.percentile_recordings = None
+            self.confidence_level = None
+            self.confidence_band = None
+            self.reset_cluster_contributions()
+
+        def reset_cluster_contributions(self):
+            # Id of the state the cluster contributions are computed from, see update_cluster_contributions
+            self.state_id = None
+            self.cluster_indices = {}
+            self.changed_cluster_indices = set()
+            self.cluster_contributions = None
+
+        def __getstate__(self):
+            state = self.__dict__.copy()
+            # The cluster contributions are recomputed from the state of the world
+            for key in [
+                "state_id",
+                "cluster_indices",
+                "changed_cluster_indices",
+                "cluster_contributions",
+            ]:
+                del state[key]
+            return state
+
+        def __setstate__(self, state):
+            if "recordings" not in state:
+                # Metrics pickled before the recordings were stored in arrays
+                legacy_metrics = [state.pop(name) for name in World.WorldMetric.METRICS]
+                state["recordings"] = np.array(legacy_metrics, dtype=float).T.reshape(
+                    -1, len(World.WorldMetric.METRICS)
+                )
+                state["number_of_recordings"] = len(state["recordings"])
+                state["resolution"] = 0
+                state["next_recording_time"] = 0
+                state["number_of_lost_trips"] = (
+                    int(legacy_metrics[0][-1]) if len(legacy_metrics[0]) > 0 else 0
+                )
+            for key in ["percentile_recordings", "confidence_level", "confidence_band"]:
+                state.setdefault(key, None)
+            state.setdefault("percentiles", ())
+            self.__dict__.update(state)
+            self.reset_cluster_contributions()
+
+        def __getattr__(self, name):
+            # The recorded values of a metric, e.g. metric.lost_demand
+            if name in World.WorldMetric.METRICS:
+                return self.get_metric(name)
+            raise AttributeError(
+                f"'{self.__class__.__name__}' object has no attribute '{name}'"
+            )
 
-        @classmethod
-        def aggregate_metrics(cls, metrics):
-            def lists_average(lists):
-                return np.mean(np.stack(lists, axis=0), axis=1).tolist()
+        def get_metric(self, name: str) -> np.ndarray:
+            return self.recordings[
+                : self.number_of_recordings, World.WorldMetric.METRICS.index(name)
+            ]
+
+        def resample(self, timeline: np.ndarray) -> np.ndarray:
+            """
+            Resamples the recordings to a time grid as a step function. Every time of the grid takes the first
+            recording at that time, or the previous value if there is no recording. All values start on zero
+            :param timeline: increasing integer times of the grid, starting on zero
+            :return: matrix with a row for every time of the grid and a column for every metric
+            """
+            timeline_column = World.WorldMetric.METRICS.index("timeline")
+            recorded_timeline = self.recordings[
+                : self.number_of_recordings, timeline_column
+            ]
+            first_recordings = np.searchsorted(recorded_timeline, timeline)
+            is_recorded = first_recordings < self.number_of_recordings
+            is_recorded[is_recorded] = (
+                recorded_timeline[first_recordings[is_recorded]]
+                == timeline[is_recorded]
+            )
+            is_recorded[0] = False
+            # Index of the last recorded time at or before every time of the grid
+            last_recorded_time = np.maximum.accumulate(
+                np.where(is_recorded, np.arange(len(timeline)), 0)
+            )
+            values = np.zeros((len(timeline), len(World.WorldMetric.METRICS)))
+            values[is_recorded] = self.recordings[first_recordings[is_recorded]]
+            values = values[last_recorded_time]
+            values[:, timeline_column] = timeline
+            return values
 
+        @classmethod
+        def aggregate_metrics(
+            cls, metrics, percentiles=(5, 25, 50, 75, 95), confidence_level=0.95
+        ):
+            """
+            Averages the metrics of several runs on a time grid with every minute until the latest recording
+            :param metrics: world metrics of every run
+            :param percentiles: percentiles of the runs to compute at every time, in the range 0 to 100
+            :param confidence_level: confidence level of the Student's t confidence band around the average
+            :return: world metric with the average of the runs as recordings
+            """
             new_world_metric = cls()
-            if all([len(metric.timeline) == 0 for metric in metrics]):
+            if all([metric.number_of_recordings == 0 for metric in metrics]):
                 return new_world_metric
-            number_of_metrics = len(metrics)
-
-            # Fields to take the average of
-            average_fields = [
-                "lost_demand",
-                "average_negative_deviation_ideal_state",
-                "deficient_battery",
-                "total_available_scooters",
-            ]
-            # Create dict with list for every field, start all values on zero
-            fields = {field: [[0] * number_of_metrics] for field in average_fields}
+
             # Find the time for the latest event
-            max_time = np.max(np.concatenate([metric.timeline for metric in metrics]))
-            new_world_metric.timeline = list(range(int(max_time) + 1))
-            # populate fields with average at every time step
-            for time in new_world_metric.timeline[1:]:
-                # If there is a new value in the timeline, update the timeline
-                if any([time in metric.timeline for metric in metrics]):
-                    for field in fields.keys():
-                        # Add new value if there is a new one, otherwise add previous value
-                        fields[field].append(
-                            [
-                                getattr(metric, field)[
-                                    metric.timeline.index(time)
-                                ]  # Takes the first recording in current time
-                                if time in metric.timeline
-                                else fields[field][time - 1][i]
-                                for i, metric in enumerate(metrics)
-                            ]
-                        )
-                # Otherwise, add previous values
-                else:
-                    for field in fields.keys():
-                        fields[field].append(fields[field][-1])
-            # Take the average of all the runs
-            new_world_metric.__dict__.update(
-                {
-                    field: lists_average(metric_list)
-                    for field, metric_list in fields.items()
-                }
+            max_time = int(
+                np.max(np.concatenate([metric.timeline for metric in metrics]))
+            )
+            timeline = np.arange(max_time + 1)
+            # Runs x times x metrics
+            run_recordings = np.stack([metric.resample(timeline) for metric in metrics])
+            new_world_metric.recordings = run_recordings.mean(axis=0)
+            new_world_metric.number_of_recordings = len(timeline)
+
+            new_world_metric.percentiles = tuple(percentiles)
+            new_world_metric.percentile_recordings = np.percentile(
+                run_recordings, percentiles, axis=0
+            )
+            new_world_metric.confidence_level = confidence_level
+            if len(metrics) > 1:
+                from scipy.stats import t
+
+                margin = (
+                    t.ppf((1 + confidence_level) / 2, len(metrics) - 1)
+                    * run_recordings.std(axis=0, ddof=1)
+                    / np.sqrt(len(metrics))
+                )
+            else:
+                # A single run has no spread
+                margin = np.zeros_like(new_world_metric.recordings)
+            new_world_metric.confidence_band = np.stack(
+                [
+                    new_world_metric.recordings - margin,
+                    new_world_metric.recordings + margin,
+                ]
             )
 
             new_world_metric.testing_parameter_name = metrics[0].testing_parameter_name
@@ -98,61 +196,161 @@ class World(SaveMixin, HyperParameters):
             ].testing_parameter_value
             return new_world_metric
 
-        def add_analysis_metrics(self, world):
+        def get_percentile(self, name: str, percentile: float) -> np.ndarray:
             """
-            Add data to analysis
-            :param world: world object to record state from
+            :param name: name of the metric
+            :param percentile: one of the percentiles computed when the metrics were aggregated
+            :return: the percentile of the runs at every time
             """
-            self.lost_demand.append(
-                sum(
-                    [
-                        1
-                        for reward, location in world.rewards
-                        if reward == world.LOST_TRIP_REWARD
-                    ]
+            return self.percentile_recordings[
+                self.percentiles.index(percentile),
+                :,
+                World.WorldMetric.METRICS.index(name),
+            ]
+
+        def get_confidence_band(self, name: str) -> (np.ndarray, np.ndarray):
+            """
+            :param name: name of the metric
+            :return: the lower and upper bound of the confidence band of the average at every time
+            """
+            lower, upper = self.confidence_band[
+                :, :, World.WorldMetric.METRICS.index(name)
+            ]
+            return lower, upper
+
+        def add_lost_trip(self):
+            self.number_of_lost_trips += 1
+
+        def update_cluster_contributions(self, world):
+            """
+            Recomputes the contributions to the metrics of the clusters changed since the last recording, or of all
+            clusters if the state of the world is new
+            """
+            clusters = world.state.clusters
+            if self.state_id != id(world.state):
+                self.state_id = id(world.state)
+                self.cluster_indices = {
+                    cluster.id: index for index, cluster in enumerate(clusters)
+                }
+                # Columns: negative deviation, deficient battery, available scooters and scooters
+                self.cluster_contributions = np.zeros((len(clusters), 4))
+                self.changed_cluster_indices = set(range(len(clusters)))
+            for index in self.changed_cluster_indices:
+                cluster = clusters[index]
+                number_of_available_scooters = cluster.number_of_available_scooters()
+                number_of_scooters = len(cluster.scooters)
+                self.cluster_contributions[index] = (
+                    *World.WorldMetric.get_cluster_contribution(
+                        cluster.ideal_state,
+                        number_of_available_scooters,
+                        number_of_scooters,
+                        cluster.get_available_battery(),
+                    ),
+                    number_of_available_scooters,
+                    number_of_scooters,
                 )
-                if len(world.rewards) > 0
-                else 0
+            self.changed_cluster_indices = set()
+
+        @staticmethod
+        def get_cluster_contribution(
+            ideal_state,
+            number_of_available_scooters,
+            number_of_scooters,
+            available_battery,
+        ) -> (float, float):
+            """
+            :return: the contribution of a cluster to the negative deviation from the ideal state and to the deficient
+            battery metrics
+            """
+            return (
+                max(0, ideal_state - number_of_available_scooters),
+                ideal_state * 100 - available_battery
+                if number_of_scooters < ideal_state
+                else 0,
             )
-            self.average_negative_deviation_ideal_state.append(
-                sum(
-                    [
-                        max(
-                            0,
-                            cluster.ideal_state - len(cluster.get_available_scooters()),
-                        )
-                        for cluster in world.state.clusters
-                    ]
+
+        def add_analysis_metrics(self, world, changed_cluster_ids=None):
+            """
+            Add data to analysis
+            :param world: world object to record state from
+            :param changed_cluster_ids: ids of the clusters changed since the last call, None if any cluster could
+            have changed
+            """
+            if changed_cluster_ids is None:
+                self.state_id = None
+            else:
+                # Depots are not included in the metrics
+                self.changed_cluster_indices.update(
+                    self.cluster_indices[cluster_id]
+                    for cluster_id in changed_cluster_ids
+                    if cluster_id in self.cluster_indices
                 )
-                / len(world.state.clusters)
+            if not self.is_recording_due(world.time):
+                return
+            self.update_cluster_contributions(world)
+            (
+                negative_deviation,
+                deficient_battery,
+                available_scooters,
+                scooters,
+            ) = self.cluster_contributions.sum(axis=0)
+            self.add_recording(
+                world.time,
+                negative_deviation / len(world.state.clusters),
+                deficient_battery / scooters,
+                available_scooters,
             )
-            self.deficient_battery.append(
-                sum(
-                    [
-                        cluster.ideal_state * 100
-                        - (
-                            sum(
-                                [
-                                    scooter.battery
-                                    for scooter in cluster.get_available_scooters()
-                                ]
-                            )
-                        )
-                        for cluster in world.state.clusters
-                        if len(cluster.scooters) < cluster.ideal_state
-                    ]
+
+        def is_recording_due(self, time: int) -> bool:
+            """
+            :param time: current time of the world
+            :return: True if the metrics are to be recorded at the time, the next recording time is then moved on
+            """
+            if time < self.next_recording_time:
+                return False
+            if self.resolution > 0:
+                self.next_recording_time = (
+                    time // self.resolution + 1
+                ) * self.resolution
+            return True
+
+        def add_recording(
+            self,
+            time: int,
+            average_negative_deviation_ideal_state: float,
+            deficient_battery: float,
+            total_available_scooters: int,
+        ) -> None:
+            """
+            Appends a recording of the metrics, with the number of lost trips so far
+            """
+            if self.number_of_recordings == len(self.recordings):
+                self.recordings = np.concatenate(
+                    [self.recordings, np.zeros_like(self.recordings)]
                 )
-                / len(world.state.get_scooters())
+            self.recordings[self.number_of_recordings] = (
+                self.number_of_lost_trips,
+                average_negative_deviation_ideal_state,
+                deficient_battery,
+                time,
+                total_available_scooters,
             )
-            self.total_available_scooters.append(
-                sum(
-                    [
-                        len(cluster.get_available_scooters())
-                        for cluster in world.state.clusters
-                    ]
+            self.number_of_recordings += 1
+
+        def add_recordings(self, recordings: np.ndarray) -> None:
+            """
+            Appends several recordings at once
+            :param recordings: (number of recordings, number of metrics) array with the metrics in the order of METRICS
+            """
+            number_of_recordings = self.number_of_recordings + len(recordings)
+            while number_of_recordings > len(self.recordings):
+                self.recordings = np.concatenate(
+                    [self.recordings, np.zeros_like(self.recordings)]
                 )
-            )
-            self.timeline.append(world.time)
+            self.recordings[
+                self.number_of_recordings : number_of_recordings
+            ] = recordings
+            self.number_of_recordings = number_of_recordings
 
         def get_all_metrics(self):
             """
@@ -165,6 +363,16 @@ class World(SaveMixin, HyperParameters):
                 self.total_available_scooters,
             )
 
+        def to_dict(self) -> dict:
+            """
+            :return: the recorded values of every metric, and the testing parameter name and value
+            """
+            return {
+                **{name: self.get_metric(name) for name in World.WorldMetric.METRICS},
+                "testing_parameter_name": self.testing_parameter_name,
+                "testing_parameter_value": self.testing_parameter_value,
+            }
+
     def __init__(
         self,
         shift_duration: int,
@@ -174,22 +382,30 @@ class World(SaveMixin, HyperParameters):
         test_parameter_value=None,
         verbose=False,
         visualize=True,
+        metrics_resolution=0,
+        event_log_directory=None,
+        seed=None,
+        fast_forward=False,
         **kwargs,
     ):
+        """
+        :param metrics_resolution: minutes between every time the metrics are recorded, zero records after every event
+        :param event_log_directory: directory to write an event log of the runs to, no log is written if None
+        :param seed: seed of the trips generated in the world, the global numpy random state is used if None
+        :param fast_forward: simulate shifts without vehicle decisions with the fast forward simulation
+        """
         super().__init__(**kwargs)
         self.created_at = datetime.datetime.now().isoformat(timespec="minutes")
         self.shift_duration = shift_duration
         self.state = initial_state
         self.time = 0
         self.rewards = []
-        self.stack: List[classes.Event] = []
+        self.stack = classes.EventQueue()
         self.tabu_list = []
         # Initialize the stack with a vehicle arrival for every vehicle at time zero
         number_of_vans, number_of_bikes = 0, 0
         for vehicle in self.state.vehicles:
-            self.stack.append(
-                classes.VehicleArrival(0, vehicle.id, visualize=visualize)
-            )
+            self.stack.push(classes.VehicleArrival(0, vehicle.id, visualize=visualize))
             if vehicle.scooter_inventory_capacity > 0:
                 number_of_vans += 1
             else:
@@ -197,7 +413,7 @@ class World(SaveMixin, HyperParameters):
         self.NUMBER_OF_VANS = number_of_vans
         self.NUMBER_OF_BIKES = number_of_bikes
         # Add Generate Scooter Trip event to the stack
-        self.stack.append(classes.GenerateScooterTrips(ITERATION_LENGTH_MINUTES))
+        self.stack.push(classes.GenerateScooterTrips(ITERATION_LENGTH_MINUTES))
         self.cluster_flow = {
             (start, end): 0
             for start in np.arange(len(self.state.clusters))
@@ -205,7 +421,16 @@ class World(SaveMixin, HyperParameters):
             if start != end
         }
         self.policy = self.set_policy(policy)
-        self.metrics = World.WorldMetric(test_parameter_name, test_parameter_value)
+        self.metrics = World.WorldMetric(
+            test_parameter_name, test_parameter_value, metrics_resolution
+        )
+        self.event_log = (
+            classes.EventLog(event_log_directory)
+            if event_log_directory is not None
+            else None
+        )
+        self.set_seed(seed)
+        self.fast_forward = fast_forward
         self.verbose = verbose
         self.visualize = visualize
         self.label = self.__class__.__name__
@@ -219,6 +444,20 @@ class World(SaveMixin, HyperParameters):
                 suffix="%(percent)d%% - ETA %(eta)ds",
             )
 
+    def __setstate__(self, state):
+        # Worlds pickled before the event log and the seed were added
+        state.setdefault("event_log", None)
+        state.setdefault("seed", None)
+        state.setdefault("random_state", None)
+        state.setdefault("fast_forward", False)
+        # Worlds pickled before the event queue keep their events in a list sorted by time
+        if isinstance(state.get("stack"), list):
+            state["stack"] = classes.EventQueue(state["stack"])
+        # Worlds pickled before a hyper parameter was added use its default value
+        for parameter, value in HyperParameters().__dict__.items():
+            state.setdefault(parameter, value)
+        self.__dict__.update(state)
+
     def __repr__(self):
         return f"<World with {self.time} of {self.shift_duration} elapsed. {len(self.stack)} events in stack>"
 
@@ -227,16 +466,44 @@ class World(SaveMixin, HyperParameters):
         Main method for running the Event Based Simulation Engine.
 
         The world object uses a stack initialized with vehicle arrival events and a GenerateScooterTrips event.
-        It then pops events from this stack. The stack is always sorted in by the time of the events.
+        It then pops events from this stack. The stack is an event queue always returning the earliest event.
+        Shifts without vehicle decisions are fast forwarded to the end of the shift if fast forward is on.
         """
-        while self.time < self.shift_duration:
-            event = self.stack.pop(0)
-            event.perform(self)
-            if isinstance(event, classes.GenerateScooterTrips) and self.verbose:
-                self.progress_bar.next()
+        try:
+            if self.fast_forward and self.event_log is None and self.is_decision_free():
+                fast_forward_simulate(self)
+            while self.time < self.shift_duration:
+                event = self.stack.pop()
+                event.perform(self)
+                if isinstance(event, classes.GenerateScooterTrips) and self.verbose:
+                    self.progress_bar.next()
+        finally:
+            # Stop the worker processes of the policy at the end of the shift
+            self.policy.close()
+        if self.event_log is not None:
+            self.event_log.flush()
         if self.verbose:
             self.progress_bar.finish()
 
+    def is_decision_free(self) -> bool:
+        """
+        :return: true if no vehicle will make a decision in the rest of the shift and the stack only holds trip events
+        """
+        return isinstance(
+            self.policy, (decision.DoNothing, decision.NightShift)
+        ) and all(
+            isinstance(
+                event,
+                (
+                    classes.GenerateScooterTrips,
+                    classes.ScooterDeparture,
+                    classes.ScooterArrival,
+                    classes.LostTrip,
+                ),
+            )
+            for event in self.stack
+        )
+
     def get_remaining_time(self) -> int:
         """
         Computes the remaining time by taking the difference between the shift duration
@@ -257,6 +524,17 @@ class World(SaveMixin, HyperParameters):
             if discount
             else (reward, location_id)
         )
+        if self.rewards[-1][0] == self.LOST_TRIP_REWARD:
+            self.metrics.add_lost_trip()
+
+    def log_event(self, event_type: str, **columns) -> None:
+        """
+        Records an event at the current time in the event log, if the world has one
+        :param event_type: one of EventLog.EVENT_TYPES
+        :param columns: values of the other columns of the event log
+        """
+        if self.event_log is not None:
+            self.event_log.record(self.time, event_type, **columns)
 
     def get_total_reward(self) -> float:
         """
@@ -267,12 +545,31 @@ class World(SaveMixin, HyperParameters):
 
     def add_event(self, event: classes.Event) -> None:
         """
-        Adds event to the sorted stack.
-        Avoids calling sort on every iteration by using the bisect package
+        Adds event to the event queue. Events with equal time are performed in the order they are added
         :param event: event to insert
         """
-        insert_index = bisect.bisect([event.time for event in self.stack], event.time)
-        self.stack.insert(insert_index, event)
+        self.stack.push(event)
+
+    def add_events(self, events: [classes.Event]) -> None:
+        """
+        Add several events to the stack in one batch
+        :param events: events to add, events with the same time are performed in the given order
+        """
+        self.stack.extend(events)
+
+    def set_seed(self, seed) -> None:
+        """
+        Seeds the random state drawing the trips of the world, making the scooter trips of a run reproducible
+        :param seed: seed of the random state, the global numpy random state is used if None
+        """
+        self.seed = seed
+        self.random_state = np.random.RandomState(seed) if seed is not None else None
+
+    def get_random_state(self):
+        """
+        :return: the random state of the world, or the global numpy random state if the world is not seeded
+        """
+        return self.random_state if self.random_state is not None else np.random
 
     def add_trip_to_flow(self, start: int, end: int) -> None:
         """
@@ -336,6 +633,7 @@ class World(SaveMixin, HyperParameters):
                         self.LOCATION_REPETITION,
                         self.TRACE_DECAY,
                         self.ANN_NETWORK_STRUCTURE,
+                        self.REPLAY_BUFFER_CAPACITY,
                     )
                     if value_function_class is decision.value_functions.ANNValueFunction
                     else value_function_class(
@@ -345,6 +643,7 @@ class World(SaveMixin, HyperParameters):
                         self.VEHICLE_INVENTORY_STEP_SIZE,
                         self.LOCATION_REPETITION,
                         self.TRACE_DECAY,
+                        self.REPLAY_BUFFER_CAPACITY,
                     )
                 )
                 policy = policy_class(
@@ -352,6 +651,8 @@ class World(SaveMixin, HyperParameters):
                     self.NUMBER_OF_NEIGHBOURS,
                     self.EPSILON,
                     value_function,
+                    self.NUMBER_OF_ACTION_EVALUATION_PROCESSES,
+                    self.LOOKAHEAD_SCENARIOS,
                 )
             elif policy_class is decision.RandomActionPolicy:
                 policy = policy_class(
@@ -364,17 +665,13 @@ class World(SaveMixin, HyperParameters):
                 policy = policy_class()
         # The the value function is the DoNothing Policy. Empty the vehicle arrival events in the stack
         if isinstance(policy, decision.DoNothing):
-            self.stack = [
-                event
-                for event in self.stack
-                if not isinstance(event, classes.VehicleArrival)
-            ]
+            self.stack.remove_events(
+                lambda event: isinstance(event, classes.VehicleArrival)
+            )
         elif isinstance(policy, decision.NightShift):
-            self.stack = [
-                event
-                for event in self.stack
-                if not isinstance(event, classes.VehicleArrival)
-            ]
+            self.stack.remove_events(
+                lambda event: isinstance(event, classes.VehicleArrival)
+            )
             for cluster in self.state.clusters:
                 for scooter in cluster.scooters:
                     if scooter.battery < 70:
@@ -428,7 +725,13 @@ class World(SaveMixin, HyperParameters):
         new_world.tabu_list = self.tabu_list.copy()
         new_world.cluster_flow = self.cluster_flow.copy()
         new_world.metrics = copy.deepcopy(self.metrics)
+        # The copy writes a new run to the event log directory
+        new_world.event_log = copy.deepcopy(self.event_log)
         new_world.disable_training = self.disable_training
+        # The copy continues from the same random state
+        new_world.seed = self.seed
+        new_world.random_state = copy.deepcopy(self.random_state)
+        new_world.fast_forward = self.fast_forward
         # Set all hyper parameters
         for parameter in HyperParameters().__dict__.keys():
             setattr(new_world, parameter, getattr(self, parameter))
@@ -1,11 +1,17 @@
 from .Action import Action
 from .Cluster import Cluster
 from .Scooter import Scooter
+from .UndoLog import UndoLog
+from .ScenarioStore import ScenarioStore
+from .AliasTable import AliasTable
+from .ReplayBuffer import ReplayBuffer
+from .EventLog import EventLog
 from .State import State
 from .Vehicle import Vehicle
 from .Location import Location
 from .Depot import Depot
 from .events.Event import Event
+from .EventQueue import EventQueue
 from .World import World
 from .events.LostTrip import LostTrip
 from .events.ScooterDeparture import ScooterDeparture
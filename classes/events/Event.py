@@ -6,7 +6,13 @@ class Event:
     def __init__(self, time: int):
         self.time = time
 
-    def perform(self, world, add_metric=True) -> None:
+    def perform(self, world, add_metric=True, changed_cluster_ids=None) -> None:
+        """
+        Moves the world to the time of the event and records the metrics of the world
+        :param world: world object
+        :param add_metric: record the metrics after the event
+        :param changed_cluster_ids: ids of the clusters changed by the event, None if any cluster could have changed
+        """
         if world.time <= self.time:
             world.time = self.time
         else:
@@ -15,7 +21,7 @@ class Event:
                 f", World time: {world.time}"
             )
         if add_metric:
-            world.metrics.add_analysis_metrics(world)
+            world.metrics.add_analysis_metrics(world, changed_cluster_ids)
 
     def __repr__(self):
         return f"<{self.__class__.__name__} at time {self.time}>"
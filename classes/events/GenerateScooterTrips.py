@@ -12,28 +12,44 @@ class GenerateScooterTrips(Event):
     def __init__(self, time: int):
         super().__init__(time)
 
-    def perform(self, world, **kwargs) -> None:
-        for departure_cluster in world.state.clusters:
-            # poisson process to select number of trips in a iteration
-            number_of_trips = round(
-                np.random.poisson(departure_cluster.trip_intensity_per_iteration)
-            )
-
-            # generate trip departure times (can be implemented with np.random.uniform if we want decimal times)
-            # both functions generate numbers from a discrete uniform distribution
-            trips_departure_time = sorted(
-                np.random.randint(
-                    self.time, self.time + ITERATION_LENGTH_MINUTES, number_of_trips
-                )
-            )
+    @staticmethod
+    def draw_trips(time: int, trip_intensities, random_state) -> (list, list):
+        """
+        Draws the trips of an iteration from the poisson processes of the clusters
+        :param time: start time of the iteration
+        :param trip_intensities: expected number of trips in an iteration from every cluster
+        :param random_state: numpy random state to draw from
+        :return: departure times of the trips in increasing order and the index of the departure cluster of every trip
+        """
+        # poisson process to select number of trips in a iteration for all clusters at once
+        number_of_trips = random_state.poisson(trip_intensities)
+        departure_clusters = np.repeat(np.arange(len(number_of_trips)), number_of_trips)
+        # generate trip departure times (can be implemented with np.random.uniform if we want decimal times)
+        # both functions generate numbers from a discrete uniform distribution
+        trips_departure_time = random_state.randint(
+            time, time + ITERATION_LENGTH_MINUTES, len(departure_clusters)
+        )
+        # The stable sort keeps the trips with the same time in the order of the clusters
+        order = np.argsort(trips_departure_time, kind="stable")
+        return trips_departure_time[order].tolist(), departure_clusters[order].tolist()
 
-            # generate departure and arrival event for every trip and add to world stack
-            for departure_time in trips_departure_time:
-                # add departure event to the stack
-                departure_event = classes.ScooterDeparture(
-                    departure_time, departure_cluster.id
+    def perform(self, world, **kwargs) -> None:
+        clusters = world.state.clusters
+        departure_times, departure_clusters = GenerateScooterTrips.draw_trips(
+            self.time,
+            [cluster.trip_intensity_per_iteration for cluster in clusters],
+            world.get_random_state(),
+        )
+
+        # add a departure event for every trip to the world stack in one batch
+        world.add_events(
+            [
+                classes.ScooterDeparture(departure_time, clusters[departure_cluster].id)
+                for departure_time, departure_cluster in zip(
+                    departure_times, departure_clusters
                 )
-                world.add_event(departure_event)
+            ]
+        )
 
         world.add_event(GenerateScooterTrips(self.time + ITERATION_LENGTH_MINUTES))
 
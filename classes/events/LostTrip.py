@@ -14,4 +14,10 @@ class LostTrip(Event):
         world.add_reward(world.LOST_TRIP_REWARD, self.location_id)
         if world.verbose:
             print(f"LT: {self.location_id} at {self.time}")
-        super(LostTrip, self).perform(world, **kwargs)
+        super(LostTrip, self).perform(world, changed_cluster_ids=[], **kwargs)
+        world.log_event(
+            "LostTrip",
+            cluster=self.location_id,
+            reward=world.LOST_TRIP_REWARD,
+            lost_trips=1,
+        )
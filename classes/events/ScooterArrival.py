@@ -39,4 +39,9 @@ class ScooterArrival(Event):
         world.add_trip_to_flow(self.departure_cluster_id, self.arrival_cluster_id)
 
         # set time of world to this event's time
-        super(ScooterArrival, self).perform(world, **kwargs)
+        super(ScooterArrival, self).perform(
+            world, changed_cluster_ids=[arrival_cluster.id], **kwargs
+        )
+        world.log_event(
+            "ScooterArrival", cluster=arrival_cluster.id, scooter=self.scooter.id
+        )
@@ -1,7 +1,6 @@
 import classes
 from classes import Event
 from globals import SCOOTER_SPEED
-import numpy as np
 
 
 class ScooterDeparture(Event):
@@ -14,6 +13,13 @@ class ScooterDeparture(Event):
         super().__init__(departure_time)
         self.departure_cluster_id = departure_cluster_id
 
+    @staticmethod
+    def get_arrival_time(departure_time: int, distance: float) -> int:
+        """
+        :return: the time a trip of the given distance that departs at the departure time arrives
+        """
+        return departure_time + round(distance / SCOOTER_SPEED * 60)
+
     def perform(self, world, **kwargs) -> None:
         """
         :param world: world object
@@ -30,9 +36,11 @@ class ScooterDeparture(Event):
             scooter = available_scooters.pop(0)
 
             # get a arrival cluster from the leave prob distribution
-            arrival_cluster = np.random.choice(
-                world.state.clusters, p=departure_cluster.get_leave_distribution()
-            )
+            arrival_cluster = world.state.clusters[
+                world.state.sample_leave_destinations(
+                    departure_cluster.id, world.get_random_state()
+                )
+            ]
 
             trip_distance = world.state.get_distance(
                 departure_cluster.id,
@@ -40,7 +48,7 @@ class ScooterDeparture(Event):
             )
 
             # calculate arrival time
-            arrival_time = self.time + round(trip_distance / SCOOTER_SPEED * 60)
+            arrival_time = ScooterDeparture.get_arrival_time(self.time, trip_distance)
 
             # create an arrival event for the departed scooter
             world.add_event(
@@ -55,8 +63,13 @@ class ScooterDeparture(Event):
 
             # remove scooter from the departure cluster
             departure_cluster.remove_scooter(scooter)
+            world.log_event(
+                "ScooterDeparture", cluster=departure_cluster.id, scooter=scooter.id
+            )
         else:
             world.add_event(classes.LostTrip(self.time, self.departure_cluster_id))
 
         # set time of world to this event's time
-        super(ScooterDeparture, self).perform(world, **kwargs)
+        super(ScooterDeparture, self).perform(
+            world, changed_cluster_ids=[departure_cluster.id], **kwargs
+        )
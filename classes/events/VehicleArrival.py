@@ -20,12 +20,8 @@ class VehicleArrival(Event):
         :param world: world object
         """
         try:
-            vehicle = [
-                vehicle
-                for vehicle in world.state.vehicles
-                if vehicle.id == self.vehicle_id
-            ][0]
-        except IndexError:
+            vehicle = world.state.get_vehicle_by_id(self.vehicle_id)
+        except ValueError:
             raise ValueError(
                 "OBS! Something went wrong. The vehicle is not in this state."
             )
@@ -106,7 +102,18 @@ class VehicleArrival(Event):
             )
 
         # set time of world to this event's time
-        super(VehicleArrival, self).perform(world, **kwargs)
+        super(VehicleArrival, self).perform(
+            world, changed_cluster_ids=[arrival_cluster_id], **kwargs
+        )
+        world.log_event(
+            "VehicleArrival",
+            cluster=arrival_cluster_id,
+            vehicle=vehicle.id,
+            reward=world.rewards[-1][0],
+            battery_swaps=len(action.battery_swaps),
+            pick_ups=len(action.pick_ups),
+            deliveries=len(action.delivery_scooters),
+        )
 
         # Compute the arrival time for the Vehicle arrival event created by the action
         arrival_time += self.time + action_time
@@ -0,0 +1,62 @@
+import unittest
+
+import numpy as np
+
+import classes
+import clustering.scripts
+
+
+class AliasTableTests(unittest.TestCase):
+    def test_sample_distribution(self):
+        distributions = np.array(
+            [[0.5, 0.25, 0.25, 0.0], [0.0, 0.0, 1.0, 0.0], [0.1, 0.2, 0.3, 0.4]]
+        )
+        alias_table = classes.AliasTable(distributions)
+        random_state = np.random.RandomState(42)
+        number_of_samples = 100000
+        for row, distribution in enumerate(distributions):
+            outcomes = alias_table.sample(np.full(number_of_samples, row), random_state)
+            frequencies = np.bincount(outcomes, minlength=4) / number_of_samples
+            np.testing.assert_allclose(frequencies, distribution, atol=0.01)
+            # Outcomes with zero probability are never drawn
+            self.assertTrue((frequencies[distribution == 0] == 0).all())
+        self.assertIsInstance(alias_table.sample(1, random_state), int)
+        self.assertEqual(alias_table.sample(1, random_state), 2)
+
+    def test_state_leave_destinations(self):
+        state = clustering.scripts.get_initial_state(100, 10)
+        number_of_samples = 20000
+        for cluster in state.clusters[:3]:
+            destinations = state.sample_leave_destinations(
+                np.full(number_of_samples, cluster.id)
+            )
+            np.testing.assert_allclose(
+                np.bincount(destinations, minlength=len(state.clusters))
+                / number_of_samples,
+                cluster.get_leave_distribution(),
+                atol=0.02,
+            )
+        # The tables are rebuilt when the probability matrix changes
+        alias_table = state.get_leave_alias_table()
+        self.assertIs(state.get_leave_alias_table(), alias_table)
+        probability_matrix = np.zeros((len(state.clusters), len(state.clusters)))
+        probability_matrix[:, 0] = 1
+        probability_matrix[0, 1] = 1
+        state.set_probability_matrix(probability_matrix)
+        self.assertIsNot(state.get_leave_alias_table(), alias_table)
+        self.assertListEqual(
+            state.sample_leave_destinations(np.arange(len(state.clusters))).tolist(),
+            [1] + [0] * (len(state.clusters) - 1),
+        )
+        # And when the move probabilities of a single cluster are replaced
+        alias_table = state.get_leave_alias_table()
+        state.clusters[2].set_move_probabilities(np.eye(len(state.clusters))[3])
+        self.assertIsNot(state.get_leave_alias_table(), alias_table)
+        self.assertListEqual(
+            state.sample_leave_destinations(np.arange(len(state.clusters))).tolist(),
+            [1, 0, 3] + [0] * (len(state.clusters) - 3),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import copy
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import classes
+import clustering.scripts
+import decision
+
+
+class EventLogTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_chunks(self):
+        event_log = classes.EventLog(self.directory.name, chunk_size=4)
+        for time in range(10):
+            event_log.record(time, "ScooterDeparture", cluster=time % 3, scooter=time)
+        # Full chunks are written as soon as they are filled
+        self.assertEqual(event_log.number_of_chunks, 2)
+        self.assertEqual(len(event_log), 10)
+        event_log.flush()
+        self.assertEqual(len(os.listdir(self.directory.name)), 3)
+        self.assertListEqual(
+            [
+                len(chunk["time"])
+                for chunk in classes.EventLog.iterate_chunks(
+                    self.directory.name, event_log.run_id
+                )
+            ],
+            [4, 4, 2],
+        )
+        rows = classes.EventLog.read(self.directory.name, event_log.run_id)
+        np.testing.assert_array_equal(rows["time"], np.arange(10))
+        np.testing.assert_array_equal(rows["scooter"], np.arange(10))
+        np.testing.assert_array_equal(rows["cluster"], np.arange(10) % 3)
+        np.testing.assert_array_equal(rows["vehicle"], np.full(10, -1))
+        self.assertTrue(
+            (
+                rows["event_type"]
+                == classes.EventLog.EVENT_TYPES.index("ScooterDeparture")
+            ).all()
+        )
+
+    def test_copy_writes_new_run(self):
+        event_log = classes.EventLog(self.directory.name)
+        event_log.record(1, "LostTrip", cluster=2, lost_trips=1, reward=-1)
+        copied_event_log = copy.deepcopy(event_log)
+        # Copying the log does not write the buffered rows
+        self.assertListEqual(os.listdir(self.directory.name), [])
+        self.assertEqual(len(copied_event_log), 0)
+        event_log.flush()
+        copied_event_log.record(2, "LostTrip", cluster=3, lost_trips=1, reward=-1)
+        copied_event_log.flush()
+        self.assertNotEqual(copied_event_log.run_id, event_log.run_id)
+        self.assertListEqual(
+            classes.EventLog.get_run_ids(self.directory.name),
+            [event_log.run_id, copied_event_log.run_id],
+        )
+        self.assertListEqual(
+            classes.EventLog.read(self.directory.name, copied_event_log.run_id)[
+                "cluster"
+            ].tolist(),
+            [3],
+        )
+
+    def test_world_event_log(self):
+        world = classes.World(
+            40,
+            policy=decision.SwapAllPolicy(),
+            initial_state=clustering.scripts.get_initial_state(100, 10),
+            visualize=False,
+            event_log_directory=self.directory.name,
+        )
+        world.run()
+        self.assertEqual(len(world.event_log), world.event_log.number_of_written_rows)
+        rows = classes.EventLog.read(self.directory.name, world.event_log.run_id)
+        self.assertTrue((np.diff(rows["time"]) >= 0).all())
+        self.assertEqual(rows["lost_trips"].sum(), world.metrics.number_of_lost_trips)
+        self.assertAlmostEqual(
+            rows["reward"].sum(), sum(reward for reward, _ in world.rewards)
+        )
+        vehicle_arrivals = rows["event_type"] == classes.EventLog.EVENT_TYPES.index(
+            "VehicleArrival"
+        )
+        self.assertEqual(
+            sorted(set(rows["vehicle"][vehicle_arrivals])),
+            [vehicle.id for vehicle in world.state.vehicles],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,6 +11,7 @@ from classes import (
     GenerateScooterTrips,
     LostTrip,
     World,
+    EventQueue,
 )
 from globals import ITERATION_LENGTH_MINUTES
 
@@ -24,7 +25,7 @@ class EventsTests(unittest.TestCase):
                 100, 10, initial_location_depot=False
             ),
         )
-        self.world.stack = []
+        self.world.stack = EventQueue()
         self.vehicle = self.world.state.vehicles[0]
         self.large_world = World(
             40,
@@ -33,7 +34,7 @@ class EventsTests(unittest.TestCase):
                 100, 20, initial_location_depot=False
             ),
         )
-        self.large_world.stack = []
+        self.large_world.stack = EventQueue()
         self.vehicle_large_world = self.large_world.state.vehicles[0]
 
         self.departure_time = 1
@@ -108,7 +109,7 @@ class EventsTests(unittest.TestCase):
 
     def test_vehicle_arrival(self):
         # Clear stack to check specific vehicle arrival event
-        self.world.stack = []
+        self.world.stack = EventQueue()
         # Choose a random cluster for the vehicle to be in
         arrival_cluster = self.world.state.get_random_cluster(
             exclude=self.vehicle.current_location
@@ -155,6 +156,24 @@ class EventsTests(unittest.TestCase):
             )
         )
 
+    def test_generate_scooter_trips_seed(self):
+        def get_departures(seed):
+            self.large_world.stack = EventQueue()
+            self.large_world.set_seed(seed)
+            GenerateScooterTrips(0).perform(self.large_world)
+            return [
+                (event.time, event.departure_cluster_id)
+                for event in self.large_world.stack
+                if isinstance(event, ScooterDeparture)
+            ]
+
+        departures = get_departures(42)
+        self.assertGreater(len(departures), 0)
+        # Departures are performed in time order, and in cluster order within the same minute
+        self.assertListEqual(departures, sorted(departures))
+        self.assertListEqual(get_departures(42), departures)
+        self.assertNotEqual(get_departures(43), departures)
+
     def test_lost_trip(self):
         lost_trip = LostTrip(2, 0)
         lost_trip.perform(self.world)
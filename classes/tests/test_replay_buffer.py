@@ -0,0 +1,67 @@
+import pickle
+import unittest
+from collections import deque
+
+import numpy as np
+
+import classes
+import decision.value_functions
+
+
+class ReplayBufferTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.transitions = [
+            (np.full(4, i, dtype=float), -i, np.full(4, i + 1, dtype=float))
+            for i in range(10)
+        ]
+
+    def assertTransitionsEqual(self, transitions, expected_transitions):
+        self.assertEqual(len(transitions), len(expected_transitions))
+        for transition, expected_transition in zip(transitions, expected_transitions):
+            np.testing.assert_array_equal(transition[0], expected_transition[0])
+            self.assertEqual(transition[1], expected_transition[1])
+            np.testing.assert_array_equal(transition[2], expected_transition[2])
+
+    def test_ring_buffer(self):
+        replay_buffer = classes.ReplayBuffer(capacity=4)
+        self.assertListEqual(list(replay_buffer), [])
+        replay_buffer.extend(self.transitions[:3])
+        self.assertTransitionsEqual(list(replay_buffer), self.transitions[:3])
+        # The oldest transitions are overwritten as in a deque with the same max length
+        replay_buffer.extend(self.transitions[3:])
+        self.assertTransitionsEqual(
+            list(replay_buffer), list(deque(self.transitions, maxlen=4))
+        )
+
+    def test_sample(self):
+        replay_buffer = classes.ReplayBuffer(capacity=8)
+        replay_buffer.extend(self.transitions)
+        states, rewards, next_states = replay_buffer.sample(8)
+        self.assertEqual(states.shape, (8, 4))
+        self.assertEqual(len(set(rewards)), 8)
+        np.testing.assert_array_equal(states[:, 0], -rewards)
+        np.testing.assert_array_equal(next_states, states + 1)
+        self.assertTrue(all(reward <= -2 for reward in rewards))
+
+    def test_legacy_replay_buffer(self):
+        value_function = decision.value_functions.LinearValueFunction(
+            0.1, 0.1, 0.9, 0.25, 3, 0.9
+        )
+        legacy_state = value_function.__dict__.copy()
+        legacy_state["replay_buffer"] = deque(self.transitions, maxlen=5)
+        legacy_state["replay_buffer_negative"] = deque(maxlen=5)
+        value_function = decision.value_functions.LinearValueFunction.__new__(
+            decision.value_functions.LinearValueFunction
+        )
+        value_function.__setstate__(legacy_state)
+        self.assertIsInstance(value_function.replay_buffer, classes.ReplayBuffer)
+        self.assertEqual(value_function.replay_buffer.capacity, 5)
+        self.assertTransitionsEqual(
+            list(pickle.loads(pickle.dumps(value_function.replay_buffer))),
+            self.transitions[-5:],
+        )
+        self.assertEqual(len(value_function.replay_buffer_negative), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
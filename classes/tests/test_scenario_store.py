@@ -0,0 +1,78 @@
+import copy
+import pickle
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+import classes
+import clustering.scripts
+import system_simulation.scripts
+
+
+class ScenarioStoreTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.state = clustering.scripts.get_initial_state(
+            sample_size=100, number_of_clusters=10
+        )
+        self.scenarios = self.state.simulation_scenarios
+
+    def test_scenarios(self):
+        self.assertIsInstance(self.scenarios, classes.ScenarioStore)
+        self.assertEqual(self.scenarios.trips.shape, (len(self.scenarios), 10))
+        for scenario_index in range(0, len(self.scenarios), 100):
+            for cluster_index, number_of_trips in enumerate(
+                self.scenarios.get_trips(scenario_index)
+            ):
+                destinations = self.scenarios.get_destinations(
+                    scenario_index, cluster_index
+                )
+                self.assertEqual(len(destinations), number_of_trips)
+                self.assertTrue(
+                    all(0 <= destination < 10 for destination in destinations)
+                )
+
+    def test_legacy_scenarios(self):
+        legacy_scenarios = [
+            self.scenarios.get_scenario(scenario_index)
+            for scenario_index in range(len(self.scenarios))
+        ]
+        # Cached states with nested list scenarios are converted when loaded
+        legacy_state = copy.copy(self.state.__dict__)
+        legacy_state["simulation_scenarios"] = legacy_scenarios
+        state = classes.State.__new__(classes.State)
+        state.__setstate__(legacy_state)
+        self.assertIsInstance(state.simulation_scenarios, classes.ScenarioStore)
+        for name in classes.ScenarioStore.FILE_NAMES:
+            np.testing.assert_array_equal(
+                getattr(state.simulation_scenarios, name),
+                getattr(self.scenarios, name),
+            )
+        self.assertLess(
+            len(pickle.dumps(self.scenarios)), len(pickle.dumps(legacy_scenarios))
+        )
+
+    def test_memory_mapped_scenarios(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.scenarios.save(directory)
+            scenarios = classes.ScenarioStore.load(directory)
+            self.assertIsInstance(scenarios.destinations, np.memmap)
+            for name in classes.ScenarioStore.FILE_NAMES:
+                np.testing.assert_array_equal(
+                    getattr(scenarios, name), getattr(self.scenarios, name)
+                )
+            # The same scenario is drawn from both stores given the same seed
+            state = copy.deepcopy(self.state)
+            state.simulation_scenarios = scenarios
+            random.seed(42)
+            flows, _, lost_demand = system_simulation.scripts.system_simulate(state)
+            random.seed(42)
+            (
+                expected_flows,
+                _,
+                expected_lost_demand,
+            ) = system_simulation.scripts.system_simulate(self.state)
+            self.assertEqual(flows, expected_flows)
+            self.assertEqual(lost_demand, expected_lost_demand)
+            del scenarios, state
@@ -1,9 +1,148 @@
+import copy
+import math
 import random
 import unittest
 
+import numpy as np
+
 import classes
 from clustering.scripts import get_initial_state
 import globals
+import system_simulation.scripts
+from globals import BATTERY_LIMIT
+
+
+# helper function filtering the next locations by scanning all clusters, as filtering_neighbours did before the
+# neighbour index
+def list_filtering_neighbours(
+    state, vehicle, pick_up, delivery, number_of_neighbours, exclude
+):
+    inventory = len(vehicle.scooter_inventory) + pick_up - delivery
+    deviations = [
+        (
+            cluster,
+            len(
+                [
+                    scooter
+                    for scooter in cluster.scooters
+                    if scooter.battery >= BATTERY_LIMIT
+                ]
+            )
+            - cluster.ideal_state,
+        )
+        for cluster in state.clusters
+        if cluster.id != vehicle.current_location.id and cluster.id not in exclude
+    ]
+    positive_deviation = [
+        cluster
+        for cluster, _ in sorted(
+            [
+                (cluster, deviation)
+                for cluster, deviation in deviations
+                if deviation > 0
+            ],
+            key=lambda cluster_deviation: cluster_deviation[1],
+            reverse=True,
+        )
+    ]
+    negative_deviation = [
+        cluster
+        for cluster, _ in sorted(
+            [
+                (cluster, deviation)
+                for cluster, deviation in deviations
+                if deviation < 0
+            ],
+            key=lambda cluster_deviation: cluster_deviation[1],
+        )
+    ]
+    if inventory <= 0:
+        return positive_deviation[:number_of_neighbours]
+    if inventory < vehicle.scooter_inventory_capacity and positive_deviation:
+        return negative_deviation[: number_of_neighbours - 1] + positive_deviation[:1]
+    return negative_deviation[:number_of_neighbours]
+
+
+# helper function enumerating the possible actions combination by combination, as get_possible_actions did before
+# the action encodings. Returns the scooter ids and next location of the actions
+def get_list_possible_actions(state, vehicle, number_of_neighbours, divide, time):
+    cluster = vehicle.current_location
+    exclude = []
+
+    def get_range(max_int):
+        if divide and divide > 0 and max_int > 0:
+            return list({*range(0, max_int + 1, math.ceil(max_int / divide)), max_int})
+        return list(range(max_int + 1))
+
+    pick_ups = min(
+        max(len(cluster.scooters) - cluster.ideal_state, 0),
+        vehicle.scooter_inventory_capacity - len(vehicle.scooter_inventory),
+        vehicle.battery_inventory,
+    )
+    drop_offs = max(
+        min(
+            cluster.ideal_state - len(cluster.scooters), len(vehicle.scooter_inventory)
+        ),
+        0,
+    )
+    swappable_ids = [
+        scooter.id
+        for scooter in sorted(cluster.scooters, key=lambda scooter: scooter.battery)
+        if scooter.battery < 70
+    ]
+    full_battery_ids = [
+        scooter.id for scooter in cluster.scooters if scooter.battery >= 70
+    ]
+    actions = []
+    for pick_up in get_range(pick_ups):
+        for swap in get_range(vehicle.get_max_number_of_swaps()):
+            for drop_off in get_range(drop_offs):
+                if (
+                    pick_up + swap
+                    > min(len(cluster.scooters), vehicle.battery_inventory)
+                    or pick_up + swap + drop_off == 0
+                ):
+                    continue
+                battery_swap = max(min(vehicle.battery_inventory - pick_up, swap), 0)
+                for location in list_filtering_neighbours(
+                    state, vehicle, pick_up, drop_off, number_of_neighbours, exclude
+                ):
+                    next_location = location.id
+                    if (
+                        vehicle.battery_inventory - battery_swap - pick_up
+                        < vehicle.battery_inventory_capacity * 0.1
+                    ):
+                        # If battery inventory is low, go to the closest depot with enough batteries
+                        next_location = [
+                            depot.id
+                            for depot in sorted(
+                                state.depots,
+                                key=lambda depot: state.get_distance(
+                                    cluster.id, depot.id
+                                ),
+                            )
+                            if depot.get_available_battery_swaps(time)
+                            > vehicle.battery_inventory_capacity * 0.9
+                        ][0]
+                    actions.append(
+                        (
+                            swappable_ids[:battery_swap],
+                            swappable_ids[battery_swap : battery_swap + pick_up]
+                            + full_battery_ids[
+                                : max(battery_swap + pick_up - len(swappable_ids), 0)
+                            ],
+                            [scooter.id for scooter in vehicle.scooter_inventory][
+                                :drop_off
+                            ],
+                            next_location,
+                        )
+                    )
+    return actions or [
+        ([], [], [], neighbour.id)
+        for neighbour in list_filtering_neighbours(
+            state, vehicle, 0, 0, number_of_neighbours, exclude
+        )
+    ]
 
 
 class StateTests(unittest.TestCase):
@@ -26,6 +165,208 @@ class StateTests(unittest.TestCase):
                 )
                 self.assertEqual(0, cluster.get_leave_distribution()[cluster.id])
 
+    def test_distance_matrix(self):
+        state = self.state_small
+        for location in state.locations:
+            for neighbour in state.locations:
+                expected = (
+                    0.0
+                    if location == neighbour
+                    else location.distance_to(*neighbour.get_location())
+                )
+                self.assertAlmostEqual(
+                    state.get_distance(location.id, neighbour.id), expected
+                )
+        # The distance matrix is read only and shared between copies of the state
+        with self.assertRaises(ValueError):
+            state.distance_matrix[0, 1] = 0.0
+        self.assertIs(copy.deepcopy(state).distance_matrix, state.distance_matrix)
+
+    def test_id_lookups(self):
+        state = self.state_small
+        for location in state.locations:
+            self.assertIs(state.get_location_by_id(location.id), location)
+        self.assertRaises(ValueError, state.get_location_by_id, len(state.locations))
+        vehicle = state.vehicles[0]
+        self.assertIs(state.get_vehicle_by_id(vehicle.id), vehicle)
+        self.assertRaises(ValueError, state.get_vehicle_by_id, len(state.vehicles))
+
+        # The scooter index is kept consistent when scooters move between clusters and the vehicle
+        cluster = max(
+            state.clusters, key=lambda state_cluster: len(state_cluster.scooters)
+        )
+        scooter = cluster.scooters[0]
+        self.assertIs(cluster.get_scooter_from_id(scooter.id), scooter)
+        self.assertRaises(ValueError, cluster.add_scooter, scooter)
+        cluster.remove_scooter(scooter)
+        self.assertRaises(ValueError, cluster.get_scooter_from_id, scooter.id)
+        vehicle.pick_up(scooter)
+        self.assertIs(vehicle.drop_off(scooter.id), scooter)
+        self.assertRaises(ValueError, vehicle.drop_off, scooter.id)
+        other_cluster = state.get_location_by_id((cluster.id + 1) % len(state.clusters))
+        other_cluster.add_scooter(scooter)
+        self.assertIs(other_cluster.get_scooter_from_id(scooter.id), scooter)
+
+    def test_cluster_aggregates(self):
+        cluster = max(
+            self.state_small.clusters,
+            key=lambda state_cluster: len(state_cluster.scooters),
+        )
+        for scooter, battery in zip(cluster.scooters, [10.0, 50.0, 10.0, 90.0]):
+            scooter.battery = battery
+        cluster.check_aggregates()
+        swappable_scooters = cluster.get_swappable_scooters()
+        self.assertListEqual(
+            swappable_scooters,
+            sorted(
+                [scooter for scooter in cluster.scooters if scooter.battery < 70],
+                key=lambda scooter: scooter.battery,
+            ),
+        )
+        # The available scooters are returned in the order of the scooter list
+        self.assertListEqual(
+            cluster.get_available_scooters(),
+            [
+                scooter
+                for scooter in cluster.scooters
+                if scooter.battery >= BATTERY_LIMIT
+            ],
+        )
+        self.assertEqual(
+            cluster.number_of_available_scooters(),
+            len(cluster.get_available_scooters()),
+        )
+        # Swapping, travelling and removing scooters updates the aggregates
+        swappable_scooters[0].swap_battery()
+        cluster.scooters[1].travel(10)
+        removed_scooter = cluster.scooters[2]
+        cluster.remove_scooter(removed_scooter)
+        removed_scooter.swap_battery()
+        cluster.check_aggregates()
+        self.assertNotIn(removed_scooter, cluster.get_swappable_scooters())
+        self.assertListEqual(
+            cluster.get_available_scooters(),
+            [
+                scooter
+                for scooter in cluster.scooters
+                if scooter.battery >= BATTERY_LIMIT
+            ],
+        )
+        # Scooters removed by replacing the scooter list does not update the aggregates
+        dropped_scooter = cluster.scooters[0]
+        cluster.scooters = cluster.scooters[1:]
+        dropped_scooter.travel(5)
+        cluster.check_aggregates()
+
+    def test_lookahead(self):
+        def state_snapshot(state):
+            return (
+                [
+                    [
+                        (scooter.id, scooter.battery, scooter.get_location())
+                        for scooter in cluster.scooters
+                    ]
+                    for cluster in state.clusters
+                ],
+                [
+                    (
+                        vehicle.current_location.id,
+                        vehicle.battery_inventory,
+                        [scooter.id for scooter in vehicle.scooter_inventory],
+                        len(vehicle.service_route),
+                    )
+                    for vehicle in state.vehicles
+                ],
+                [
+                    (depot.capacity, depot.time, depot.charging)
+                    for depot in state.depots
+                ],
+            )
+
+        def look_ahead(state, vehicle, action, seed):
+            random.seed(seed)
+            np.random.seed(seed)
+            state.do_action(action, vehicle, 0)
+            _, _, lost_demand = system_simulation.scripts.system_simulate(state)
+            return (
+                lost_demand,
+                [cluster.get_current_state() for cluster in state.clusters],
+                [cluster.number_of_available_scooters() for cluster in state.clusters],
+                [
+                    [scooter.id for scooter in cluster.get_swappable_scooters()]
+                    for cluster in state.clusters
+                ],
+                state_snapshot(state),
+            )
+
+        state = self.state_mid
+        vehicle = state.vehicles[0]
+        snapshot = state_snapshot(state)
+        for seed, action in enumerate(
+            state.get_possible_actions(vehicle, number_of_neighbours=3)
+        ):
+            forward_state = copy.deepcopy(state)
+            expected = look_ahead(
+                forward_state, forward_state.get_vehicle_by_id(vehicle.id), action, seed
+            )
+            with state.lookahead():
+                self.assertEqual(look_ahead(state, vehicle, action, seed), expected)
+            # The state is reverted after the lookahead
+            self.assertEqual(state_snapshot(state), snapshot)
+            for cluster in state.clusters:
+                cluster.check_aggregates()
+
+    def test_possible_actions_equal_list_actions(self):
+        state = self.state_big
+        vehicle = state.vehicles[0]
+        vehicle.current_location = max(
+            state.clusters, key=lambda cluster: len(cluster.get_swappable_scooters())
+        )
+        for scooter in state.clusters[10].scooters[:3]:
+            vehicle.pick_up(scooter)
+            state.clusters[10].remove_scooter(scooter)
+
+        def get_scooter_ids(action):
+            return (
+                action.battery_swaps,
+                action.pick_ups,
+                action.delivery_scooters,
+                action.next_location,
+            )
+
+        # The low battery inventory sends several combinations to the same depot
+        for battery_inventory in [vehicle.battery_inventory, 25]:
+            vehicle.battery_inventory = battery_inventory
+            for divide in [1, 2, 4, None]:
+                list_actions = get_list_possible_actions(
+                    state, vehicle, 3, divide=divide, time=0
+                )
+                actions = [
+                    get_scooter_ids(action)
+                    for action in state.get_possible_actions(
+                        vehicle, 3, divide=divide, time=0
+                    )
+                ]
+                # Same actions in the same order, without duplicates
+                self.assertListEqual(
+                    actions,
+                    [
+                        action
+                        for i, action in enumerate(list_actions)
+                        if action not in list_actions[:i]
+                    ],
+                )
+                self.assertEqual(
+                    len(actions),
+                    len(
+                        set(
+                            state.iterate_possible_actions(
+                                vehicle, 3, divide=divide, time=0
+                            )
+                        )
+                    ),
+                )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,11 @@
+import copy
 import os
+import pickle
 import unittest
 import random
+
+import numpy as np
+
 import classes
 import clustering.scripts
 import decision
@@ -8,6 +13,46 @@ import decision.value_functions
 import globals
 
 
+# helper function computing the metrics of the world from all clusters, in the order of WorldMetric.METRICS
+def scan_metrics(world):
+    clusters = world.state.clusters
+    return (
+        sum(reward == world.LOST_TRIP_REWARD for reward, _ in world.rewards),
+        sum(
+            max(0, cluster.ideal_state - cluster.number_of_available_scooters())
+            for cluster in clusters
+        )
+        / len(clusters),
+        sum(
+            cluster.ideal_state * 100
+            - sum(scooter.battery for scooter in cluster.get_available_scooters())
+            for cluster in clusters
+            if len(cluster.scooters) < cluster.ideal_state
+        )
+        / len(world.state.get_scooters()),
+        world.time,
+        sum(cluster.number_of_available_scooters() for cluster in clusters),
+    )
+
+
+# helper function averaging the metrics of several runs minute by minute, with the first recording in every minute
+def average_metrics_by_minute(metrics):
+    end_time = int(max(max(metric.timeline) for metric in metrics))
+    run_values = [np.zeros(len(classes.World.WorldMetric.METRICS)) for _ in metrics]
+    averages = []
+    for time in range(end_time + 1):
+        for values, metric in zip(run_values, metrics):
+            timeline = metric.timeline.tolist()
+            if time > 0 and time in timeline:
+                values[:] = metric.recordings[timeline.index(time)]
+        averages.append(np.mean(run_values, axis=0))
+    averages = np.array(averages)
+    averages[:, classes.World.WorldMetric.METRICS.index("timeline")] = range(
+        end_time + 1
+    )
+    return averages
+
+
 class WorldTestCase(unittest.TestCase):
     def setUp(self) -> None:
         self.world = classes.World(
@@ -18,12 +63,14 @@ class WorldTestCase(unittest.TestCase):
         )
 
     def test_run(self):
-        self.world.stack = [classes.Event(time) for time in range(10, 41, 10)]
+        self.world.stack = classes.EventQueue(
+            [classes.Event(time) for time in range(10, 41, 10)]
+        )
         self.world.run()
 
     def test_add_event(self):
         # Clear initial stack
-        self.world.stack = []
+        self.world.stack = classes.EventQueue()
         shuffled_events = [classes.Event(time) for time in range(10, 41, 10)]
         random.shuffle(shuffled_events)
         for event in shuffled_events:
@@ -32,12 +79,211 @@ class WorldTestCase(unittest.TestCase):
             [event.time for event in self.world.stack], range(10, 41, 10)
         )
 
+    def test_add_event_same_time(self):
+        self.world.stack = classes.EventQueue()
+        events = [classes.Event(time) for time in [20, 10, 20, 10, 20]]
+        for event in events:
+            self.world.add_event(event)
+        # Events with the same time are popped in the order they were added
+        popped_events = [self.world.stack.pop() for _ in range(len(events))]
+        self.assertSequenceEqual(
+            popped_events, [events[1], events[3], events[0], events[2], events[4]]
+        )
+
+    def test_add_events(self):
+        self.world.stack = classes.EventQueue()
+        events = [classes.Event(time) for time in [20, 10, 20, 10, 20]]
+        self.world.add_event(events[0])
+        self.world.add_events(events[1:])
+        self.world.add_events([])
+        # Large batches are heapified, events with the same time keep the order they were added
+        self.world.add_events([classes.Event(time) for time in range(30, 0, -1)])
+        popped_events = [self.world.stack.pop() for _ in range(len(self.world.stack))]
+        self.assertSequenceEqual(
+            [event.time for event in popped_events],
+            sorted(event.time for event in popped_events),
+        )
+        self.assertSequenceEqual(
+            [event for event in popped_events if event in events],
+            [events[1], events[3], events[0], events[2], events[4]],
+        )
+
+    def test_seed(self):
+        def run(seed):
+            random.seed(seed)
+            np.random.seed(seed)
+            world = copy.deepcopy(self.world)
+            world.set_seed(1)
+            world.run()
+            return world.metrics.lost_demand, world.metrics.timeline
+
+        # The trips of a seeded world do not depend on the global random state
+        lost_demand, timeline = run(0)
+        other_lost_demand, other_timeline = run(1)
+        np.testing.assert_array_equal(lost_demand, other_lost_demand)
+        np.testing.assert_array_equal(timeline, other_timeline)
+
+    def test_remove_events(self):
+        self.world.stack = classes.EventQueue(
+            [classes.Event(time) for time in range(10, 41, 10)]
+        )
+        self.world.stack.remove_events(lambda event: event.time == 20)
+        self.assertSequenceEqual(
+            [event.time for event in self.world.stack], [10, 30, 40]
+        )
+        self.assertEqual(self.world.stack.pop().time, 10)
+
     def test_run_with_initial_stack(self):
         self.world.run()
 
+    def test_cluster_aggregates(self):
+        # Recompute and compare the incrementally maintained cluster aggregates on every query
+        classes.Cluster.CHECK_AGGREGATES = True
+        try:
+            self.world.run()
+        finally:
+            classes.Cluster.CHECK_AGGREGATES = False
+        for cluster in self.world.state.clusters:
+            cluster.check_aggregates()
+
+    def test_metrics_equal_scanned_metrics(self):
+        scanned_metrics = []
+        while self.world.time < self.world.shift_duration:
+            event = self.world.stack.pop()
+            event.perform(self.world)
+            if not isinstance(event, classes.GenerateScooterTrips):
+                scanned_metrics.append(scan_metrics(self.world))
+        self.assertEqual(self.world.metrics.number_of_recordings, len(scanned_metrics))
+        np.testing.assert_allclose(
+            self.world.metrics.recordings[: len(scanned_metrics)], scanned_metrics
+        )
+
+    def test_metrics_resolution(self):
+        initial_world = copy.deepcopy(self.world)
+        random.seed(1)
+        np.random.seed(1)
+        world = classes.World(
+            40,
+            policy=decision.SwapAllPolicy(),
+            initial_state=initial_world.state,
+            visualize=False,
+            metrics_resolution=1,
+        )
+        world.run()
+        # At most one recording every minute, taken at the first event of the minute
+        timeline = world.metrics.timeline
+        self.assertTrue((np.diff(timeline) > 0).all())
+        random.seed(1)
+        np.random.seed(1)
+        self.world.run()
+        self.assertLess(len(timeline), self.world.metrics.number_of_recordings)
+        np.testing.assert_array_equal(timeline, np.unique(self.world.metrics.timeline))
+
+    def test_aggregate_metrics_equal_average_by_minute(self):
+        metrics = []
+        for _ in range(3):
+            world = copy.deepcopy(self.world)
+            world.shift_duration = random.randint(20, 40)
+            world.run()
+            metrics.append(world.metrics)
+        aggregated_metric = classes.World.WorldMetric.aggregate_metrics(metrics)
+        np.testing.assert_allclose(
+            aggregated_metric.recordings[: aggregated_metric.number_of_recordings],
+            average_metrics_by_minute(metrics),
+        )
+
+    def test_aggregate_metrics_spread(self):
+        metrics = []
+        for _ in range(5):
+            world = copy.deepcopy(self.world)
+            world.run()
+            metrics.append(world.metrics)
+        aggregated_metric = classes.World.WorldMetric.aggregate_metrics(
+            metrics, percentiles=(0, 50, 100)
+        )
+        timeline = aggregated_metric.timeline
+        np.testing.assert_array_equal(timeline, np.arange(len(timeline)))
+        for name in classes.World.WorldMetric.METRICS:
+            run_values = np.stack([metric.resample(timeline) for metric in metrics])[
+                :, :, classes.World.WorldMetric.METRICS.index(name)
+            ]
+            np.testing.assert_allclose(
+                aggregated_metric.get_percentile(name, 50),
+                np.median(run_values, axis=0),
+            )
+            minimum = aggregated_metric.get_percentile(name, 0)
+            maximum = aggregated_metric.get_percentile(name, 100)
+            lower, upper = aggregated_metric.get_confidence_band(name)
+            average = aggregated_metric.get_metric(name)
+            self.assertTrue((minimum <= average + 1e-9).all())
+            self.assertTrue((average <= maximum + 1e-9).all())
+            self.assertTrue((lower <= average).all() and (average <= upper).all())
+            # Student's t band with four degrees of freedom
+            np.testing.assert_allclose(
+                upper - average,
+                2.776445105 * run_values.std(axis=0, ddof=1) / np.sqrt(5),
+                atol=1e-9,
+            )
+        # A single run has no spread
+        single_metric = classes.World.WorldMetric.aggregate_metrics(metrics[:1])
+        lower, upper = single_metric.get_confidence_band("lost_demand")
+        np.testing.assert_array_equal(lower, upper)
+
+    def test_legacy_metrics_pickle(self):
+        self.world.run()
+        # Metrics pickled with lists of recordings are loaded into arrays
+        legacy_state = {
+            name: self.world.metrics.get_metric(name).tolist()
+            for name in classes.World.WorldMetric.METRICS
+        }
+        legacy_state["testing_parameter_name"] = ""
+        legacy_state["testing_parameter_value"] = 0.0
+        metric = classes.World.WorldMetric.__new__(classes.World.WorldMetric)
+        metric.__setstate__(pickle.loads(pickle.dumps(legacy_state)))
+        self.assertEqual(metric.to_dict().keys(), self.world.metrics.to_dict().keys())
+        for name in classes.World.WorldMetric.METRICS:
+            np.testing.assert_array_equal(
+                metric.get_metric(name), self.world.metrics.get_metric(name)
+            )
+        self.assertEqual(
+            metric.number_of_lost_trips, self.world.metrics.number_of_lost_trips
+        )
+
+    def test_legacy_world_pickle(self):
+        # Worlds pickled before the event queue and the latest hyper parameters were added
+        legacy_state = self.world.__dict__.copy()
+        legacy_state["stack"] = list(self.world.stack)
+        for parameter in [
+            "REPLAY_BUFFER_CAPACITY",
+            "NUMBER_OF_ACTION_EVALUATION_PROCESSES",
+            "LOOKAHEAD_SCENARIOS",
+        ]:
+            del legacy_state[parameter]
+        world = classes.World.__new__(classes.World)
+        world.__setstate__(pickle.loads(pickle.dumps(legacy_state)))
+        self.assertEqual(
+            world.LOOKAHEAD_SCENARIOS, globals.HyperParameters().LOOKAHEAD_SCENARIOS
+        )
+        # The events of the list are performed from the earliest
+        self.assertIsInstance(world.stack, classes.EventQueue)
+        self.assertListEqual(
+            [repr(event) for event in world.stack],
+            [repr(event) for event in legacy_state["stack"]],
+        )
+        world.run()
+        self.assertGreaterEqual(world.time, world.shift_duration)
+        policy = world.set_policy(
+            policy_class=decision.EpsilonGreedyValueFunctionPolicy,
+            value_function_class=decision.value_functions.LinearValueFunction,
+        )
+        self.assertEqual(
+            policy.number_of_processes,
+            globals.HyperParameters().NUMBER_OF_ACTION_EVALUATION_PROCESSES,
+        )
+
     def test_tabu_list(self):
         # Clear initial stack
-        self.world.stack = []
+        self.world.stack = classes.EventQueue()
         # Perform Vehicle arrival event
         arrival_event = classes.VehicleArrival(0, 0, False)
         arrival_event.perform(self.world)
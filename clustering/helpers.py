@@ -3,7 +3,6 @@ import math
 
 import numpy as np
 import pandas as pd
-from scipy import stats
 import globals
 import system_simulation.scripts
 
@@ -85,7 +84,9 @@ def idealize_state(state):
             if scooter.battery < 50:
                 scooter.swap_battery()
         # Find scooters possible to pick up
-        positive_deviation = len(cluster.get_available_scooters()) - cluster.ideal_state
+        positive_deviation = (
+            cluster.number_of_available_scooters() - cluster.ideal_state
+        )
         if positive_deviation > 0:
             # Add scooters possible to pick up
             excess_scooters += [
@@ -95,8 +96,8 @@ def idealize_state(state):
     # Add excess scooters to clusters in need of scooters
     for cluster in state_rebalanced_ideal_state.clusters:
         # Find out how many scooters to add to cluster
-        number_of_scooters_to_add = cluster.ideal_state - len(
-            cluster.get_available_scooters()
+        number_of_scooters_to_add = (
+            cluster.ideal_state - cluster.number_of_available_scooters()
         )
         # Add scooters to the cluster only if the number of available scooter is lower than ideal state
         if number_of_scooters_to_add > 0:
@@ -129,12 +130,12 @@ def simulate_state_outcomes(state_rebalanced_ideal_state, state):
                 / globals.ITERATION_LENGTH_MINUTES
             )
         ):
-            system_simulation.scripts.system_simulate(simulating_state)
+            system_simulation.scripts.bulk_system_simulate(simulating_state)
 
         # recording the available scooters in every cluster after a day
         for cluster in simulating_state.clusters:
             simulating_outcomes[cluster.id].append(
-                len(cluster.get_available_scooters())
+                cluster.number_of_available_scooters()
             )
 
     new_ideal_states = {}
@@ -1,9 +1,8 @@
 import copy
 
-from sklearn.cluster import KMeans
 import os
 
-from classes import State, Scooter, Cluster
+from classes import State, Scooter, Cluster, ScenarioStore
 from classes.Depot import Depot
 from globals import (
     GEOSPATIAL_BOUND_NEW,
@@ -60,6 +59,9 @@ def cluster_data(data: pd.DataFrame, number_of_clusters: int) -> [int]:
     :param number_of_clusters: how many clusters to create
     :return: list of labels for input data
     """
+    # Scikit-learn is imported here as it is slow to import and not needed for cached states
+    from sklearn.cluster import KMeans
+
     # Generate numpy array from dataframe
     coords = data[["lat", "lon"]].values
     # Run k-means algorithm to generate clusters
@@ -307,27 +309,24 @@ def generate_depots(number_of_clusters):
     return depots
 
 
-def generate_scenarios(state: State, number_of_scenarios=10000):
+def generate_scenarios(state: State, number_of_scenarios=10000) -> ScenarioStore:
     """
     Generate system simulation scenarios. This is used to speed up the training simulation
     :param state: new state
     :param number_of_scenarios: how many scenarios to generate
-    :return: the scenarios list of (cluster id, number of trips, list of end cluster ids)
+    :return: scenario store with the number of trips and end cluster ids of every cluster in every scenario
     """
-    scenarios = []
-    cluster_indices = np.arange(len(state.clusters))
-    for i in range(number_of_scenarios):
-        one_scenario = []
-        for cluster in state.clusters:
-            number_of_trips = round(
-                np.random.poisson(cluster.trip_intensity_per_iteration)
-            )
-            end_cluster_indices = np.random.choice(
-                cluster_indices,
-                p=cluster.get_leave_distribution(),
-                size=number_of_trips,
-            ).tolist()
-            one_scenario.append((cluster.id, number_of_trips, end_cluster_indices))
-
-        scenarios.append(one_scenario)
-    return scenarios
+    # poisson process to select number of trips out of every cluster in every scenario
+    trips = np.random.poisson(
+        [cluster.trip_intensity_per_iteration for cluster in state.clusters],
+        size=(number_of_scenarios, len(state.clusters)),
+    ).astype(np.int32)
+    # Start cluster of every trip, ordered by scenario and start cluster
+    start_cluster_indices = np.repeat(
+        np.tile(np.arange(len(state.clusters)), number_of_scenarios), trips.ravel()
+    )
+    return ScenarioStore(
+        [cluster.id for cluster in state.clusters],
+        trips,
+        state.sample_leave_destinations(start_cluster_indices),
+    )
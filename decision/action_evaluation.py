@@ -0,0 +1,199 @@
+"""
+Parallel evaluation of the candidate actions of a decision in a pool of persistent worker processes
+"""
+
+import pickle
+import random
+from multiprocessing import get_context
+
+import numpy as np
+
+import decision.policies
+
+# Static parts of the state received when the worker process is started
+worker_static_parts = None
+
+
+def get_static_parts(state):
+    """
+    :return: the parts of the state that are shared between all copies of the state and never change in a shift
+    """
+    return (
+        state.distance_matrix,
+        state.simulation_scenarios,
+        [cluster.move_probabilities for cluster in state.clusters],
+        state.leave_alias_table,
+    )
+
+
+def set_static_parts(state, static_parts):
+    (
+        state.distance_matrix,
+        state.simulation_scenarios,
+        move_probabilities,
+        state.leave_alias_table,
+    ) = static_parts
+    for cluster, cluster_move_probabilities in zip(state.clusters, move_probabilities):
+        cluster.move_probabilities = cluster_move_probabilities
+
+
+def dump_snapshot(state) -> bytes:
+    """
+    Pickles the state without the static parts, making it cheap to send to the worker processes
+    :param state: state to pickle
+    :return: pickled state
+    """
+    static_parts = get_static_parts(state)
+    set_static_parts(state, (None, None, [None] * len(state.clusters), None))
+    try:
+        return pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+    finally:
+        set_static_parts(state, static_parts)
+
+
+def initialize_worker(static_parts: bytes):
+    global worker_static_parts
+    worker_static_parts = pickle.loads(static_parts)
+
+
+def evaluate_actions_in_worker(
+    snapshot: bytes,
+    feature_encoder: bytes,
+    vehicle_id: int,
+    actions,
+    seeds: [int],
+    time: int,
+    tabu_list: [int],
+    divide,
+    number_of_neighbours: int,
+    lookahead_scenarios: int,
+):
+    state = pickle.loads(snapshot)
+    set_static_parts(state, worker_static_parts)
+    value_function = pickle.loads(feature_encoder)
+    vehicle = state.get_vehicle_by_id(vehicle_id)
+    return [
+        evaluate_seeded_action(
+            state,
+            vehicle,
+            action,
+            seed,
+            time,
+            tabu_list,
+            divide,
+            number_of_neighbours,
+            value_function,
+            lookahead_scenarios,
+        )
+        for action, seed in zip(actions, seeds)
+    ]
+
+
+def evaluate_seeded_action(state, vehicle, action, seed, *args):
+    """
+    Evaluates an action with the random generators seeded, making the result independent of the process it is
+    evaluated in
+    :return: reward and next state features of the action
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    return decision.policies.EpsilonGreedyValueFunctionPolicy.evaluate_action(
+        state, vehicle, action, *args
+    )
+
+
+class ActionEvaluationPool:
+    """
+    Pool of persistent worker processes evaluating the candidate actions of a decision in parallel.
+    The static parts of the state are sent to the workers when the pool is created,
+    the rest of the state is sent once to every worker for each decision.
+    """
+
+    def __init__(self, number_of_processes: int, state):
+        self.number_of_processes = number_of_processes
+        # Build the alias tables once here instead of in every worker
+        state.get_leave_alias_table()
+        self.static_parts = get_static_parts(state)
+        # Forking a process after tensorflow is initialized is unsafe, start the workers in new interpreters
+        self.pool = get_context("spawn").Pool(
+            number_of_processes,
+            initializer=initialize_worker,
+            initargs=(pickle.dumps(self.static_parts, pickle.HIGHEST_PROTOCOL),),
+        )
+
+    def is_compatible(self, state) -> bool:
+        """
+        :return: True if the static parts of the state are the ones sent to the workers
+        """
+        (
+            distance_matrix,
+            simulation_scenarios,
+            move_probabilities,
+            leave_alias_table,
+        ) = get_static_parts(state)
+        return (
+            distance_matrix is self.static_parts[0]
+            and simulation_scenarios is self.static_parts[1]
+            and leave_alias_table is self.static_parts[3]
+            and len(move_probabilities) == len(self.static_parts[2])
+            and all(
+                cluster_move_probabilities is static_move_probabilities
+                for cluster_move_probabilities, static_move_probabilities in zip(
+                    move_probabilities, self.static_parts[2]
+                )
+            )
+        )
+
+    def evaluate_actions(
+        self,
+        state,
+        vehicle,
+        actions,
+        seed: int,
+        time: int,
+        tabu_list: [int],
+        divide,
+        number_of_neighbours: int,
+        value_function,
+        lookahead_scenarios=1,
+    ):
+        """
+        Evaluates all actions in parallel. Action number i is evaluated with the random generators seeded with seed + i
+        :return: reward and next state features of every action, in the order of the actions
+        """
+        snapshot = dump_snapshot(state)
+        feature_encoder = pickle.dumps(
+            value_function.get_feature_encoder(), pickle.HIGHEST_PROTOCOL
+        )
+        # Interleave the actions between the workers as the actions are sorted by the number of scooters handled
+        chunks = [
+            list(range(first_action, len(actions), self.number_of_processes))
+            for first_action in range(min(self.number_of_processes, len(actions)))
+        ]
+        chunk_evaluations = self.pool.starmap(
+            evaluate_actions_in_worker,
+            [
+                (
+                    snapshot,
+                    feature_encoder,
+                    vehicle.id,
+                    [actions[i] for i in chunk],
+                    [seed + i for i in chunk],
+                    time,
+                    tabu_list,
+                    divide,
+                    number_of_neighbours,
+                    lookahead_scenarios,
+                )
+                for chunk in chunks
+            ],
+        )
+        evaluations = [None] * len(actions)
+        for chunk, chunk_evaluation in zip(chunks, chunk_evaluations):
+            for i, evaluation in zip(chunk, chunk_evaluation):
+                evaluations[i] = evaluation
+        return evaluations
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
@@ -3,6 +3,73 @@ File containing the important neighbour filtering schema used to reduce the acti
 """
 
 
+class NeighbourIndex:
+    """
+    Neighbour filtering for one decision. The clusters are sorted by deviation from the ideal state once,
+    and the neighbours for a given pick-up and delivery are found by slicing the sorted clusters
+    """
+
+    def __init__(self, state, vehicle, number_of_neighbours, exclude=None):
+        """
+        :param state: current state
+        :param vehicle: vehicle to find neighbours for
+        :param number_of_neighbours: number of neighbours to return
+        :param exclude: ids of clusters that can't be neighbours
+        """
+        self.vehicle = vehicle
+        self.number_of_neighbours = number_of_neighbours
+        exclude = set(exclude) if exclude else set()
+        exclude.add(vehicle.current_location.id)
+        deviations = [
+            (cluster, cluster.number_of_available_scooters() - cluster.ideal_state)
+            for cluster in state.clusters
+            if cluster.id not in exclude
+        ]
+        self.clusters_positive_deviation = [
+            cluster
+            for cluster, _ in sorted(
+                [
+                    (cluster, deviation)
+                    for cluster, deviation in deviations
+                    if deviation > 0
+                ],
+                key=lambda cluster_deviation: cluster_deviation[1],
+                reverse=True,
+            )
+        ]
+        self.clusters_negative_deviation = [
+            cluster
+            for cluster, _ in sorted(
+                [
+                    (cluster, deviation)
+                    for cluster, deviation in deviations
+                    if deviation < 0
+                ],
+                key=lambda cluster_deviation: cluster_deviation[1],
+            )
+        ]
+
+    def get_neighbours(self, pick_up, delivery):
+        """
+        :param pick_up: number of scooters picked up in the action
+        :param delivery: number of scooters delivered in the action
+        :return: the clusters to consider as next location after the action
+        """
+        inventory = len(self.vehicle.scooter_inventory) + pick_up - delivery
+        has_inventory = inventory > 0
+        has_more_capacity = inventory < self.vehicle.scooter_inventory_capacity
+
+        if has_inventory:
+            if has_more_capacity and len(self.clusters_positive_deviation) > 0:
+                return self.clusters_negative_deviation[
+                    : self.number_of_neighbours - 1
+                ] + [self.clusters_positive_deviation[0]]
+            else:
+                return self.clusters_negative_deviation[: self.number_of_neighbours]
+        else:
+            return self.clusters_positive_deviation[: self.number_of_neighbours]
+
+
 def filtering_neighbours(
     state,
     vehicle,
@@ -11,45 +78,9 @@ def filtering_neighbours(
     number_of_neighbours,
     exclude=None,
 ):
-    has_inventory = len(vehicle.scooter_inventory) + pick_up - delivery > 0
-    exclude = exclude if exclude else []
-    clusters_positive_deviation = sorted(
-        [
-            cluster
-            for cluster in state.clusters
-            if cluster.id != vehicle.current_location.id
-            and cluster.id not in exclude
-            and len(cluster.get_available_scooters()) - cluster.ideal_state > 0
-        ],
-        key=lambda cluster: len(cluster.get_available_scooters()) - cluster.ideal_state,
-        reverse=True,
-    )
-
-    clusters_negative_deviation = sorted(
-        [
-            cluster
-            for cluster in state.clusters
-            if cluster.id != vehicle.current_location.id
-            and cluster.id not in exclude
-            and len(cluster.get_available_scooters()) - cluster.ideal_state < 0
-        ],
-        key=lambda cluster: len(cluster.get_available_scooters()) - cluster.ideal_state,
-    )
-
-    has_more_capacity = (
-        len(vehicle.scooter_inventory) + pick_up - delivery
-        < vehicle.scooter_inventory_capacity
-    )
-
-    if has_inventory:
-        if has_more_capacity and len(clusters_positive_deviation) > 0:
-            return clusters_negative_deviation[: number_of_neighbours - 1] + [
-                clusters_positive_deviation[0]
-            ]
-        else:
-            return clusters_negative_deviation[:number_of_neighbours]
-    else:
-        return clusters_positive_deviation[:number_of_neighbours]
+    return NeighbourIndex(
+        state, vehicle, number_of_neighbours, exclude=exclude
+    ).get_neighbours(pick_up, delivery)
 
 
 def add_depots_as_neighbours(state, time, vehicle, max_swaps):
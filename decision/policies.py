@@ -1,12 +1,12 @@
 """
 This file contains all the policies used in the thesis.
 """
-import copy
 
 import classes
 import numpy.random as random
 import abc
 
+import decision.action_evaluation
 import system_simulation.scripts
 
 
@@ -41,6 +41,12 @@ class Policy(abc.ABC):
         """
         pass
 
+    def close(self):
+        """
+        Releases the resources held by the policy, called when a shift ends.
+        """
+        pass
+
     def __repr__(self):
         return f"{self.__class__.__name__}"
 
@@ -71,11 +77,21 @@ class EpsilonGreedyValueFunctionPolicy(Policy):
         number_of_neighbors,
         epsilon,
         value_function,
+        number_of_processes=0,
+        lookahead_scenarios=1,
     ):
         super().__init__(get_possible_actions_divide, number_of_neighbors)
         self.value_function = value_function
         self.epsilon = epsilon
         self.decision_times = []
+        # Number of worker processes evaluating the actions of a decision, 0 evaluates them in this process
+        self.number_of_processes = number_of_processes
+        self.action_evaluation_pool = None
+        # Number of scenarios the lost trips of an action is averaged over
+        self.lookahead_scenarios = lookahead_scenarios
+        # List recording the input of every training step of the value function, None to not record them.
+        # Used by the actors of analysis.train_value_function to send the training steps to the learner
+        self.training_inputs = None
 
     @staticmethod
     def get_cache(state):
@@ -83,17 +99,131 @@ class EpsilonGreedyValueFunctionPolicy(Policy):
         current_states, available_scooters = [], []
         for cluster in state.clusters:
             current_states.append(cluster.get_current_state())
-            available_scooters.append(cluster.get_available_scooters())
+            available_scooters.append(cluster.number_of_available_scooters())
         return current_states, available_scooters
 
+    @staticmethod
+    def evaluate_action(
+        state,
+        vehicle,
+        action,
+        time,
+        tabu_list,
+        divide,
+        number_of_neighbours,
+        value_function,
+        lookahead_scenarios=1,
+    ):
+        """
+        Looks one action ahead and finds the features of all states reachable from the state after the action
+        :param state: current state. Left unchanged after the evaluation
+        :param vehicle: vehicle performing the action
+        :param action: action to evaluate
+        :param time: current time of the world
+        :param tabu_list: ids of locations other vehicles are heading to
+        :param divide: divide parameter of get possible actions
+        :param number_of_neighbours: number of neighbours parameter of get possible actions
+        :param value_function: value function encoding the states
+        :param lookahead_scenarios: number of scenarios to average the lost trips over. With one scenario the lost
+        trips are the ones of the scenario moving the state to the next state
+        :return: number of lost trips after the action and the features of all next states
+        """
+        current_location_id = vehicle.current_location.id
+        # look one action ahead. The changes to the state are reverted when leaving the lookahead
+        with state.lookahead() as forward_state:
+            forward_vehicle: classes.Vehicle = forward_state.get_vehicle_by_id(
+                vehicle.id
+            )
+            # perform action
+            forward_state.do_action(action, forward_vehicle, time)
+            if lookahead_scenarios > 1:
+                # Expected lost trips over several scenarios, computed in one pass before the state is simulated.
+                # The reward is the mean number of lost trips, the variance of the estimate is not used
+                reward, _ = system_simulation.scripts.estimate_lost_demand(
+                    forward_state, lookahead_scenarios
+                )
+            # Simulate the system to generate potential lost trips
+            _, lost_demand = system_simulation.scripts.bulk_system_simulate(
+                forward_state
+            )
+            if lookahead_scenarios <= 1:
+                # Record lost trip rewards
+                reward = int(lost_demand.sum())
+            # Find all actions after taking the action moving the state to s_{t+1}
+            next_action_actions = forward_state.get_possible_actions(
+                forward_vehicle,
+                divide=divide,
+                exclude=tabu_list + [action.next_location],
+                time=time
+                + action.get_action_time(
+                    state.get_distance(
+                        current_location_id,
+                        forward_vehicle.current_location.id,
+                    )
+                ),
+                number_of_neighbours=number_of_neighbours,
+            )
+            cache = EpsilonGreedyValueFunctionPolicy.get_cache(forward_state)
+            # Generate the features for the new states after the action
+            next_states_features = [
+                value_function.get_next_state_features(
+                    forward_state,
+                    forward_vehicle,
+                    next_state_action,
+                    cache,
+                )
+                for next_state_action in next_action_actions
+            ]
+        return reward, next_states_features
+
+    def get_action_evaluation_pool(self, state):
+        """
+        Returns a pool of worker processes for the state, created the first time it is needed and when the static
+        parts of the state change
+        """
+        if (
+            self.action_evaluation_pool is None
+            or not self.action_evaluation_pool.is_compatible(state)
+        ):
+            self.close()
+            self.action_evaluation_pool = (
+                decision.action_evaluation.ActionEvaluationPool(
+                    self.number_of_processes, state
+                )
+            )
+        return self.action_evaluation_pool
+
+    def close(self):
+        """
+        Stops the worker processes evaluating actions
+        """
+        if self.action_evaluation_pool is not None:
+            self.action_evaluation_pool.close()
+            self.action_evaluation_pool = None
+
+    def __getstate__(self):
+        # The worker processes can't be pickled or copied
+        state = self.__dict__.copy()
+        state["action_evaluation_pool"] = None
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault("number_of_processes", 0)
+        state.setdefault("lookahead_scenarios", 1)
+        state.setdefault("action_evaluation_pool", None)
+        state.setdefault("training_inputs", None)
+        self.__dict__.update(state)
+
     def get_best_action(self, world, vehicle):
-        # Find all possible actions
-        actions = world.state.get_possible_actions(
-            vehicle,
-            divide=self.get_possible_actions_divide,
-            exclude=world.tabu_list,
-            time=world.time,
-            number_of_neighbours=self.number_of_neighbors,
+        # Find all possible actions. The scooters to handle are only chosen for the actions that are evaluated
+        action_encodings = list(
+            world.state.iterate_possible_actions(
+                vehicle,
+                divide=self.get_possible_actions_divide,
+                exclude=world.tabu_list,
+                time=world.time,
+                number_of_neighbours=self.number_of_neighbors,
+            )
         )
         state = world.state
         cache = EpsilonGreedyValueFunctionPolicy.get_cache(state)
@@ -104,8 +234,11 @@ class EpsilonGreedyValueFunctionPolicy(Policy):
 
         # Epsilon greedy choose an action based on value function
         if self.epsilon > random.rand():
-            best_action = random.choice(actions)
+            best_action = state.decode_action(
+                vehicle, action_encodings[random.randint(len(action_encodings))]
+            )
         else:
+            actions = list(state.decode_actions(vehicle, action_encodings))
             # Create list containing all actions and their rewards and values (action, reward, value_function_value)
             action_info = [
                 (
@@ -114,87 +247,89 @@ class EpsilonGreedyValueFunctionPolicy(Policy):
                     [],
                 )  # No actions bug
             ]
-            reward = 0
-            for action in actions:
-                # look one action ahead
-                forward_state: classes.State = copy.deepcopy(state)
-                forward_vehicle: classes.Vehicle = forward_state.get_vehicle_by_id(
-                    vehicle.id
-                )
-                # perform action
-                forward_state.do_action(action, forward_vehicle, world.time)
-                # Simulate the system to generate potential lost trips
-                _, _, lost_demands = system_simulation.scripts.system_simulate(
-                    forward_state
+            if self.number_of_processes > 0:
+                # Seed every action evaluation to make the result independent of the worker evaluating the action
+                seed = random.randint(2 ** 31 - len(actions))
+                evaluations = self.get_action_evaluation_pool(state).evaluate_actions(
+                    state,
+                    vehicle,
+                    actions,
+                    seed,
+                    world.time,
+                    world.tabu_list,
+                    self.get_possible_actions_divide,
+                    self.number_of_neighbors,
+                    self.value_function,
+                    self.lookahead_scenarios,
                 )
-                # Record lost trip rewards
-                reward = (
-                    sum(map(lambda lost_trips: lost_trips[0], lost_demands))
-                    if len(lost_demands) > 0
-                    else 0
-                )
-                # Find all actions after taking the action moving the state to s_{t+1}
-                next_action_actions = forward_state.get_possible_actions(
-                    forward_vehicle,
-                    divide=self.get_possible_actions_divide,
-                    exclude=world.tabu_list + [action.next_location],
-                    time=world.time
-                    + action.get_action_time(
-                        state.get_distance(
-                            vehicle.current_location.id,
-                            forward_vehicle.current_location.id,
-                        )
-                    ),
-                    number_of_neighbours=self.number_of_neighbors,
-                )
-                cache = EpsilonGreedyValueFunctionPolicy.get_cache(forward_state)
-                forward_action_info = []
-                for next_state_action in next_action_actions:
-                    # Generate the features for this new state after the action
-                    next_state_features = self.value_function.get_next_state_features(
-                        forward_state,
-                        forward_vehicle,
-                        next_state_action,
-                        cache,
-                    )
-                    # Calculate the expected future reward of being in this new state
-                    next_state_value = (
-                        self.value_function.estimate_value_from_state_features(
-                            next_state_features
-                        )
-                    )
-                    # Add the transition to a list for later evaluation
-                    forward_action_info.append(
-                        (next_state_action, next_state_value, next_state_features)
+            else:
+                evaluations = [
+                    EpsilonGreedyValueFunctionPolicy.evaluate_action(
+                        state,
+                        vehicle,
+                        action,
+                        world.time,
+                        world.tabu_list,
+                        self.get_possible_actions_divide,
+                        self.number_of_neighbors,
+                        self.value_function,
+                        self.lookahead_scenarios,
                     )
+                    for action in actions
+                ]
+            reward = 0
+            # Features of every next state for all actions, scored by the value function in one batch
+            next_states_features = []
+            # (action, reward, rows of the next state features of the action)
+            forward_action_rows = []
+            for action, (reward, action_next_states_features) in zip(
+                actions, evaluations
+            ):
+                first_row = len(next_states_features)
+                next_states_features.extend(action_next_states_features)
+                forward_action_rows.append(
+                    (action, reward, range(first_row, len(next_states_features)))
+                )
 
+            # Calculate the expected future reward of being in all the new states
+            next_state_values = (
+                self.value_function.estimate_values_batch(next_states_features)
+                if len(next_states_features) > 0
+                else []
+            )
+            for action, reward, rows in forward_action_rows:
+                if len(rows) == 0:
+                    # No next action is possible after the action when the tabu list excludes every neighbour
+                    continue
                 # find the greedy best next action
-                best_next_action, next_state_value, next_state_features = max(
-                    forward_action_info, key=lambda pair: pair[1]
-                )
+                best_row = max(rows, key=lambda row: next_state_values[row])
                 # Add this transition for later evaluation
                 action_info.append(
                     (
                         action,
-                        next_state_value + reward * world.LOST_TRIP_REWARD,
-                        next_state_features,
+                        float(next_state_values[best_row])
+                        + reward * world.LOST_TRIP_REWARD,
+                        next_states_features[best_row],
                     )
                 )
             # Choose the action with the highest value and reward
             best_action, next_state_value, next_state_features = max(
                 action_info, key=lambda pair: pair[1]
             )
+            # Train on the replay buffers, or on the transition of this decision without replay buffers
+            training_input = (
+                world.REPLAY_BUFFER_SIZE
+                if self.value_function.use_replay_buffer()
+                else (
+                    state_features,
+                    reward * world.LOST_TRIP_REWARD,
+                    next_state_features,
+                )
+            )
+            if self.training_inputs is not None:
+                self.training_inputs.append(training_input)
             if not world.disable_training:
-                if self.value_function.use_replay_buffer():
-                    self.value_function.train(world.REPLAY_BUFFER_SIZE)
-                else:
-                    self.value_function.train(
-                        (
-                            state_features,
-                            reward * world.LOST_TRIP_REWARD,
-                            next_state_features,
-                        )
-                    )
+                self.value_function.train(training_input)
         return best_action, state_features
 
     def setup_from_state(self, state):
@@ -267,16 +402,20 @@ class RandomActionPolicy(Policy):
 
     def get_best_action(self, world, vehicle):
         # all possible actions in this state
-        possible_actions = world.state.get_possible_actions(
-            vehicle,
-            exclude=world.tabu_list,
-            time=world.time,
-            divide=self.get_possible_actions_divide,
-            number_of_neighbours=self.number_of_neighbors,
+        possible_actions = list(
+            world.state.iterate_possible_actions(
+                vehicle,
+                exclude=world.tabu_list,
+                time=world.time,
+                divide=self.get_possible_actions_divide,
+                number_of_neighbours=self.number_of_neighbors,
+            )
         )
 
         # pick a random action
-        return random.choice(possible_actions)
+        return world.state.decode_action(
+            vehicle, possible_actions[random.randint(len(possible_actions))]
+        )
 
 
 class DoNothing(Policy):
@@ -353,7 +492,7 @@ class RebalancingPolicy(Policy):
                     if cluster.id != vehicle.current_location.id
                     and cluster.id not in world.tabu_list
                 ],
-                key=lambda cluster: len(cluster.get_available_scooters())
+                key=lambda cluster: cluster.number_of_available_scooters()
                 - cluster.ideal_state,
                 reverse=is_finding_positive_deviation,
             )[0].id
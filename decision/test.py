@@ -1,4 +1,7 @@
 import copy
+import os
+import pickle
+import tempfile
 import unittest
 import random
 
@@ -7,12 +10,17 @@ import numpy as np
 import classes
 import clustering.scripts
 import decision
+import decision.neighbour_filtering
 import decision.value_functions
 import globals
 import system_simulation.scripts
 from classes import World, Action, Scooter
 from clustering.scripts import get_initial_state
+from decision.action_evaluation import evaluate_seeded_action
 from decision.neighbour_filtering import filtering_neighbours
+from decision.value_functions.abstract import ValueFunction
+from decision.value_functions.ANN import ANN, ModifiedTensorBoard
+from globals import BATTERY_LIMIT
 
 
 class BasicDecisionTests(unittest.TestCase):
@@ -208,6 +216,52 @@ class BasicDecisionTests(unittest.TestCase):
             ),
         )
 
+    def test_neighbour_index(self):
+        state = get_initial_state(
+            sample_size=1000, number_of_clusters=20, initial_location_depot=False
+        )
+        vehicle = state.vehicles[0]
+        vehicle.scooter_inventory_capacity = 2
+        exclude = [state.clusters[1].id, state.clusters[2].id]
+        deviations = {
+            cluster.id: cluster.number_of_available_scooters() - cluster.ideal_state
+            for cluster in state.clusters
+            if cluster.id not in exclude + [vehicle.current_location.id]
+        }
+        positive_deviation = sorted(
+            [cluster_id for cluster_id in deviations if deviations[cluster_id] > 0],
+            key=lambda cluster_id: -deviations[cluster_id],
+        )
+        negative_deviation = sorted(
+            [cluster_id for cluster_id in deviations if deviations[cluster_id] < 0],
+            key=lambda cluster_id: deviations[cluster_id],
+        )
+        neighbour_index = decision.neighbour_filtering.NeighbourIndex(
+            state, vehicle, 4, exclude=exclude
+        )
+        for pick_up, delivery, expected_neighbours in [
+            # No inventory: the clusters with the most scooters above the ideal state
+            (0, 0, positive_deviation[:4]),
+            # Inventory and more capacity: the clusters with the fewest scooters and one to pick up from
+            (1, 0, negative_deviation[:3] + positive_deviation[:1]),
+            # Full inventory: the clusters with the fewest scooters
+            (2, 0, negative_deviation[:4]),
+        ]:
+            neighbours = [
+                cluster.id
+                for cluster in neighbour_index.get_neighbours(pick_up, delivery)
+            ]
+            self.assertEqual(neighbours, expected_neighbours)
+            self.assertEqual(
+                neighbours,
+                [
+                    cluster.id
+                    for cluster in filtering_neighbours(
+                        state, vehicle, pick_up, delivery, 4, exclude=exclude
+                    )
+                ],
+            )
+
 
 class PolicyTests(unittest.TestCase):
     def setUp(self) -> None:
@@ -221,6 +275,133 @@ class PolicyTests(unittest.TestCase):
         self.assertEqual(len(action.pick_ups), 0)
         self.assertEqual(len(action.delivery_scooters), 0)
 
+    def test_parallel_action_evaluation(self):
+        policy = self.world.set_policy(
+            policy_class=decision.EpsilonGreedyValueFunctionPolicy,
+            value_function_class=decision.value_functions.LinearValueFunction,
+        )
+        policy.epsilon = 0
+        policy.number_of_processes = 2
+        policy.lookahead_scenarios = 5
+        self.world.disable_training = True
+        state = self.world.state
+        vehicle = state.vehicles[0]
+        # Start in a cluster to have actions with swaps and pick-ups to evaluate
+        vehicle.current_location = max(
+            state.clusters, key=lambda cluster: len(cluster.get_swappable_scooters())
+        )
+        actions = state.get_possible_actions(
+            vehicle,
+            divide=policy.get_possible_actions_divide,
+            exclude=self.world.tabu_list,
+            time=self.world.time,
+            number_of_neighbours=policy.number_of_neighbors,
+        )
+        evaluation_args = (
+            self.world.time,
+            self.world.tabu_list,
+            policy.get_possible_actions_divide,
+            policy.number_of_neighbors,
+            policy.value_function,
+            policy.lookahead_scenarios,
+        )
+        try:
+            parallel_evaluations = policy.get_action_evaluation_pool(
+                state
+            ).evaluate_actions(state, vehicle, actions, 42, *evaluation_args)
+            # The evaluations in the workers should equal seeded evaluations in this process
+            self.assertGreater(len(actions), 3)
+            self.assertEqual(len(parallel_evaluations), len(actions))
+            for i, (action, (reward, next_states_features)) in enumerate(
+                zip(actions, parallel_evaluations)
+            ):
+                expected_reward, expected_features = evaluate_seeded_action(
+                    state, vehicle, action, 42 + i, *evaluation_args
+                )
+                self.assertEqual(reward, expected_reward)
+                np.testing.assert_array_equal(next_states_features, expected_features)
+            # The pool is reused for the decisions in the same shift
+            pool = policy.action_evaluation_pool
+            best_action, _ = policy.get_best_action(self.world, vehicle)
+            self.assertIn(
+                best_action.next_location, [action.next_location for action in actions]
+            )
+            self.assertIs(policy.action_evaluation_pool, pool)
+            # New leave alias tables are sent to new workers
+            state.leave_alias_table = None
+            state.get_leave_alias_table()
+            self.assertFalse(pool.is_compatible(state))
+            self.assertIsNot(policy.get_action_evaluation_pool(state), pool)
+            # The worker processes are left out when copying the policy
+            self.assertIsNone(copy.deepcopy(policy).action_evaluation_pool)
+        finally:
+            policy.close()
+
+    def test_action_without_next_actions(self):
+        policy = self.world.set_policy(
+            policy_class=decision.EpsilonGreedyValueFunctionPolicy,
+            value_function_class=decision.value_functions.LinearValueFunction,
+        )
+        policy.epsilon = 0
+        self.world.disable_training = True
+        vehicle = self.world.state.vehicles[0]
+        # Every location but one cluster with scooters to pick up is tabu, no next action is possible after going there
+        open_location = next(
+            cluster
+            for cluster in self.world.state.clusters
+            if cluster is not vehicle.current_location
+            and cluster.number_of_available_scooters() > cluster.ideal_state
+        )
+        self.world.tabu_list = [
+            location.id
+            for location in self.world.state.locations
+            if location is not open_location
+        ]
+        # The action is skipped and the decision falls back to the placeholder action, as without possible actions
+        best_action, _ = policy.get_best_action(self.world, vehicle)
+        self.assertIsInstance(best_action, Action)
+        self.assertEqual(len(best_action.battery_swaps + best_action.pick_ups), 0)
+
+    def test_run_closes_action_evaluation_pool(self):
+        policy = self.world.set_policy(
+            policy_class=decision.EpsilonGreedyValueFunctionPolicy,
+            value_function_class=decision.value_functions.LinearValueFunction,
+        )
+        policy.number_of_processes = 2
+        self.world.policy = policy
+        self.world.visualize = False
+        # Record the pools created in the shift and the pools that are closed
+        pools, closed_pools = [], []
+        get_action_evaluation_pool = policy.get_action_evaluation_pool
+
+        def record_pool(state):
+            pool = get_action_evaluation_pool(state)
+            if pool not in pools:
+                pools.append(pool)
+                close = pool.close
+                pool.close = lambda: (closed_pools.append(pool), close())
+            return pool
+
+        policy.get_action_evaluation_pool = record_pool
+        self.world.run()
+        self.assertGreater(len(pools), 0)
+        self.assertListEqual(closed_pools, pools)
+        self.assertIsNone(policy.action_evaluation_pool)
+
+
+# helper function pickling the ANN as it was before the checkpoints, with the models saved to .hdf5 files
+def get_hdf5_ann_state(ann) -> dict:
+    from tensorflow import keras
+
+    state = ann.__dict__.copy()
+    for key in ["model", "predict_model"]:
+        with tempfile.NamedTemporaryFile(suffix=".hdf5") as fd:
+            keras.models.save_model(getattr(ann, key), fd.name, overwrite=True)
+            state[key] = fd.read()
+    del state["checkpoint"]
+    state["tensorboard"] = None
+    return state
+
 
 # helper function to update the value function (call two times in ann test)
 def update_value_function(value_function, state_features, next_state_features, reward):
@@ -236,6 +417,51 @@ def update_value_function(value_function, state_features, next_state_features, r
     )
 
 
+# helper function creating the state features cluster by cluster, as the value functions did before the feature encoder
+def get_list_state_features(state, vehicle, action=None):
+    scooters_added, battery_added = 0, 0
+    if action is not None:
+        current_cluster = vehicle.current_location
+        swap_batteries, pick_up_batteries = [
+            [
+                current_cluster.get_scooter_from_id(scooter_id).battery
+                for scooter_id in ids
+            ]
+            for ids in [action.battery_swaps, action.pick_ups]
+        ]
+        scooters_added = (
+            sum(battery < BATTERY_LIMIT for battery in swap_batteries)
+            + len(action.delivery_scooters)
+            - sum(battery > BATTERY_LIMIT for battery in pick_up_batteries)
+        )
+        battery_added = sum((100 - battery) / 100 for battery in swap_batteries) + sum(
+            (100 - battery) / 100 for battery in pick_up_batteries
+        )
+    negative_deviations, battery_deficiencies = [], []
+    for cluster in state.clusters:
+        is_current = action is not None and cluster.id == vehicle.current_location.id
+        deviation = (
+            cluster.number_of_available_scooters()
+            - cluster.ideal_state
+            + (scooters_added if is_current else 0)
+        )
+        negative_deviations += ValueFunction.get_one_hot_range(
+            abs(min(deviation, 0) / (cluster.ideal_state + 1)), 0.1
+        )
+        battery_deficiencies += ValueFunction.get_one_hot_range(
+            abs(
+                (
+                    len(cluster.scooters)
+                    - cluster.get_current_state()
+                    - (battery_added if is_current else 0)
+                )
+                / (cluster.average_number_of_scooters + 1)
+            ),
+            0.1,
+        )
+    return negative_deviations + battery_deficiencies
+
+
 class ValueFunctionTests(unittest.TestCase):
     def setUp(self) -> None:
         hyper_params = globals.HyperParameters()
@@ -462,6 +688,152 @@ class ValueFunctionTests(unittest.TestCase):
                 msg=f"not equal at {i}",
             )
 
+    def test_state_features_equal_list_features(self):
+        state = clustering.scripts.get_initial_state(2000, 20)
+        value_function = decision.value_functions.LinearValueFunction(
+            *self.value_function_args
+        )
+        value_function.setup(state)
+        for vehicle in state.vehicles:
+            vehicle.current_location = state.clusters[vehicle.id]
+            # Pick up some scooters to be able to deliver scooters in the actions
+            for scooter in state.clusters[vehicle.id + 10].scooters[:3]:
+                vehicle.pick_up(scooter)
+                state.clusters[vehicle.id + 10].remove_scooter(scooter)
+            cache = decision.EpsilonGreedyValueFunctionPolicy.get_cache(state)
+            self.assertListEqual(
+                list(value_function.get_state_features(state, vehicle, cache)),
+                get_list_state_features(state, vehicle),
+            )
+            for action in state.get_possible_actions(vehicle, number_of_neighbours=3):
+                self.assertListEqual(
+                    list(
+                        value_function.get_next_state_features(
+                            state, vehicle, action, cache
+                        )
+                    ),
+                    get_list_state_features(state, vehicle, action),
+                )
+
+    def test_estimate_values_batch(self):
+        vehicle = self.world.state.vehicles[0]
+        for value_function in [
+            decision.value_functions.LinearValueFunction(*self.value_function_args),
+            decision.value_functions.ANNValueFunction(
+                *self.value_function_args, [100, 10]
+            ),
+        ]:
+            value_function.setup(self.world.state)
+            if isinstance(value_function, decision.value_functions.LinearValueFunction):
+                value_function.weights = np.random.uniform(
+                    -1, 1, len(value_function.weights)
+                )
+            features_matrix = [
+                value_function.get_next_state_features(
+                    self.world.state, vehicle, action
+                )
+                for action in self.world.state.get_possible_actions(
+                    vehicle, number_of_neighbours=3
+                )
+            ]
+            values = value_function.estimate_values_batch(features_matrix)
+            self.assertEqual(len(values), len(features_matrix))
+            for state_features, value in zip(features_matrix, values):
+                self.assertAlmostEqual(
+                    value_function.estimate_value_from_state_features(state_features),
+                    value,
+                    places=5,
+                )
+
+    def test_ann_train_step(self):
+        value_function = decision.value_functions.ANNValueFunction(
+            *self.value_function_args, [100, 10]
+        )
+        value_function.setup(self.world.state)
+        model = value_function.model
+        model.log_interval = 5
+        number_of_features = (
+            value_function.get_number_of_location_indicators_and_state_features(
+                self.world.state
+            )
+        )
+        features = np.random.randint(0, 2, (16, number_of_features)).astype(float)
+        targets = np.random.uniform(-1, 0, 16)
+        losses = [model.train_step(features, targets) for _ in range(50)]
+        self.assertLess(losses[-1], losses[0])
+        self.assertEqual(model.train_steps, 50)
+        # The metrics are logged every log_interval steps, at the number of the training step
+        self.assertEqual(model.tensorboard.step, 51)
+        # Predictions are made with the predict model, updated from the trained model
+        model.update_predict_model()
+        np.testing.assert_allclose(
+            model.predict_batch(features),
+            model.model(features, training=False).numpy()[:, 0],
+            rtol=1e-5,
+        )
+        self.assertAlmostEqual(
+            model.predict(features[0]), model.predict_batch(features)[0], places=5
+        )
+
+    def test_ann_checkpoint(self):
+        value_function = decision.value_functions.ANNValueFunction(
+            *self.value_function_args, [100, 10]
+        )
+        value_function.setup(self.world.state)
+        model = value_function.model
+        features = np.random.randint(
+            0,
+            2,
+            (
+                16,
+                value_function.get_number_of_location_indicators_and_state_features(
+                    self.world.state
+                ),
+            ),
+        ).astype(float)
+        model.train_step(features, np.random.uniform(-1, 0, 16))
+        model.update_predict_model()
+        # The models are created from the checkpoint when first used
+        checkpoint_model = pickle.loads(pickle.dumps(model))
+        self.assertNotIn("model", checkpoint_model.__dict__)
+        # ANNs pickled with .hdf5 files can still be loaded
+        legacy_model = ANN.__new__(ANN)
+        legacy_model.__setstate__(get_hdf5_ann_state(model))
+        for unpickled_model in [checkpoint_model, legacy_model]:
+            np.testing.assert_allclose(
+                unpickled_model.predict_batch(features),
+                model.predict_batch(features),
+                rtol=1e-5,
+            )
+            for weights, expected_weights in zip(
+                unpickled_model.model.optimizer.variables,
+                model.model.optimizer.variables,
+            ):
+                np.testing.assert_array_equal(weights, expected_weights)
+
+    def test_tensorboard_writer(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            tensorboard = ModifiedTensorBoard(
+                log_dir=log_dir, flush_interval=60, max_buffer_size=4
+            )
+            tensorboard.update_stats(loss=1.0, mean_absolute_error=0.5)
+            # The metrics are buffered and written in the background
+            self.assertEqual(len(tensorboard.scalar_writer.buffer), 2)
+            self.assertListEqual(os.listdir(log_dir), [])
+            self.assertEqual(tensorboard.step, 2)
+            thread = tensorboard.scalar_writer.thread
+            # A full buffer is written before the flush interval
+            tensorboard.update_stats(step=10, loss=0.5, mean_absolute_error=0.25)
+            thread.join(timeout=30)
+            self.assertListEqual(tensorboard.scalar_writer.buffer, [])
+            self.assertEqual(len(os.listdir(log_dir)), 1)
+            self.assertEqual(tensorboard.step, 11)
+        with tempfile.TemporaryDirectory() as log_dir:
+            tensorboard = ModifiedTensorBoard(log_dir=log_dir, enabled=False)
+            tensorboard.update_stats(loss=1.0)
+            tensorboard.flush()
+            self.assertListEqual(os.listdir(log_dir), [])
+
 
 if __name__ == "__main__":
     unittest.main()
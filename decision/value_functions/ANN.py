@@ -1,6 +1,10 @@
+import io
 import tempfile
+import threading
 import time
+import weakref
 
+import numpy as np
 from tensorflow.keras.callbacks import TensorBoard
 from tensorflow import keras
 import tensorflow as tf
@@ -11,6 +15,10 @@ class ANN:
     Wrapper class for the keras Sequential model
     """
 
+    # The networks are small, so the per-call overhead of a GPU is larger than the computation
+    DEVICE = "/CPU:0"
+    MODEL_KEYS = ("model", "predict_model")
+
     def __init__(
         self,
         network_structure,
@@ -18,20 +26,31 @@ class ANN:
         trace_decay,
         discount_factor,
         learning_rate,
+        log_interval=100,
     ):
+        """
+        :param log_interval: number of training steps between every time the metrics are logged to tensorboard.
+        Zero disables the logging
+        """
         self.trace_decay = trace_decay
         self.discount_factor = discount_factor
         self.learning_rate = learning_rate
         self.network_structure = network_structure
         self.input_dimension = input_dimension
+        self.log_interval = log_interval
+        self.train_steps = 0
+        # Weights of the models when unpickled, see load_checkpoint
+        self.checkpoint = None
 
-        self.model = self.create_model()
-        self.predict_model = self.create_model()
+        with tf.device(ANN.DEVICE):
+            self.model = self.create_model()
+            self.predict_model = self.create_model()
         self.update_predict_model()
 
         self.tensorboard = ModifiedTensorBoard(
             log_dir=f"logs/relu_{discount_factor}_{network_structure}_{learning_rate}_{int(time.time())}",
             profile_batch=100000000,  # https://github.com/tensorflow/tensorboard/issues/2819
+            enabled=log_interval > 0,
         )
 
     def create_model(self):
@@ -52,7 +71,7 @@ class ANN:
             model.add(keras.layers.Activation("relu"))
         # The last layer needs to have a single value function output
         model.add(keras.layers.Dense(1))
-        optimizer = keras.optimizers.Adam(lr=self.learning_rate)
+        optimizer = keras.optimizers.Adam(learning_rate=self.learning_rate)
         model.compile(
             loss="mean_squared_error",
             optimizer=optimizer,
@@ -62,36 +81,226 @@ class ANN:
         return model
 
     def predict(self, state_features):
-        return float(self.predict_model(tf.convert_to_tensor([state_features]))[0][0])
+        return float(self.predict_batch([state_features])[0])
+
+    def predict_batch(self, state_features_matrix):
+        """
+        Predicts the value of several states in a single forward pass
+        :param state_features_matrix: 2-D array with the state features of one state in every row
+        :return: numpy array with the predicted value of every state
+        """
+        return self.compiled_predict(
+            tf.convert_to_tensor(state_features_matrix, dtype=tf.float32)
+        ).numpy()
+
+    @tf.function(reduce_retracing=True)
+    def compiled_predict(self, state_features_matrix):
+        with tf.device(ANN.DEVICE):
+            return self.predict_model(state_features_matrix, training=False)[:, 0]
+
+    def train_step(self, features_list, target_list):
+        """
+        Trains the model on one batch in a compiled graph, without the overhead of keras fit.
+        The metrics are logged to tensorboard every log_interval training steps
+        :param features_list: 2-D array with the state features of one state in every row
+        :param target_list: target value of every state
+        :return: the loss of the batch
+        """
+        loss, metrics = self.compiled_train_step(
+            tf.convert_to_tensor(features_list, dtype=tf.float32),
+            tf.convert_to_tensor(target_list, dtype=tf.float32),
+        )
+        self.train_steps += 1
+        if self.log_interval > 0 and self.train_steps % self.log_interval == 0:
+            self.tensorboard.update_stats(
+                step=self.train_steps,
+                loss=float(loss),
+                **{name: float(value) for name, value in metrics.items()},
+            )
+        return float(loss)
+
+    @tf.function(reduce_retracing=True)
+    def compiled_train_step(self, features_list, target_list):
+        with tf.device(ANN.DEVICE):
+            target_list = tf.reshape(target_list, (-1, 1))
+            with tf.GradientTape() as tape:
+                predictions = self.model(features_list, training=True)
+                # Mean squared error and the regularization of the layers, as compiled in create_model
+                loss = tf.reduce_mean(
+                    keras.losses.mean_squared_error(target_list, predictions)
+                )
+                if self.model.losses:
+                    loss += tf.add_n(self.model.losses)
+            gradients = tape.gradient(loss, self.model.trainable_variables)
+            self.model.optimizer.apply_gradients(
+                zip(gradients, self.model.trainable_variables)
+            )
+            return loss, {
+                "mean_absolute_percentage_error": tf.reduce_mean(
+                    keras.losses.mean_absolute_percentage_error(
+                        target_list, predictions
+                    )
+                ),
+                "mean_absolute_error": tf.reduce_mean(
+                    keras.losses.mean_absolute_error(target_list, predictions)
+                ),
+            }
 
     def update_predict_model(self):
         self.predict_model.set_weights(self.model.get_weights())
 
+    def get_weights(self):
+        return self.model.get_weights()
+
+    def set_weights(self, weights):
+        """
+        Sets the weights of the trained model and the model used for predictions
+        """
+        self.model.set_weights(weights)
+        self.update_predict_model()
+
     def batch_fit(self, features_list, target_list, **kwargs):
         self.model.fit(
             features_list, target_list, callbacks=[self.tensorboard], **kwargs
         )
 
+    def get_checkpoint(self) -> bytes:
+        """
+        Serializes the weights of the models and the optimizer state to an in memory .npz file
+        :return: bytes of the .npz file
+        """
+        arrays = {}
+        for key in ANN.MODEL_KEYS:
+            for i, weights in enumerate(getattr(self, key).get_weights()):
+                arrays[f"{key}_{i}"] = weights
+        for i, variable in enumerate(self.model.optimizer.variables):
+            arrays[f"optimizer_{i}"] = variable.numpy()
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
+
+    def load_checkpoint(self, checkpoint: bytes):
+        """
+        Creates the models from the network structure and sets the weights and optimizer state of a checkpoint
+        :param checkpoint: bytes from get_checkpoint
+        """
+        # The models can be first used when a compiled function is traced, but must be created eagerly
+        with tf.init_scope(), np.load(io.BytesIO(checkpoint)) as arrays:
+
+            def get_arrays(prefix):
+                number_of_arrays = sum(
+                    name.startswith(f"{prefix}_") for name in arrays.files
+                )
+                return [arrays[f"{prefix}_{i}"] for i in range(number_of_arrays)]
+
+            with tf.device(ANN.DEVICE):
+                for key in ANN.MODEL_KEYS:
+                    model = self.create_model()
+                    model.set_weights(get_arrays(key))
+                    self.__dict__[key] = model
+                optimizer = self.model.optimizer
+                optimizer_weights = get_arrays("optimizer")
+                if len(optimizer_weights) > len(optimizer.variables):
+                    # The optimizer variables are created when the model is first trained
+                    optimizer.build(self.model.trainable_variables)
+                if len(optimizer_weights) == len(optimizer.variables):
+                    for variable, weights in zip(
+                        optimizer.variables, optimizer_weights
+                    ):
+                        variable.assign(weights)
+
+    def __getattr__(self, name):
+        # The models of an unpickled ANN are created from the checkpoint the first time they are used
+        if name in ANN.MODEL_KEYS and self.__dict__.get("checkpoint") is not None:
+            self.load_checkpoint(self.__dict__.pop("checkpoint"))
+            return self.__dict__[name]
+        raise AttributeError(
+            f"'{self.__class__.__name__}' object has no attribute '{name}'"
+        )
+
     def __getstate__(self):
         state = self.__dict__.copy()
-        # Adding bytes from file to model attribute
-        for key, value in state.items():
-            if key.__contains__("model"):
-                with tempfile.NamedTemporaryFile(suffix=".hdf5", delete=True) as fd:
-                    keras.models.save_model(state.get(key), fd.name, overwrite=True)
-                    state[key] = fd.read()
+        # Replace the models by a checkpoint of the weights, unless they have not been created since unpickled
+        for key in ANN.MODEL_KEYS:
+            state.pop(key, None)
+        if state.get("checkpoint") is None:
+            state["checkpoint"] = self.get_checkpoint()
         state["tensorboard"] = None
         return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
-        for key, value in state.items():
-            if key.__contains__("model"):
+        for key in ANN.MODEL_KEYS:
+            # ANNs pickled before the checkpoints have the models as bytes of .hdf5 files
+            if isinstance(state.get(key), bytes):
                 with tempfile.NamedTemporaryFile(suffix=".hdf5", delete=True) as fd:
                     fd.write(state[key])
                     fd.flush()
-                    setattr(self, key, keras.models.load_model(fd.name))
-        self.tensorboard = ModifiedTensorBoard()
+                    with tf.device(ANN.DEVICE):
+                        setattr(self, key, keras.models.load_model(fd.name))
+        self.__dict__.setdefault("checkpoint", None)
+        self.__dict__.setdefault("log_interval", 100)
+        self.__dict__.setdefault("train_steps", 0)
+        self.tensorboard = ModifiedTensorBoard(enabled=self.log_interval > 0)
+
+
+class ScalarWriter:
+    """
+    Buffers scalars in memory and writes them to a tensorboard log on a background thread, making the caller
+    independent of the latency of the log disk. The thread is started when scalars are added and stops when the
+    buffer is empty
+    """
+
+    def __init__(self, log_dir: str, flush_interval=10.0, max_buffer_size=1000):
+        """
+        :param log_dir: directory of the tensorboard log
+        :param flush_interval: seconds between every time the buffered scalars are written
+        :param max_buffer_size: number of buffered scalars that makes the scalars be written before the interval
+        """
+        self.log_dir = log_dir
+        self.flush_interval = flush_interval
+        self.max_buffer_size = max_buffer_size
+        self.buffer = []
+        self.buffer_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.flush_requested = threading.Event()
+        self.thread = None
+        self.writer = None
+
+    def add(self, step: int, stats: dict):
+        with self.buffer_lock:
+            self.buffer.extend((name, value, step) for name, value in stats.items())
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            if len(self.buffer) >= self.max_buffer_size:
+                self.flush_requested.set()
+
+    def run(self):
+        while True:
+            self.flush_requested.wait(self.flush_interval)
+            self.flush_requested.clear()
+            self.flush()
+            with self.buffer_lock:
+                if not self.buffer:
+                    self.thread = None
+                    return
+
+    def flush(self):
+        """
+        Writes the buffered scalars to the log
+        """
+        with self.write_lock:
+            with self.buffer_lock:
+                scalars, self.buffer = self.buffer, []
+            if not scalars:
+                return
+            if self.writer is None:
+                self.writer = tf.summary.create_file_writer(self.log_dir)
+            with self.writer.as_default():
+                for name, value, step in scalars:
+                    tf.summary.scalar(name, value, step=step)
+            self.writer.flush()
 
 
 class ModifiedTensorBoard(TensorBoard):
@@ -99,13 +308,28 @@ class ModifiedTensorBoard(TensorBoard):
     Since normal tensorboard will create a new log file for every .fit call we create a custom Tensorboard class
     """
 
-    def __init__(self, **kwargs):
+    def __init__(
+        self, enabled=True, flush_interval=10.0, max_buffer_size=1000, **kwargs
+    ):
+        """
+        :param enabled: False disables all logging
+        :param flush_interval: seconds between every time the logged metrics are written to disk
+        :param max_buffer_size: number of logged metrics that makes the metrics be written before the interval
+        """
         super().__init__(**kwargs)
         self.step = 1
-        self.writer = tf.summary.create_file_writer(self.log_dir)
+        self.enabled = enabled
         self._log_write_dir = self.log_dir
         self._train_dir = self.log_dir
         self._train_step = 0
+        if enabled:
+            self.scalar_writer = ScalarWriter(
+                self.log_dir, flush_interval, max_buffer_size
+            )
+            # Write the buffered metrics when the tensorboard is garbage collected or the program exits
+            weakref.finalize(self, self.scalar_writer.flush)
+        else:
+            self.scalar_writer = None
 
         # Overriding this method to stop creating default log writer
 
@@ -131,13 +355,20 @@ class ModifiedTensorBoard(TensorBoard):
         pass
 
     # Custom method for saving own metrics
-    # Creates writer, writes custom metrics and closes writer
-    def update_stats(self, **stats):
-        self._write_logs(stats, self.step)
-
-    def _write_logs(self, logs, index):
-        with self.writer.as_default():
-            for name, value in logs.items():
-                tf.summary.scalar(name, value, step=index)
-                self.step += 1
-                self.writer.flush()
+    def update_stats(self, step=None, **stats):
+        """
+        Buffers the metrics of a step, written to disk in the background
+        :param step: step of the metrics, one after the last logged step if not given
+        """
+        if not self.enabled:
+            return
+        step = self.step if step is None else step
+        self.scalar_writer.add(step, stats)
+        self.step = step + 1
+
+    def flush(self):
+        """
+        Writes the buffered metrics to disk
+        """
+        if self.enabled:
+            self.scalar_writer.flush()
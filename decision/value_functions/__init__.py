@@ -1,3 +1,12 @@
 from .linear_value_function import LinearValueFunction
 from .ann_value_function import ANNValueFunction
-from .ANN import ANN
+
+
+def __getattr__(name):
+    # The ANN imports tensorflow, which is slow to import and only needed by the ANN value function
+    if name == "ANN":
+        from .ANN import ANN
+
+        globals()["ANN"] = ANN
+        return ANN
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
@@ -1,5 +1,8 @@
+import copy
 from collections import deque
 
+import numpy as np
+
 import classes
 from globals import SMALL_DEPOT_CAPACITY, BATTERY_LIMIT
 import abc
@@ -35,6 +38,7 @@ class ValueFunction(abc.ABC):
         vehicle_inventory_step_size,
         location_repetition,
         trace_decay,
+        replay_buffer_capacity=64,
     ):
         # for every location - 3 bit for each location
         # for every cluster, 1 float for deviation, 1 float for battery deficient
@@ -51,10 +55,29 @@ class ValueFunction(abc.ABC):
 
         self.setup_complete = False
         self.location_indicator = None
-        self.replay_buffer = deque(maxlen=64)
-        self.replay_buffer_negative = deque(maxlen=64)
+        # Transitions without and with lost trips
+        self.replay_buffer = classes.ReplayBuffer(replay_buffer_capacity)
+        self.replay_buffer_negative = classes.ReplayBuffer(replay_buffer_capacity)
         self.shifts_trained = 0
         self.td_errors = []
+        # Cluster features of the last state cache, see get_cluster_features
+        self.cluster_features_cache = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The cluster features are only reused within a decision
+        state["cluster_features_cache"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault("cluster_features_cache", None)
+        # Value functions pickled before the replay buffers were stored in arrays
+        for name in ["replay_buffer", "replay_buffer_negative"]:
+            if isinstance(state[name], deque):
+                replay_buffer = classes.ReplayBuffer(state[name].maxlen or 64)
+                replay_buffer.extend(state[name])
+                setattr(self, name, replay_buffer)
 
     def compute_and_record_td_error(
         self,
@@ -102,6 +125,33 @@ class ValueFunction(abc.ABC):
     def estimate_value_from_state_features(self, state_features: [float]):
         pass
 
+    @abc.abstractmethod
+    @Decorators.check_setup
+    def estimate_values_batch(self, state_features_matrix):
+        """
+        Estimates the value of several states in one call
+        :param state_features_matrix: 2-D array with the state features of one state in every row
+        :return: array with the estimated value of every state
+        """
+        pass
+
+    @abc.abstractmethod
+    @Decorators.check_setup
+    def get_weights(self):
+        """
+        :return: copy of the parameters of the value function, used to share the value function between processes
+        """
+        pass
+
+    @abc.abstractmethod
+    @Decorators.check_setup
+    def set_weights(self, weights):
+        """
+        Replaces the parameters of the value function
+        :param weights: parameters from get_weights
+        """
+        pass
+
     @abc.abstractmethod
     @Decorators.check_setup
     def update_weights(
@@ -145,19 +195,48 @@ class ValueFunction(abc.ABC):
         vehicle,
         action=None,
         cache=None,
-    ):
-        # Create a flag for if it is a get next state features call
-        is_next_action = action is not None
-
+    ) -> np.ndarray:
+        if cache is None:
+            cache = (
+                [cluster.get_current_state() for cluster in state.clusters],
+                [cluster.number_of_available_scooters() for cluster in state.clusters],
+            )
+        current_states, available_scooters = cache
         # Fetch all normalized scooter state representations
-        negative_deviations, battery_deficiency = ValueFunction.get_normalized_lists(
-            state,
-            cache,
-            current_location=vehicle.current_location.id if is_next_action else None,
-            action=action,
+        features = self.get_cluster_features(state, cache)
+        current_location = vehicle.current_location.id
+        # The features of a next state call only differs from the state in the current cluster
+        if action is None or current_location >= len(state.clusters):
+            return features.copy()
+        cluster = state.clusters[current_location]
+        (
+            scooters_added_in_current_cluster,
+            battery_percentage_added,
+        ) = ValueFunction.get_action_delta(state, current_location, action)
+        deviation = (
+            available_scooters[current_location]
+            - cluster.ideal_state
+            + scooters_added_in_current_cluster
         )
-
-        return negative_deviations + battery_deficiency
+        next_features = features.copy()
+        length_of_range = round(1 / 0.1)
+        for offset, value in [
+            (0, min(deviation, 0) / (cluster.ideal_state + 1)),
+            (
+                len(state.clusters),
+                (
+                    len(cluster.scooters)
+                    - current_states[current_location]
+                    - battery_percentage_added
+                )
+                / (cluster.average_number_of_scooters + 1),
+            ),
+        ]:
+            row = (offset + current_location) * length_of_range
+            next_features[
+                row : row + length_of_range
+            ] = ValueFunction.get_one_hot_ranges(np.array([value]), 0.1)[0]
+        return next_features
 
     @Decorators.check_setup
     def convert_state_to_features(
@@ -176,6 +255,22 @@ class ValueFunction(abc.ABC):
     def update_shifts_trained(self, shifts_trained: int):
         self.shifts_trained = shifts_trained
 
+    def get_feature_encoder(self):
+        """
+        Returns a copy of the value function that can only be used to create state features.
+        Cheap to pickle as it leaves out the training data
+        """
+        feature_encoder = copy.copy(self)
+        feature_encoder.replay_buffer = classes.ReplayBuffer(
+            self.replay_buffer.capacity
+        )
+        feature_encoder.replay_buffer_negative = classes.ReplayBuffer(
+            self.replay_buffer_negative.capacity
+        )
+        feature_encoder.td_errors = []
+        feature_encoder.cluster_features_cache = None
+        return feature_encoder
+
     @Decorators.check_setup
     def convert_next_state_features(self, state, vehicle, action, cache=None):
         return self.create_features(
@@ -206,110 +301,75 @@ class ValueFunction(abc.ABC):
             + [0.0] * location_repetition * (number_of_locations - 1 - location_id)
         )
 
-    @staticmethod
-    def get_normalized_lists(
-        state, cache=None, current_location=None, action=None
-    ) -> ([int], [int]):
-        if current_location is not None and action is not None:
-
-            def filter_scooter_ids(ids, isAvailable=True):
-                if isAvailable:
-                    available_filter = (
-                        lambda scooter_id: state.clusters[current_location]
-                        .get_scooter_from_id(scooter_id)
-                        .battery
-                        > BATTERY_LIMIT
-                    )
-                else:
-                    available_filter = (
-                        lambda scooter_id: state.clusters[current_location]
-                        .get_scooter_from_id(scooter_id)
-                        .battery
-                        < BATTERY_LIMIT
-                    )
-                return [
-                    scooter_id for scooter_id in ids if available_filter(scooter_id)
-                ]
-
-            scooters_added_in_current_cluster = (
-                len(
-                    filter_scooter_ids(action.battery_swaps, isAvailable=False)
-                )  # Add swapped scooters that where unavailable
-                + len(action.delivery_scooters)  # Add delivered scooters
-                - len(
-                    filter_scooter_ids(action.pick_ups, isAvailable=True)
-                )  # subtract removed available scooters
+    def get_cluster_features(self, state, cache):
+        """
+        Computes the normalized negative deviation from ideal state and battery deficiency of all clusters
+        and their one-hot encoded features. The result is reused for calls with the same cache object
+        :param state: state to compute the features of
+        :param cache: current states and available scooters of all clusters
+        :return: features of the state
+        """
+        if (
+            self.cluster_features_cache is not None
+            and self.cluster_features_cache[0] is cache
+        ):
+            return self.cluster_features_cache[1]
+        current_states, available_scooters = cache
+        ideal_states = np.array([cluster.ideal_state for cluster in state.clusters])
+        negative_deviations = np.minimum(
+            np.array(available_scooters) - ideal_states, 0
+        ) / (ideal_states + 1)
+        battery_deficiency = (
+            np.array([len(cluster.scooters) for cluster in state.clusters])
+            - np.array(current_states)
+        ) / (
+            np.array([cluster.average_number_of_scooters for cluster in state.clusters])
+            + 1
+        )
+        cluster_features = np.concatenate(
+            (
+                ValueFunction.get_one_hot_ranges(negative_deviations, 0.1).ravel(),
+                ValueFunction.get_one_hot_ranges(battery_deficiency, 0.1).ravel(),
             )
-            battery_percentage_added = sum(
+        )
+        self.cluster_features_cache = (cache, cluster_features)
+        return cluster_features
+
+    @staticmethod
+    def get_action_delta(state, current_location, action) -> (int, float):
+        """
+        Computes the change in available scooters and battery percentage in the current cluster from an action
+        :return: available scooters added and battery percentage added to the current cluster
+        """
+        cluster = state.clusters[current_location]
+        swapped_scooters = [
+            cluster.get_scooter_from_id(scooter_id)
+            for scooter_id in action.battery_swaps
+        ]
+        picked_up_scooters = [
+            cluster.get_scooter_from_id(scooter_id) for scooter_id in action.pick_ups
+        ]
+        scooters_added_in_current_cluster = (
+            len(
                 [
-                    (
-                        100
-                        - state.clusters[current_location]
-                        .get_scooter_from_id(scooter_id)
-                        .battery
-                    )
-                    / 100
-                    for scooter_id in action.battery_swaps
+                    scooter
+                    for scooter in swapped_scooters
+                    if scooter.battery < BATTERY_LIMIT
                 ]
-            ) + sum(
+            )  # Add swapped scooters that where unavailable
+            + len(action.delivery_scooters)  # Add delivered scooters
+            - len(
                 [
-                    (
-                        100
-                        - state.clusters[current_location]
-                        .get_scooter_from_id(scooter_id)
-                        .battery
-                    )
-                    / 100
-                    for scooter_id in action.pick_ups
+                    scooter
+                    for scooter in picked_up_scooters
+                    if scooter.battery > BATTERY_LIMIT
                 ]
-            )
-        else:
-            scooters_added_in_current_cluster = 0
-            battery_percentage_added = 0
-
-        current_states, available_scooters = (
-            cache
-            if cache is not None
-            else (
-                [cluster.get_current_state() for cluster in state.clusters],
-                [cluster.get_available_scooters() for cluster in state.clusters],
-            )
-        )  # Use cache if you have it
-        negative_deviations, battery_deficiency = [], []
-        for i, cluster in enumerate(state.clusters):
-            deviation = (
-                len(available_scooters[i])
-                - cluster.ideal_state
-                + (
-                    scooters_added_in_current_cluster
-                    if cluster.id == current_location
-                    else 0
-                )  # Add available scooters from action
-            )
-            negative_deviations.append(min(deviation, 0) / (cluster.ideal_state + 1))
-            battery_deficiency.append(
-                (
-                    len(cluster.scooters)
-                    - current_states[i]
-                    - (
-                        battery_percentage_added
-                        if cluster.id == current_location
-                        else 0
-                    )
-                )
-                / (cluster.average_number_of_scooters + 1)
-            )
-
-        def range_one_hot(cluster_list):
-            output = []
-            for cluster in cluster_list:
-                output += ValueFunction.get_one_hot_range(abs(cluster), 0.1)
-            return output
-
-        return (
-            range_one_hot(negative_deviations),
-            range_one_hot(battery_deficiency),
+            )  # subtract removed available scooters
         )
+        battery_percentage_added = sum(
+            [(100 - scooter.battery) / 100 for scooter in swapped_scooters]
+        ) + sum([(100 - scooter.battery) / 100 for scooter in picked_up_scooters])
+        return scooters_added_in_current_cluster, battery_percentage_added
 
     @staticmethod
     def get_one_hot_range(percent, step_size) -> [int]:
@@ -321,5 +381,22 @@ class ValueFunction(abc.ABC):
         index = filter_list.index(1)
         return [0] * index + [1] + [0] * (length_of_list - index - 1)
 
+    @staticmethod
+    def get_one_hot_ranges(percents: np.ndarray, step_size) -> np.ndarray:
+        """
+        Vectorized version of get_one_hot_range
+        :param percents: array of values to encode
+        :param step_size: size of the ranges
+        :return: matrix with the one-hot encoding of every value in its rows
+        """
+        length_of_list = round(1 / step_size)
+        upper_bounds = [i * step_size + step_size for i in range(length_of_list)]
+        one_hot = np.zeros((len(percents), length_of_list))
+        one_hot[
+            np.arange(len(percents)),
+            np.digitize(np.minimum(np.abs(percents), 1), upper_bounds, right=True),
+        ] = 1
+        return one_hot
+
     def get_inventory_indicator(self, percent) -> [int]:
         ValueFunction.get_one_hot_range(percent, self.vehicle_inventory_step_size)
@@ -1,7 +1,4 @@
-import random
-
 from .abstract import *
-from decision.value_functions.ANN import ANN
 
 
 class ANNValueFunction(ValueFunction):
@@ -19,6 +16,7 @@ class ANNValueFunction(ValueFunction):
         location_repetition,
         trace_decay,
         network_structure: [int],
+        replay_buffer_capacity=64,
     ):
         super().__init__(
             learning_rate,
@@ -27,6 +25,7 @@ class ANNValueFunction(ValueFunction):
             vehicle_inventory_step_size,
             location_repetition,
             trace_decay,
+            replay_buffer_capacity,
         )
         self.network_structure = network_structure
         self.model = None
@@ -35,6 +34,9 @@ class ANNValueFunction(ValueFunction):
     def setup(self, state: classes.State):
         if self.setup_complete:
             return
+        # Tensorflow is imported when the first network is created, as it is slow to import
+        from decision.value_functions.ANN import ANN
+
         number_of_state_features = (
             self.get_number_of_location_indicators_and_state_features(state)
         )
@@ -50,6 +52,11 @@ class ANNValueFunction(ValueFunction):
     def use_replay_buffer(self):
         return True
 
+    def get_feature_encoder(self):
+        feature_encoder = super(ANNValueFunction, self).get_feature_encoder()
+        feature_encoder.model = None
+        return feature_encoder
+
     def train(self, training_input):
         buffer_size = training_input
         if (
@@ -57,24 +64,12 @@ class ANNValueFunction(ValueFunction):
             or len(self.replay_buffer_negative) < buffer_size
         ):
             return
-        buffer_size = min(buffer_size, 64)
-        for j in range(2):
-            random_sample = (
-                random.sample(self.replay_buffer, buffer_size)
-                if j == 0
-                else random.sample(self.replay_buffer_negative, buffer_size)
-            )
+        buffer_size = min(buffer_size, self.replay_buffer.capacity)
+        for replay_buffer in [self.replay_buffer, self.replay_buffer_negative]:
             # Create training data from random sample
-            states, targets = [], []
-            for i, (
-                state_features,
-                reward,
-                next_state_features,
-            ) in enumerate(random_sample):
-                states.append(state_features)
-                next_state_value = self.model.predict(next_state_features)
-                targets.append(self.discount_factor * next_state_value + reward)
-            self.model.batch_fit(states, targets, verbose=1, batch_size=buffer_size)
+            states, rewards, next_states = replay_buffer.sample(buffer_size)
+            targets = self.discount_factor * self.model.predict_batch(next_states)
+            self.model.train_step(states, targets + rewards)
 
         if self.train_count % 1:
             self.model.update_predict_model()
@@ -94,6 +89,15 @@ class ANNValueFunction(ValueFunction):
     def estimate_value_from_state_features(self, state_features: [float]):
         return self.model.predict(state_features)
 
+    def estimate_values_batch(self, state_features_matrix):
+        return self.model.predict_batch(state_features_matrix)
+
+    def get_weights(self):
+        return self.model.get_weights()
+
+    def set_weights(self, weights):
+        self.model.set_weights(weights)
+
     def update_weights(
         self,
         current_state_features: [float],
@@ -18,6 +18,7 @@ class LinearValueFunction(ValueFunction):
         vehicle_inventory_step_size,
         location_repetition,
         trace_decay,
+        replay_buffer_capacity=64,
     ):
         super().__init__(
             weight_update_step_size,
@@ -26,6 +27,7 @@ class LinearValueFunction(ValueFunction):
             vehicle_inventory_step_size,
             location_repetition,
             trace_decay,
+            replay_buffer_capacity,
         )
         self.weights = []
         self.eligibilities = None
@@ -63,7 +65,17 @@ class LinearValueFunction(ValueFunction):
         )
 
     def estimate_value_from_state_features(self, state_features: [float]):
-        return float(np.dot(self.weights, [1] + state_features))
+        return float(np.dot(self.weights, np.concatenate(([1], state_features))))
+
+    def estimate_values_batch(self, state_features_matrix):
+        weights = np.asarray(self.weights)
+        return weights[0] + np.dot(np.asarray(state_features_matrix), weights[1:])
+
+    def get_weights(self):
+        return np.array(self.weights, dtype=float)
+
+    def set_weights(self, weights):
+        self.weights = np.array(weights, dtype=float)
 
     def update_weights(
         self,
@@ -75,7 +87,7 @@ class LinearValueFunction(ValueFunction):
 
         self.eligibilities = (
             self.discount_factor * self.trace_decay * self.eligibilities
-            + ([1] + current_state_features)
+            + np.concatenate(([1], current_state_features))
         )
 
         self.weights += np.multiply(
@@ -99,7 +111,7 @@ class LinearValueFunction(ValueFunction):
             ]
         )
 
-        return [1] + state_features + locations_features_combination
+        return [1] + list(state_features) + locations_features_combination
 
     def get_state_features(self, state, vehicle, cache=None):
         return self.convert_state_to_features(state, vehicle, cache=cache)
@@ -27,8 +27,11 @@ class HyperParameters:
         INITIAL_EPSILON=0.9,
         FINAL_EPSILON=0.0001,
         REPLAY_BUFFER_SIZE=500,
+        REPLAY_BUFFER_CAPACITY=64,
         DEPOT_REWARD=1,
         PICK_UP_REWARD=0.5,
+        NUMBER_OF_ACTION_EVALUATION_PROCESSES=0,
+        LOOKAHEAD_SCENARIOS=1,
     ):
         self.DISCOUNT_RATE = DISCOUNT_RATE  # From sutton 0.9-0.99
         self.EPSILON = EPSILON  # Probability of taking a random action
@@ -71,6 +74,15 @@ class HyperParameters:
         self.PICK_UP_REWARD = PICK_UP_REWARD
 
         self.REPLAY_BUFFER_SIZE = REPLAY_BUFFER_SIZE
+        # Maximum number of transitions kept in each of the replay buffers
+        self.REPLAY_BUFFER_CAPACITY = REPLAY_BUFFER_CAPACITY
+
+        # Worker processes evaluating the actions of a decision in parallel. Zero evaluates them sequentially
+        self.NUMBER_OF_ACTION_EVALUATION_PROCESSES = (
+            NUMBER_OF_ACTION_EVALUATION_PROCESSES
+        )
+        # Scenarios the lost trips of the lookahead are averaged over. One uses the scenario of the simulated state
+        self.LOOKAHEAD_SCENARIOS = LOOKAHEAD_SCENARIOS
 
 
 """
@@ -2,8 +2,22 @@
 File containing the system simulation. The system simulation simulate customer behavior by generating trips
 """
 
-import numpy as np
+import heapq
+import itertools
+import math
 import random
+from collections import deque
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+
+import classes
+from classes.Cluster import add_to_partials
+from globals import (
+    BATTERY_LIMIT,
+    CLUSTER_CENTER_DELTA,
+    ITERATION_LENGTH_MINUTES,
+)
 
 
 def system_simulate(state):
@@ -21,8 +35,17 @@ def system_simulate(state):
     }
     trips = []
     lost_demand = []
-    scenario = random.choice(state.simulation_scenarios)
-    for start_cluster_id, number_of_trips, end_cluster_indices in scenario:
+    scenarios = state.simulation_scenarios
+    # Same draw as random.choice, keeping the sequence of scenarios for a given seed
+    scenario_index = random.randrange(len(scenarios))
+    for cluster_index, (start_cluster_id, number_of_trips) in enumerate(
+        zip(
+            scenarios.cluster_ids.tolist(), scenarios.get_trips(scenario_index).tolist()
+        )
+    ):
+        end_cluster_indices = scenarios.get_destinations(
+            scenario_index, cluster_index
+        ).tolist()
         start_cluster = state.get_location_by_id(start_cluster_id)
         # if there is more trips than scooters available, the system has lost demand
         valid_scooters = start_cluster.get_available_scooters()
@@ -45,7 +68,9 @@ def system_simulate(state):
 
     # compute trip after all trips are generated to avoid handling inflow in cluster
     for start_cluster, end_cluster, scooter in trips:
-        start_cluster.scooters.remove(scooter)
+        if state.undo_log is not None:
+            state.undo_log.save_trip(start_cluster, end_cluster, scooter)
+        start_cluster.remove_scooter(scooter)
         trip_distance = state.get_distance(start_cluster.id, end_cluster.id)
         scooter.travel(trip_distance)
         end_cluster.add_scooter(scooter)
@@ -55,3 +80,415 @@ def system_simulate(state):
         trips,
         lost_demand,
     )
+
+
+def get_available_scooter_counts(state) -> ([object], np.ndarray):
+    """
+    :param state: current world
+    :return: the clusters in the order of the scenario clusters and the number of available scooters in them
+    """
+    clusters = [
+        state.get_location_by_id(cluster_id)
+        for cluster_id in state.simulation_scenarios.cluster_ids.tolist()
+    ]
+    return clusters, np.fromiter(
+        (cluster.number_of_available_scooters() for cluster in clusters),
+        dtype=np.int64,
+        count=len(clusters),
+    )
+
+
+def estimate_lost_demand(state, number_of_scenarios: int) -> (float, float):
+    """
+    Estimates the lost demand of the next iteration from random scenarios without changing the state
+    :param state: current world
+    :param number_of_scenarios: number of scenarios to sample
+    :return: mean and variance of the total number of lost trips in the scenarios
+    """
+    scenarios = state.simulation_scenarios
+    scenario_indices = np.random.randint(len(scenarios), size=number_of_scenarios)
+    _, available_scooters = get_available_scooter_counts(state)
+    # if there is more trips than scooters available, the system has lost demand
+    lost_demand = np.maximum(
+        scenarios.trips[scenario_indices] - available_scooters, 0
+    ).sum(axis=1)
+    return float(lost_demand.mean()), float(lost_demand.var())
+
+
+def bulk_system_simulate(state) -> (csr_matrix, np.ndarray):
+    """
+    Array based version of system_simulate applying all trips of a scenario in bulk.
+    Given the same seeds the state ends up exactly as after system_simulate
+    :param state: current world
+    :return: sparse (start cluster id, end cluster id) matrix of the number of trips and array of lost trips for
+    every cluster in the order of the scenario clusters
+    """
+    scenarios = state.simulation_scenarios
+    scenario_index = random.randrange(len(scenarios))
+    clusters, available_scooters = get_available_scooter_counts(state)
+    number_of_trips = scenarios.get_trips(scenario_index).astype(np.int64)
+    # if there is more trips than scooters available, the system has lost demand
+    performed_trips = np.minimum(number_of_trips, available_scooters)
+    lost_demand = number_of_trips - performed_trips
+
+    # Destinations of the performed trips, the first destinations of every cluster in the scenario
+    first_position = scenario_index * len(clusters)
+    destination_starts = scenarios.offsets[
+        first_position : first_position + len(clusters)
+    ].astype(np.int64)
+    trip_cluster_indices = np.repeat(np.arange(len(clusters)), performed_trips)
+    trip_numbers = np.arange(len(trip_cluster_indices)) - np.repeat(
+        np.cumsum(performed_trips) - performed_trips, performed_trips
+    )
+    start_ids = scenarios.cluster_ids[trip_cluster_indices].astype(np.int64)
+    end_ids = scenarios.destinations[
+        destination_starts[trip_cluster_indices] + trip_numbers
+    ].astype(np.int64)
+
+    number_of_clusters = len(state.clusters)
+    flows = coo_matrix(
+        (np.ones(len(start_ids), dtype=np.int64), (start_ids, end_ids)),
+        shape=(number_of_clusters, number_of_clusters),
+    ).tocsr()
+
+    # The scooters doing the trips, the first available scooters in every cluster
+    end_clusters = [state.get_location_by_id(end_id) for end_id in end_ids.tolist()]
+    trip_scooters = []
+    first_trip = 0
+    for cluster, cluster_trips in zip(clusters, performed_trips.tolist()):
+        if cluster_trips == 0:
+            continue
+        scooters = list(
+            itertools.islice(
+                (
+                    scooter
+                    for scooter in cluster.scooters
+                    if scooter.battery >= BATTERY_LIMIT
+                ),
+                cluster_trips,
+            )
+        )
+        if state.undo_log is not None:
+            state.undo_log.save_trips(
+                cluster,
+                zip(end_clusters[first_trip : first_trip + cluster_trips], scooters),
+            )
+        cluster.remove_scooters(scooters)
+        trip_scooters.extend(scooters)
+        first_trip += cluster_trips
+
+    distances = state.distance_matrix[start_ids, end_ids].tolist()
+    for scooter, distance in zip(trip_scooters, distances):
+        scooter.travel(distance)
+
+    # Coordinates of the scooters drawn in the same order as add_scooter for every trip in turn
+    coordinate_deltas = np.random.uniform(
+        -CLUSTER_CENTER_DELTA, CLUSTER_CENTER_DELTA, (len(trip_scooters), 2)
+    )
+    # Group the trips by end cluster, keeping the order of the trips to each cluster
+    arrival_order = np.argsort(end_ids, kind="stable")
+    arrival_end_ids, first_arrivals = np.unique(
+        end_ids[arrival_order], return_index=True
+    )
+    for end_id, arrivals in zip(
+        arrival_end_ids.tolist(), np.split(arrival_order, first_arrivals[1:])
+    ):
+        state.get_location_by_id(end_id).add_scooters(
+            [trip_scooters[trip] for trip in arrivals.tolist()],
+            coordinate_deltas[arrivals],
+        )
+
+    return flows, lost_demand
+
+
+def fast_forward_simulate(world) -> None:
+    """
+    Performs the trip events of a shift without vehicle decisions, without creating event objects.
+    The pending events are kept in a heap of tuples and the clusters as scooter counters and queues of their available
+    scooters, updating the metric contributions of a cluster when it changes. The trips, destinations, arrival times
+    and metric contributions are computed by the same helpers as the event classes and WorldMetric.
+    Events are performed in the order of World.run, the metrics are recorded after the same events and the random
+    numbers are drawn in the same order. Only a seeded world ends up exactly as if it was run by the event engine,
+    an unseeded world draws other random numbers and is only equal to it in distribution.
+    The first event at or after the end of the shift is left in the stack for World.run
+    :param world: world with only trip events in the stack
+    """
+    state = world.state
+    metrics = world.metrics
+    random_state = world.get_random_state()
+    clusters = state.clusters
+    number_of_clusters = len(clusters)
+    cluster_ids = [cluster.id for cluster in clusters]
+    cluster_indices = {
+        cluster_id: index for index, cluster_id in enumerate(cluster_ids)
+    }
+    ideal_states = [cluster.ideal_state for cluster in clusters]
+    trip_intensities = [cluster.trip_intensity_per_iteration for cluster in clusters]
+    distances = state.distance_matrix.tolist()
+
+    # Scooters in the clusters in the order of the cluster scooter lists, then the scooters on a trip
+    scooters = []
+    first_scooters = []
+    available_scooters = [deque() for _ in clusters]
+    available_battery_partials = [[] for _ in clusters]
+    for index, cluster in enumerate(clusters):
+        first_scooters.append(len(scooters))
+        for scooter in cluster.scooters:
+            if scooter.battery >= BATTERY_LIMIT:
+                available_scooters[index].append(len(scooters))
+                add_to_partials(available_battery_partials[index], scooter.battery)
+            scooters.append(scooter)
+    first_scooters.append(len(scooters))
+    number_of_scooters = [len(cluster.scooters) for cluster in clusters]
+
+    # Pending events as (time, sequence number, event class, event data), in the order of the stack
+    heap = []
+    for sequence_number, event in enumerate(world.stack):
+        if isinstance(event, classes.GenerateScooterTrips):
+            heap.append((event.time, sequence_number, classes.GenerateScooterTrips))
+        elif isinstance(event, classes.ScooterDeparture):
+            heap.append(
+                (
+                    event.time,
+                    sequence_number,
+                    classes.ScooterDeparture,
+                    cluster_indices[event.departure_cluster_id],
+                )
+            )
+        elif isinstance(event, classes.ScooterArrival):
+            heap.append(
+                (
+                    event.time,
+                    sequence_number,
+                    classes.ScooterArrival,
+                    len(scooters),
+                    cluster_indices[event.departure_cluster_id],
+                    cluster_indices[event.arrival_cluster_id],
+                    event.distance,
+                )
+            )
+            scooters.append(event.scooter)
+        elif isinstance(event, classes.LostTrip):
+            heap.append(
+                (event.time, sequence_number, classes.LostTrip, event.location_id)
+            )
+        else:
+            raise ValueError(
+                f"The fast forward simulation only performs trip events, the stack has a {event}"
+            )
+    sequence_number = len(heap)
+    batteries = [scooter.battery for scooter in scooters]
+    # Index of the cluster of every scooter, None while the scooter is on a trip
+    scooter_clusters = [
+        index
+        for index in range(number_of_clusters)
+        for _ in range(number_of_scooters[index])
+    ] + [None] * (len(scooters) - first_scooters[-1])
+    has_departed = [False] * len(scooters)
+    # Index in the arrivals of the last arrival of every scooter
+    last_arrivals = [None] * len(scooters)
+    arrivals = []
+    flows = {}
+
+    # Contributions of the clusters to the metrics, as in WorldMetric.update_cluster_contributions
+    def get_cluster_contribution(index):
+        return classes.World.WorldMetric.get_cluster_contribution(
+            ideal_states[index],
+            len(available_scooters[index]),
+            number_of_scooters[index],
+            math.fsum(available_battery_partials[index]),
+        )
+
+    contributions = [
+        get_cluster_contribution(index) for index in range(number_of_clusters)
+    ]
+    negative_deviations = [
+        negative_deviation for negative_deviation, _ in contributions
+    ]
+    deficient_batteries = [deficient_battery for _, deficient_battery in contributions]
+    total_negative_deviation = sum(negative_deviations)
+    deficient_battery_partials = []
+    for deficient_battery in deficient_batteries:
+        add_to_partials(deficient_battery_partials, deficient_battery)
+    total_available_scooters = sum(len(available) for available in available_scooters)
+    total_scooters = sum(number_of_scooters)
+    recordings = []
+
+    while heap and heap[0][0] < world.shift_duration:
+        event = heapq.heappop(heap)
+        time, event_class = event[0], event[2]
+        world.time = time
+        if event_class is classes.GenerateScooterTrips:
+            for departure_time, departure_cluster in zip(
+                *classes.GenerateScooterTrips.draw_trips(
+                    time, trip_intensities, random_state
+                )
+            ):
+                heapq.heappush(
+                    heap,
+                    (
+                        departure_time,
+                        sequence_number,
+                        classes.ScooterDeparture,
+                        departure_cluster,
+                    ),
+                )
+                sequence_number += 1
+            heapq.heappush(
+                heap,
+                (
+                    time + ITERATION_LENGTH_MINUTES,
+                    sequence_number,
+                    classes.GenerateScooterTrips,
+                ),
+            )
+            sequence_number += 1
+            if world.verbose:
+                world.progress_bar.next()
+            # The metrics are not recorded after trips are generated
+            continue
+        elif event_class is classes.ScooterDeparture:
+            cluster = event[3]
+            available = available_scooters[cluster]
+            # The first available scooter in the scooter list of the cluster leaves
+            if available:
+                scooter = available.popleft()
+                add_to_partials(
+                    available_battery_partials[cluster], -batteries[scooter]
+                )
+                number_of_scooters[cluster] -= 1
+                total_scooters -= 1
+                total_available_scooters -= 1
+                scooter_clusters[scooter] = None
+                has_departed[scooter] = True
+                destination = state.sample_leave_destinations(
+                    cluster_ids[cluster], random_state
+                )
+                distance = distances[cluster_ids[cluster]][cluster_ids[destination]]
+                heapq.heappush(
+                    heap,
+                    (
+                        classes.ScooterDeparture.get_arrival_time(time, distance),
+                        sequence_number,
+                        classes.ScooterArrival,
+                        scooter,
+                        cluster,
+                        destination,
+                        distance,
+                    ),
+                )
+            else:
+                heapq.heappush(
+                    heap,
+                    (time, sequence_number, classes.LostTrip, cluster_ids[cluster]),
+                )
+            sequence_number += 1
+        elif event_class is classes.ScooterArrival:
+            _, _, _, scooter, start_cluster, cluster, distance = event
+            battery = (
+                batteries[scooter]
+                - distance * scooters[scooter].battery_change_per_kilometer
+            )
+            batteries[scooter] = battery
+            scooter_clusters[scooter] = cluster
+            number_of_scooters[cluster] += 1
+            total_scooters += 1
+            if battery >= BATTERY_LIMIT:
+                available_scooters[cluster].append(scooter)
+                add_to_partials(available_battery_partials[cluster], battery)
+                total_available_scooters += 1
+            last_arrivals[scooter] = len(arrivals)
+            arrivals.append(cluster)
+            flow = (cluster_ids[start_cluster], cluster_ids[cluster])
+            flows[flow] = flows.get(flow, 0) + 1
+        else:
+            world.add_reward(world.LOST_TRIP_REWARD, event[3])
+            if world.verbose:
+                print(f"LT: {event[3]} at {time}")
+            cluster = None
+
+        if cluster is not None:
+            negative_deviation, deficient_battery = get_cluster_contribution(cluster)
+            total_negative_deviation += (
+                negative_deviation - negative_deviations[cluster]
+            )
+            negative_deviations[cluster] = negative_deviation
+            if deficient_battery != deficient_batteries[cluster]:
+                add_to_partials(
+                    deficient_battery_partials, -deficient_batteries[cluster]
+                )
+                add_to_partials(deficient_battery_partials, deficient_battery)
+                deficient_batteries[cluster] = deficient_battery
+        if metrics.is_recording_due(time):
+            recordings.append(
+                (
+                    metrics.number_of_lost_trips,
+                    total_negative_deviation / number_of_clusters,
+                    math.fsum(deficient_battery_partials) / total_scooters,
+                    time,
+                    total_available_scooters,
+                )
+            )
+    metrics.add_recordings(np.array(recordings).reshape(-1, len(metrics.METRICS)))
+
+    # Move the scooter objects to the clusters they are in
+    for index, cluster in enumerate(clusters):
+        cluster.remove_scooters(
+            [
+                scooters[scooter]
+                for scooter in range(first_scooters[index], first_scooters[index + 1])
+                if has_departed[scooter]
+            ]
+        )
+    # Coordinates drawn in the same order as add_scooter for every arrival in turn
+    coordinate_deltas = np.random.uniform(
+        -CLUSTER_CENTER_DELTA, CLUSTER_CENTER_DELTA, (len(arrivals), 2)
+    )
+    arrived_scooters = [[] for _ in clusters]
+    for scooter, last_arrival in enumerate(last_arrivals):
+        if last_arrival is None:
+            continue
+        scooters[scooter].battery = batteries[scooter]
+        if scooter_clusters[scooter] is not None:
+            arrived_scooters[scooter_clusters[scooter]].append(scooter)
+        else:
+            # Scooters on a trip keep the coordinates of their last arrival
+            delta_lat, delta_lon = coordinate_deltas[last_arrival].tolist()
+            arrival_cluster = clusters[arrivals[last_arrival]]
+            scooters[scooter].set_coordinates(
+                arrival_cluster.get_lat() + delta_lat,
+                arrival_cluster.get_lon() + delta_lon,
+            )
+    for cluster, cluster_arrivals in zip(clusters, arrived_scooters):
+        cluster_arrivals.sort(key=last_arrivals.__getitem__)
+        cluster.add_scooters(
+            [scooters[scooter] for scooter in cluster_arrivals],
+            coordinate_deltas[[last_arrivals[scooter] for scooter in cluster_arrivals]],
+        )
+    for flow, number_of_trips in flows.items():
+        world.cluster_flow[flow] += number_of_trips
+    # The cluster contributions to the metrics are recomputed from the new state
+    metrics.reset_cluster_contributions()
+
+    # Put the pending events back in the stack in the order they will be performed
+    events = []
+    for time, _, event_class, *data in sorted(heap):
+        if event_class is classes.GenerateScooterTrips:
+            events.append(classes.GenerateScooterTrips(time))
+        elif event_class is classes.ScooterDeparture:
+            events.append(classes.ScooterDeparture(time, cluster_ids[data[0]]))
+        elif event_class is classes.ScooterArrival:
+            scooter, start_cluster, end_cluster, distance = data
+            events.append(
+                classes.ScooterArrival(
+                    time,
+                    scooters[scooter],
+                    cluster_ids[end_cluster],
+                    cluster_ids[start_cluster],
+                    distance,
+                )
+            )
+        else:
+            events.append(classes.LostTrip(time, data[0]))
+    world.stack = classes.EventQueue()
+    world.add_events(events)
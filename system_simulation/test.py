@@ -1,6 +1,12 @@
+import copy
+import random
 import unittest
 
+import numpy as np
+
 import classes
+import decision
+import system_simulation.scripts
 from clustering.scripts import get_initial_state
 
 
@@ -79,6 +85,208 @@ class BasicSystemSimulationTests(unittest.TestCase):
         # Test that total flow out equal to total flow in
         self.assertEqual(sum(out_flow.values()), sum(in_flow.values()))
 
+    def test_bulk_system_simulate(self):
+        state = self.world.state
+        # Leave few available scooters to get lost demand
+        for cluster in state.clusters:
+            for scooter in cluster.scooters[1:]:
+                scooter.battery = 10.0
+        bulk_state = copy.deepcopy(state)
+
+        def get_scooters(simulated_state):
+            return [
+                [
+                    (scooter.id, scooter.battery, scooter.lat, scooter.lon)
+                    for scooter in cluster.scooters
+                ]
+                for cluster in simulated_state.clusters
+            ]
+
+        total_lost_demand = 0
+        for seed in range(5):
+            random.seed(seed)
+            np.random.seed(seed)
+            flows, _, lost_demand = system_simulation.scripts.system_simulate(state)
+            random.seed(seed)
+            np.random.seed(seed)
+            (
+                bulk_flows,
+                bulk_lost_demand,
+            ) = system_simulation.scripts.bulk_system_simulate(bulk_state)
+            # The bulk simulation should do the same trips as the trip by trip simulation
+            self.assertEqual(get_scooters(bulk_state), get_scooters(state))
+            self.assertEqual(
+                [(start, end, bulk_flows[start, end]) for start, end, _ in flows],
+                flows,
+            )
+            self.assertEqual(bulk_flows.sum(), sum(flow for _, _, flow in flows))
+            self.assertEqual(
+                [
+                    (lost_trips, cluster_id)
+                    for lost_trips, cluster_id in zip(
+                        bulk_lost_demand.tolist(),
+                        bulk_state.simulation_scenarios.cluster_ids.tolist(),
+                    )
+                    if lost_trips > 0
+                ],
+                lost_demand,
+            )
+            total_lost_demand += bulk_lost_demand.sum()
+            for cluster in bulk_state.clusters:
+                cluster.check_aggregates()
+        self.assertGreater(total_lost_demand, 0)
+
+        # The bulk trips are reverted when looking ahead
+        scooters = get_scooters(bulk_state)
+        with bulk_state.lookahead():
+            system_simulation.scripts.bulk_system_simulate(bulk_state)
+        self.assertEqual(get_scooters(bulk_state), scooters)
+
+    def test_estimate_lost_demand(self):
+        state = self.world.state
+        for cluster in state.clusters:
+            for scooter in cluster.scooters[1:]:
+                scooter.battery = 10.0
+        scenarios = state.simulation_scenarios
+        np.random.seed(42)
+        mean, variance = system_simulation.scripts.estimate_lost_demand(state, 100)
+        np.random.seed(42)
+        lost_demands = []
+        for scenario_index in np.random.randint(len(scenarios), size=100):
+            lost_demands.append(
+                sum(
+                    max(
+                        number_of_trips
+                        - state.get_location_by_id(
+                            cluster_id
+                        ).number_of_available_scooters(),
+                        0,
+                    )
+                    for cluster_id, number_of_trips, _ in scenarios.get_scenario(
+                        scenario_index
+                    )
+                )
+            )
+        self.assertAlmostEqual(mean, np.mean(lost_demands))
+        self.assertAlmostEqual(variance, np.var(lost_demands))
+        self.assertGreater(mean, 0)
+
+    def test_fast_forward_simulate(self):
+        state = get_initial_state(500, 20)
+        # Raise the demand to get lost trips
+        for cluster in state.clusters:
+            cluster.trip_intensity_per_iteration *= 8
+        for seed, metrics_resolution, start_time in [(0, 0, 0), (1, 5, 0), (2, 0, 100)]:
+            worlds = []
+            for fast_forward in [False, True]:
+                np.random.seed(seed)
+                world = classes.World(
+                    250,
+                    decision.DoNothing(),
+                    copy.deepcopy(state),
+                    visualize=False,
+                    metrics_resolution=metrics_resolution,
+                    seed=seed,
+                    fast_forward=fast_forward,
+                )
+                # Fast forward from the middle of the shift
+                while world.time < start_time:
+                    world.stack.pop().perform(world)
+                world.run()
+                for cluster in world.state.clusters:
+                    cluster.check_aggregates()
+                worlds.append(world)
+            # A seeded world ends up as if it was run by the event engine
+            events, fast_forward = worlds
+            self.assertEqual(fast_forward.time, events.time)
+            self.assertListEqual(fast_forward.rewards, events.rewards)
+            self.assertDictEqual(fast_forward.cluster_flow, events.cluster_flow)
+            np.testing.assert_allclose(
+                fast_forward.metrics.recordings[
+                    : fast_forward.metrics.number_of_recordings
+                ],
+                events.metrics.recordings[: events.metrics.number_of_recordings],
+            )
+            for cluster, event_cluster in zip(
+                fast_forward.state.clusters, events.state.clusters
+            ):
+                self.assertListEqual(
+                    [
+                        (scooter.id, scooter.battery, scooter.get_location())
+                        for scooter in cluster.scooters
+                    ],
+                    [
+                        (scooter.id, scooter.battery, scooter.get_location())
+                        for scooter in event_cluster.scooters
+                    ],
+                )
+            # The pending events hold the same trips, with scooters compared by id
+            self.assertListEqual(
+                [
+                    (
+                        event.__class__,
+                        {
+                            key: getattr(value, "id", value)
+                            for key, value in event.__dict__.items()
+                        },
+                    )
+                    for event in fast_forward.stack
+                ],
+                [
+                    (
+                        event.__class__,
+                        {
+                            key: getattr(value, "id", value)
+                            for key, value in event.__dict__.items()
+                        },
+                    )
+                    for event in events.stack
+                ],
+            )
+
+    def test_fast_forward_simulate_distribution(self):
+        state = get_initial_state(500, 20)
+        # Raise the demand to get lost trips
+        for cluster in state.clusters:
+            cluster.trip_intensity_per_iteration *= 8
+        number_of_runs = 30
+        results = {}
+        for fast_forward in [False, True]:
+            results[fast_forward] = []
+            for seed in range(number_of_runs):
+                # Unseeded worlds draw the trips and the scooter coordinates from the same random state, in a
+                # different order in the fast forward simulation
+                np.random.seed(seed)
+                world = classes.World(
+                    240,
+                    decision.DoNothing(),
+                    copy.deepcopy(state),
+                    visualize=False,
+                    fast_forward=fast_forward,
+                )
+                world.run()
+                results[fast_forward].append(
+                    (
+                        world.metrics.get_metric("lost_demand")[-1],
+                        world.metrics.get_metric("deficient_battery").mean(),
+                        world.metrics.get_metric("total_available_scooters").mean(),
+                        sum(world.cluster_flow.values()),
+                    )
+                )
+        # The fast forward simulation gives the same distribution of results as the event engine
+        events, fast_forward = np.array(results[False]), np.array(results[True])
+        self.assertFalse(np.array_equal(events, fast_forward))
+        standard_error = np.sqrt(
+            (events.var(axis=0) + fast_forward.var(axis=0)) / number_of_runs
+        )
+        self.assertTrue(
+            (
+                np.abs(events.mean(axis=0) - fast_forward.mean(axis=0))
+                <= 4 * standard_error
+            ).all()
+        )
+        self.assertGreater(fast_forward[:, 0].sum(), 0)
+
 
 if __name__ == "__main__":
     unittest.main()
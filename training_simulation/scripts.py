@@ -1,3 +1,4 @@
+import system_simulation.scripts
 from globals import ITERATION_LENGTH_MINUTES
 
 
@@ -16,77 +17,97 @@ def training_simulation(world):
     # list of vehicle times for next arrival
     vehicle_times = [0] * len(world.state.vehicles)
 
-    while world.time < world.shift_duration:
-        if next_is_vehicle_action:
-            # choosing the vehicle with the earliest arrival time (index-method is choosing the first if multiple equal)
-            vehicle_index = vehicle_times.index(min(vehicle_times))
-            # fetching the vehicle
-            current_vehicle = world.state.vehicles[vehicle_index]
+    try:
+        while world.time < world.shift_duration:
+            if next_is_vehicle_action:
+                # choosing the vehicle with the earliest arrival time (index-method is choosing the first if multiple equal)
+                vehicle_index = vehicle_times.index(min(vehicle_times))
+                # fetching the vehicle
+                current_vehicle = world.state.vehicles[vehicle_index]
+
+                # getting the best action and setting this to current vehicle action
+                action, cluster_features = world.policy.get_best_action(
+                    world, current_vehicle
+                )
 
-            # getting the best action and setting this to current vehicle action
-            action, cluster_features = world.policy.get_best_action(
-                world, current_vehicle
-            )
+                # Remove current vehicle state from tabu list
+                world.tabu_list = [
+                    cluster_id
+                    for cluster_id in world.tabu_list
+                    if cluster_id != current_vehicle.current_location.id
+                ]
 
-            # Remove current vehicle state from tabu list
-            world.tabu_list = [
-                cluster_id
-                for cluster_id in world.tabu_list
-                if cluster_id != current_vehicle.current_location.id
-            ]
+                action_time = action.get_action_time(
+                    world.state.get_distance(
+                        current_vehicle.current_location.id, action.next_location
+                    )
+                )
 
-            action_time = action.get_action_time(
-                world.state.get_distance(
-                    current_vehicle.current_location.id, action.next_location
+                arrival_cluster_id = current_vehicle.current_location.id
+                # Performing the best action and adding refill_time to action_time
+                action_time += world.state.do_action(
+                    action, current_vehicle, world.time
+                )
+                world.log_event(
+                    "VehicleArrival",
+                    cluster=arrival_cluster_id,
+                    vehicle=current_vehicle.id,
+                    battery_swaps=len(action.battery_swaps),
+                    pick_ups=len(action.pick_ups),
+                    deliveries=len(action.delivery_scooters),
                 )
-            )
 
-            # Performing the best action and adding refill_time to action_time
-            action_time += world.state.do_action(action, current_vehicle, world.time)
-
-            # Add next vehicle location to tabu list if its not a depot
-            if not current_vehicle.is_at_depot():
-                world.tabu_list.append(action.next_location)
-
-            # updating the current vehicle time to the next arrival
-            vehicle_times[vehicle_index] += action_time
-            # setting the world time to the next vehicle arrival
-            world.time = min(vehicle_times)
-
-            if vehicle_cluster_features[vehicle_index]:
-                if lost_demand == 0:
-                    world.policy.value_function.replay_buffer.append(
-                        (
-                            vehicle_cluster_features[vehicle_index],
-                            lost_demand * world.LOST_TRIP_REWARD,
-                            cluster_features,
+                # Add next vehicle location to tabu list if its not a depot
+                if not current_vehicle.is_at_depot():
+                    world.tabu_list.append(action.next_location)
+
+                # updating the current vehicle time to the next arrival
+                vehicle_times[vehicle_index] += action_time
+                # setting the world time to the next vehicle arrival
+                world.time = min(vehicle_times)
+
+                if vehicle_cluster_features[vehicle_index] is not None:
+                    if lost_demand == 0:
+                        world.policy.value_function.replay_buffer.append(
+                            (
+                                vehicle_cluster_features[vehicle_index],
+                                lost_demand * world.LOST_TRIP_REWARD,
+                                cluster_features,
+                            )
                         )
-                    )
-                else:
-                    world.policy.value_function.replay_buffer_negative.append(
-                        (
-                            vehicle_cluster_features[vehicle_index],
-                            lost_demand * world.LOST_TRIP_REWARD,
-                            cluster_features,
+                    else:
+                        world.policy.value_function.replay_buffer_negative.append(
+                            (
+                                vehicle_cluster_features[vehicle_index],
+                                lost_demand * world.LOST_TRIP_REWARD,
+                                cluster_features,
+                            )
                         )
-                    )
 
-            vehicle_cluster_features[vehicle_index] = cluster_features
+                vehicle_cluster_features[vehicle_index] = cluster_features
 
-        else:
-            # performing a scooter trips simulation
-            _, _, lost_demands = world.system_simulate()
-            lost_demand = (
-                sum(map(lambda lost_trips: lost_trips[0], lost_demands))
-                if len(lost_demands) > 0
-                else 0
+            else:
+                # performing a scooter trips simulation
+                _, lost_demands = system_simulation.scripts.bulk_system_simulate(
+                    world.state
+                )
+                lost_demand = int(lost_demands.sum())
+                world.log_event(
+                    "SystemSimulation",
+                    reward=lost_demand * world.LOST_TRIP_REWARD,
+                    lost_trips=lost_demand,
+                )
+                simulation_counter += 1
+            # deciding if the next thing to do is a vehicle arrival or a system simulation
+            next_is_vehicle_action = (
+                world.time < simulation_counter * ITERATION_LENGTH_MINUTES
             )
-            simulation_counter += 1
-        # deciding if the next thing to do is a vehicle arrival or a system simulation
-        next_is_vehicle_action = (
-            world.time < simulation_counter * ITERATION_LENGTH_MINUTES
-        )
+    finally:
+        # Stop the worker processes of the policy at the end of the shift
+        world.policy.close()
 
+    if world.event_log is not None:
+        world.event_log.flush()
     return world
 
 